@@ -8,6 +8,7 @@ from wechatpy_tornado.exceptions import WeChatClientException, WeChatException,
 from wechatpy_tornado.oauth import WeChatOAuth  # NOQA
 from wechatpy_tornado.parser import parse_message  # NOQA
 from wechatpy_tornado.pay import WeChatPay  # NOQA
+from wechatpy_tornado.refresher import TokenRefresher  # NOQA
 from wechatpy_tornado.replies import create_reply  # NOQA
 
 __version__ = '1.8.14'
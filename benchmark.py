@@ -0,0 +1,760 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.benchmark
+    ~~~~~~~~~~~~~~~~~~~
+
+    This module provides a reproducible benchmark for the passive message
+    (callback) pipeline: decrypt, parse, handle, reply and encrypt, for
+    the per-request cost of the merchant-cert SSL context, for the memory
+    used by streaming multipart uploads, and for the fan-out sender's
+    throughput.
+
+    Run ``python -m wechatpy_tornado.benchmark --help`` for usage.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import argparse
+import asyncio
+import base64
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from wechatpy_tornado.fields import (
+    Base64DecodeField,
+    DateTimeField,
+    FloatField,
+    IntegerField,
+)
+
+# 流水线的各个阶段
+STAGES = ('decrypt', 'parse', 'handle', 'reply', 'encrypt')
+
+TOKEN = 'benchmark_token'
+ENCODING_AES_KEY = 'abcdefghijklmnopqrstuvwxyz0123456789ABCDEFG'
+APP_ID = 'wx1234567890abcdef'
+CORP_ID = 'ww1234567890abcdef'
+NONCE = '1320562132'
+TIMESTAMP = '1409304348'
+
+# 嵌套节点的样例，与微信推送的格式一致
+NESTED_FIXTURES = {
+    'ScanCodeInfo': (
+        '<ScanCodeInfo><ScanType><![CDATA[qrcode]]></ScanType>'
+        '<ScanResult><![CDATA[http://weixin.qq.com/r/Oy8qMRXEBJ5ErceX9xlz]]></ScanResult>'
+        '</ScanCodeInfo>'
+    ),
+    'SendPicsInfo': (
+        '<SendPicsInfo><Count>2</Count><PicList>'
+        '<item><PicMd5Sum><![CDATA[1b5f7c23b5bf75682a53e7b6d163e185]]></PicMd5Sum></item>'
+        '<item><PicMd5Sum><![CDATA[5a75aaca956d97be686719218f275c6b]]></PicMd5Sum></item>'
+        '</PicList></SendPicsInfo>'
+    ),
+    'SendLocationInfo': (
+        '<SendLocationInfo><Location_X><![CDATA[23]]></Location_X>'
+        '<Location_Y><![CDATA[113]]></Location_Y><Scale><![CDATA[15]]></Scale>'
+        '<Label><![CDATA[ 广州市海珠区客村艺苑路 106号]]></Label><Poiname><![CDATA[]]></Poiname>'
+        '</SendLocationInfo>'
+    ),
+    'ChosenBeacon': (
+        '<ChosenBeacon><Uuid><![CDATA[FDA50693-A4E2-4FB1-AFCF-C6EB07647825]]></Uuid>'
+        '<Major>10001</Major><Minor>1002</Minor><Distance>0.057</Distance></ChosenBeacon>'
+    ),
+    'AroundBeacons': (
+        '<AroundBeacons>'
+        '<AroundBeacon><Uuid><![CDATA[FDA50693-A4E2-4FB1-AFCF-C6EB07647825]]></Uuid>'
+        '<Major>10001</Major><Minor>1003</Minor><Distance>166.816</Distance></AroundBeacon>'
+        '<AroundBeacon><Uuid><![CDATA[FDA50693-A4E2-4FB1-AFCF-C6EB07647825]]></Uuid>'
+        '<Major>10001</Major><Minor>1004</Minor><Distance>15.013</Distance></AroundBeacon>'
+        '</AroundBeacons>'
+    ),
+    'BatchJob': (
+        '<BatchJob><JobId><![CDATA[S0MrnndvRG5fadSlLwiBqiDDbM143UqTmKP3152FZk4]]></JobId>'
+        '<JobType><![CDATA[sync_user]]></JobType><ErrCode>0</ErrCode>'
+        '<ErrMsg><![CDATA[ok]]></ErrMsg></BatchJob>'
+    ),
+}
+
+# 字符串节点的样例值，未列出的节点使用通用的值
+STRING_FIXTURES = {
+    'ToUserName': 'gh_e136c6e50636',
+    'FromUserName': 'oMgHVjngRipVsoxg6TuX3vz6glDg',
+    'Content': '你好，我想查询一下订单 20140830123456 的物流信息，谢谢',
+    'PicUrl': 'http://mmbiz.qpic.cn/mmbiz/3Fz8iaIpib7yQUibSNx8sSXD2yjIibia8zhYeWdibEqHCaYaNbvIgYkNlXHqicrRrgT3zEPNVC6D14BOKxamdn1DqU8dw/0',
+    'MediaId': 'media_id_HzRmm46xrr3XmOsVq9ndtf8lnxzaEpYdiAKtzSlXqYUBwl2a0JyE7vSXRx6kaWEI',
+    'ThumbMediaId': 'thumb_media_id_HzRmm46xrr3XmOsVq9ndtf8lnxzaEpYdiAKtzSlXq',
+    'Url': 'https://mp.weixin.qq.com/s/xxxxxxxxxxxxxxxxxxxxxx',
+    'Title': '公众号消息标题',
+    'Description': '公众号消息描述',
+    'Label': '广州市海珠区客村艺苑路 106号',
+    'Format': 'amr',
+    'Recognition': '腾讯微信团队',
+    'EventKey': 'EVENTKEY_123',
+    'Ticket': 'gQH47joAAAAAAAAAASxodHRwOi8vd2VpeGluLnFxLmNvbS9xL2taZ2Z3TVRtNzJXV1Brb3ZhYmJJAAIEZ23sUwMEmm3sUw==',
+    'CardId': 'pFS7Fjg8kV1IdDz01r4SQwMkuCKc',
+    'UserCardCode': '12312312',
+    'Status': 'success',
+}
+
+
+def _string_value(name):
+    return STRING_FIXTURES.get(name, '{0}_value'.format(name.lower()))
+
+
+def _field_xml(field):
+    name = field.name
+    if name in NESTED_FIXTURES:
+        return NESTED_FIXTURES[name]
+    if isinstance(field, DateTimeField):
+        return '<{0}>1409304348</{0}>'.format(name)
+    if isinstance(field, IntegerField):
+        value = 6054768590064713728 if name == 'MsgId' else 1
+        return '<{0}>{1}</{0}>'.format(name, value)
+    if isinstance(field, FloatField):
+        return '<{0}>23.137466</{0}>'.format(name)
+    if isinstance(field, Base64DecodeField):
+        value = base64.b64encode('device data'.encode('utf-8')).decode('ascii')
+        return '<{0}><![CDATA[{1}]]></{0}>'.format(name, value)
+    return '<{0}><![CDATA[{1}]]></{0}>'.format(name, _string_value(name))
+
+
+def _message_xml(message_class, msg_type, event=None, event_key=None):
+    nodes = ['<MsgType><![CDATA[{0}]]></MsgType>'.format(msg_type)]
+    if event is not None:
+        nodes.append('<Event><![CDATA[{0}]]></Event>'.format(event))
+    if event_key is not None:
+        nodes.append('<EventKey><![CDATA[{0}]]></EventKey>'.format(event_key))
+    seen = {'MsgType', 'Event'}
+    if event_key is not None:
+        seen.add('EventKey')
+    for field in message_class._fields.values():
+        if field.name in seen:
+            continue
+        seen.add(field.name)
+        nodes.append(_field_xml(field))
+    return '<xml>{0}</xml>'.format(''.join(nodes))
+
+
+def build_fixtures(variant='mp'):
+    """
+    根据已注册的消息和事件类型生成样例消息
+
+    :param variant: 可选，``mp`` 为公众号，``enterprise`` 为企业号
+    :return: ``(类型名, 消息类, XML)`` 的 list
+    """
+    if variant == 'enterprise':
+        from wechatpy_tornado.enterprise.events import EVENT_TYPES
+        from wechatpy_tornado.enterprise.messages import MESSAGE_TYPES
+    else:
+        from wechatpy_tornado.events import EVENT_TYPES
+        from wechatpy_tornado.messages import MESSAGE_TYPES
+
+    fixtures = []
+    for msg_type, message_class in sorted(MESSAGE_TYPES.items()):
+        fixtures.append((msg_type, message_class, _message_xml(message_class, msg_type)))
+    for event_type, event_class in sorted(EVENT_TYPES.items()):
+        if event_type == 'subscribe_scan':
+            xml = _message_xml(event_class, 'event', 'subscribe', 'qrscene_123123')
+        elif event_type == 'subscribe_scan_product':
+            xml = _message_xml(event_class, 'event', 'subscribe', 'scanbarcode|EAN13|6901481811083')
+        elif event_type.startswith('device_'):
+            xml = _message_xml(event_class, 'device_event', event_type[len('device_'):])
+        else:
+            xml = _message_xml(event_class, 'event', event_type)
+        fixtures.append(('event.{0}'.format(event_type), event_class, xml))
+    return fixtures
+
+
+class Pipeline(object):
+    """
+    被动消息的处理流水线，每个阶段一个方法，便于单独计时
+
+    :param variant: 可选，``mp`` 为公众号，``enterprise`` 为企业号
+    """
+
+    def __init__(self, variant='mp'):
+        self.variant = variant
+        if variant == 'enterprise':
+            from wechatpy_tornado.enterprise.crypto import WeChatCrypto
+            from wechatpy_tornado.enterprise.parser import parse_message
+            from wechatpy_tornado.enterprise.replies import create_reply
+            self.crypto = WeChatCrypto(TOKEN, ENCODING_AES_KEY, CORP_ID)
+        else:
+            from wechatpy_tornado.crypto import WeChatCrypto
+            from wechatpy_tornado.parser import parse_message
+            from wechatpy_tornado.replies import create_reply
+            self.crypto = WeChatCrypto(TOKEN, ENCODING_AES_KEY, APP_ID)
+        self.parse_message = parse_message
+        self.create_reply = create_reply
+
+    def encrypt_request(self, xml):
+        """ 把明文消息加密成微信服务器推送的格式，返回 ``(xml, signature)`` """
+        import xmltodict
+
+        encrypted = self.crypto.encrypt_message(xml, NONCE, TIMESTAMP)
+        signature = xmltodict.parse(encrypted)['xml']['MsgSignature']
+        return encrypted, signature
+
+    def decrypt(self, request):
+        xml, signature = request
+        return self.crypto.decrypt_message(xml, signature, TIMESTAMP, NONCE)
+
+    def parse(self, xml):
+        return self.parse_message(xml)
+
+    def handle(self, message):
+        # 处理函数通常会多次读取 source、create_time 等字段
+        for name in message._fields:
+            getattr(message, name)
+        for name in message._fields:
+            getattr(message, name)
+        return message
+
+    def reply(self, message):
+        return self.create_reply('收到，消息类型 {0}'.format(message.type), message).render()
+
+    def encrypt(self, xml):
+        return self.crypto.encrypt_message(xml, NONCE, TIMESTAMP)
+
+    def run(self, request):
+        message = self.parse(self.decrypt(request))
+        return self.encrypt(self.reply(self.handle(message)))
+
+
+def _percentile(values, percent):
+    index = min(len(values) - 1, int(len(values) * percent))
+    return values[index]
+
+
+def _stage_functions(pipeline):
+    return [(stage, getattr(pipeline, stage)) for stage in STAGES]
+
+
+def run(variant='mp', number=20000, types=None, memory_samples=200, seed=0):
+    """
+    运行基准测试
+
+    :param variant: 可选，``mp`` 为公众号，``enterprise`` 为企业号
+    :param number: 可选，处理的消息总数，按类型轮流取样例
+    :param types: 可选，只测试这些类型，如 ``['text', 'event.click']``
+    :param memory_samples: 可选，统计内存分配时处理的消息数，为 0 时不统计
+    :param seed: 可选，随机数种子，保证加密的随机前缀可复现
+    :return: dict，``msgs_per_sec`` 为整条流水线的吞吐，``stages`` 为各阶段的耗时分位数（微秒）
+             和每条消息的内存分配峰值（字节），``types`` 为各类型的吞吐
+    """
+    random.seed(seed)
+    pipeline = Pipeline(variant)
+    fixtures = build_fixtures(variant)
+    if types:
+        fixtures = [item for item in fixtures if item[0] in types]
+    if not fixtures:
+        raise ValueError('No fixtures selected')
+    requests = [(name, pipeline.encrypt_request(xml)) for name, _, xml in fixtures]
+
+    # 预热并检查每个样例都解析成了对应的类型
+    for (name, message_class, _), (_, request) in zip(fixtures, requests):
+        message = pipeline.parse(pipeline.decrypt(request))
+        if type(message) is not message_class:
+            raise AssertionError('{0} parsed as {1}'.format(name, type(message).__name__))
+        pipeline.run(request)
+
+    stage_functions = _stage_functions(pipeline)
+    timings = dict((stage, []) for stage in STAGES)
+    per_type = dict((name, 0.0) for name, _ in requests)
+    count = dict((name, 0) for name, _ in requests)
+    perf_counter = time.perf_counter
+
+    gc.collect()
+    started = perf_counter()
+    for i in range(number):
+        name, request = requests[i % len(requests)]
+        value = request
+        for stage, func in stage_functions:
+            t = perf_counter()
+            value = func(value)
+            timings[stage].append(perf_counter() - t)
+    elapsed_staged = perf_counter() - started
+
+    # 不计时各阶段，得到整条流水线的吞吐
+    gc.collect()
+    started = perf_counter()
+    for i in range(number):
+        name, request = requests[i % len(requests)]
+        t = perf_counter()
+        pipeline.run(request)
+        per_type[name] += perf_counter() - t
+        count[name] += 1
+    elapsed = perf_counter() - started
+
+    result = {
+        'variant': variant,
+        'number': number,
+        'fixtures': len(fixtures),
+        'python': sys.version.split()[0],
+        'msgs_per_sec': number / elapsed,
+        'msgs_per_sec_staged': number / elapsed_staged,
+        'stages': {},
+        'types': dict(
+            (name, count[name] / per_type[name]) for name in per_type if per_type[name]
+        ),
+    }
+    for stage in STAGES:
+        values = sorted(timings[stage])
+        result['stages'][stage] = {
+            'p50': _percentile(values, 0.5) * 1e6,
+            'p90': _percentile(values, 0.9) * 1e6,
+            'p99': _percentile(values, 0.99) * 1e6,
+            'mean': sum(values) / len(values) * 1e6,
+        }
+    if memory_samples:
+        for stage, peak in _measure_allocations(stage_functions, requests, memory_samples).items():
+            result['stages'][stage]['alloc_bytes'] = peak
+    return result
+
+
+def _measure_allocations(stage_functions, requests, samples):
+    """ 每个阶段处理一条消息时 tracemalloc 统计到的内存分配峰值的平均值 """
+    peaks = dict((stage, 0) for stage, _ in stage_functions)
+    tracemalloc.start()
+    try:
+        for i in range(samples):
+            value = requests[i % len(requests)][1]
+            for stage, func in stage_functions:
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                value = func(value)
+                peaks[stage] += tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+    return dict((stage, peak // samples) for stage, peak in peaks.items())
+
+
+def run_pool(variant='mp', number=20000, workers=(1, 2, 4, 8), batch_size=64, concurrency=256,
+             types=None, seed=0):
+    """
+    在 :class:`wechatpy_tornado.offload.CryptoPool` 中运行流水线，测试不同工作进程数下的吞吐
+
+    解密、解析和渲染、加密在工作进程中执行，handle 在 IOLoop 中执行
+
+    :param workers: 可选，要测试的工作进程数
+    :param batch_size: 可选，``CryptoPool`` 每批的最大任务数
+    :param concurrency: 可选，同时处理的消息数
+    :return: dict，``workers`` 为工作进程数到吞吐的 dict ，``inline`` 为不使用 pool 时的吞吐
+    """
+    from wechatpy_tornado.offload import CryptoPool
+
+    random.seed(seed)
+    pipeline = Pipeline(variant)
+    fixtures = build_fixtures(variant)
+    if types:
+        fixtures = [item for item in fixtures if item[0] in types]
+    if not fixtures:
+        raise ValueError('No fixtures selected')
+    requests = [pipeline.encrypt_request(xml) for _, _, xml in fixtures]
+    crypto = pipeline.crypto
+
+    async def process(request):
+        message = await crypto.decrypt_message_async(request[0], request[1], TIMESTAMP, NONCE)
+        reply = pipeline.create_reply('收到，消息类型 {0}'.format(message.type), pipeline.handle(message))
+        return await crypto.encrypt_message_async(reply, NONCE, TIMESTAMP)
+
+    async def drive(count):
+        queue = iter(range(count))
+
+        async def worker():
+            for i in queue:
+                await process(requests[i % len(requests)])
+
+        await asyncio.gather(*[worker() for _ in range(min(concurrency, count))])
+
+    def measure():
+        # 预热，工作进程在首次提交时才启动
+        asyncio.run(drive(min(number, len(requests) * 4)))
+        started = time.perf_counter()
+        asyncio.run(drive(number))
+        return number / (time.perf_counter() - started)
+
+    result = {
+        'variant': variant,
+        'number': number,
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'inline': measure(),
+        'workers': {},
+    }
+    for count in workers:
+        crypto.pool = CryptoPool(max_workers=count, batch_size=batch_size)
+        try:
+            result['workers'][count] = measure()
+        finally:
+            crypto.pool.shutdown()
+            crypto.pool = None
+    return result
+
+
+def format_pool_result(result):
+    """ 把 :func:`run_pool` 的结果格式化为文本表格 """
+    lines = [
+        '{variant}: {number} messages, batch size {batch_size}, concurrency {concurrency}'.format(**result),
+        '{0:<10}{1:>12}'.format('workers', 'msgs/sec'),
+        '{0:<10}{1:>12.0f}'.format('inline', result['inline']),
+    ]
+    for count, rate in sorted(result['workers'].items()):
+        lines.append('{0:<10}{1:>12.0f}  x{2:.2f}'.format(count, rate, rate / result['inline']))
+    return '\n'.join(lines)
+
+
+def _self_signed_cert(directory):
+    """ 生成 2048 位的自签名证书和私钥文件，返回 (证书路径, 私钥路径) """
+    import datetime
+    import os
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'benchmark')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        key.public_key()
+    ).serial_number(1).not_valid_before(now).not_valid_after(
+        now + datetime.timedelta(days=1)
+    ).sign(key, hashes.SHA256())
+    cert_path = os.path.join(directory, 'apiclient_cert.pem')
+    key_path = os.path.join(directory, 'apiclient_key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+def run_ssl_context(number=200):
+    """
+    测试每次请求获取商户证书 SSL context 的耗时
+
+    ``uncached`` 为每次请求都创建 context 并加载证书（含加载系统 CA），
+    ``cached`` 为 :func:`wechatpy_tornado.pay.utils.get_ssl_context`
+
+    :param number: 可选，每种方式的调用次数
+    :return: dict，方式到每次调用的秒数
+    """
+    import ssl
+    import tempfile
+
+    from wechatpy_tornado.pay.utils import get_ssl_context
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = _self_signed_cert(directory)
+
+        def uncached():
+            ssl_ctx = ssl.create_default_context()
+            ssl_ctx.load_cert_chain(cert, key)
+            return ssl_ctx
+
+        def cached():
+            return get_ssl_context(cert, key)
+
+        result = {'number': number}
+        for name, func in (('uncached', uncached), ('cached', cached)):
+            func()
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            result[name] = (time.perf_counter() - started) / number
+    return result
+
+
+def format_ssl_context_result(result):
+    """ 把 :func:`run_ssl_context` 的结果格式化为文本表格 """
+    return '\n'.join([
+        'merchant-cert SSL context: {number} calls'.format(**result),
+        '{0:<10}{1:>12}'.format('', 'us/call'),
+        '{0:<10}{1:>12.1f}'.format('uncached', result['uncached'] * 1e6),
+        '{0:<10}{1:>12.1f}  x{2:.0f}'.format(
+            'cached', result['cached'] * 1e6, result['uncached'] / result['cached']
+        ),
+    ])
+
+
+def run_upload(size_mb=200, concurrency=3):
+    """
+    通过本地服务测试流式 multipart 上传的内存占用
+
+    同时上传 ``concurrency`` 个 ``size_mb`` MB 的临时文件，服务端边收边丢弃
+
+    :param size_mb: 可选，文件大小，单位 MB
+    :param concurrency: 可选，同时上传的数量
+    :return: dict，``rss_before`` 、``rss_peak`` 为上传前和上传中的最大常驻内存（MB），
+             ``seconds`` 为耗时
+    """
+    import os
+    import resource
+    import tempfile
+
+    from tornado.httpserver import HTTPServer
+    from tornado.testing import bind_unused_port
+    from tornado.web import Application, RequestHandler, stream_request_body
+
+    from wechatpy_tornado import WeChatClient
+
+    @stream_request_body
+    class UploadHandler(RequestHandler):
+
+        def prepare(self):
+            self.received = 0
+
+        def data_received(self, chunk):
+            self.received += len(chunk)
+
+        def post(self):
+            self.write({'errcode': 0, 'received': self.received})
+
+    def max_rss():
+        # ru_maxrss 在 Linux 上的单位为 KB ，在 macOS 上为字节
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+    async def upload(path):
+        sock, port = bind_unused_port()
+        server = HTTPServer(Application([('/upload', UploadHandler)]), max_body_size=(size_mb + 1) << 20)
+        server.add_sockets([sock])
+        client = WeChatClient(APP_ID, 'secret', access_token='benchmark')
+        url = 'http://127.0.0.1:{0}/upload'.format(port)
+
+        async def one():
+            with open(path, 'rb') as f:
+                res = await client.post(url, files={'media': f}, timeout=600)
+            assert res['received'] > size_mb << 20
+
+        try:
+            await asyncio.gather(*[one() for _ in range(concurrency)])
+        finally:
+            server.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'upload.bin')
+        block = os.urandom(1 << 20)
+        with open(path, 'wb') as f:
+            for _ in range(size_mb):
+                f.write(block)
+        del block
+        gc.collect()
+        result = {'size_mb': size_mb, 'concurrency': concurrency, 'rss_before': max_rss()}
+        started = time.perf_counter()
+        asyncio.run(upload(path))
+        result['seconds'] = time.perf_counter() - started
+        result['rss_peak'] = max_rss()
+    return result
+
+
+def format_upload_result(result):
+    """ 把 :func:`run_upload` 的结果格式化为文本 """
+    return '\n'.join([
+        'multipart upload: {concurrency} x {size_mb}MB in {seconds:.2f}s'.format(**result),
+        'peak RSS before {0:.0f}MB, during upload {1:.0f}MB (+{2:.0f}MB)'.format(
+            result['rss_before'], result['rss_peak'], result['rss_peak'] - result['rss_before']
+        ),
+    ])
+
+
+def run_fanout(number=5000, concurrencies=(1, 10, 50), latency=0.005, limited=0.05, failed=0.01, seed=0):
+    """
+    通过本地模拟接口测试 :class:`wechatpy_tornado.fanout.FanoutSender` 的吞吐
+
+    模拟接口每次调用延迟 ``latency`` 秒，按比例返回 45009 （可以重试）和 40003 （不可重试）
+
+    :param number: 可选，每种并发数下发送的消息数
+    :param concurrencies: 可选，要测试的并发数
+    :param latency: 可选，模拟接口的延迟，单位秒
+    :param limited: 可选，返回 45009 的比例
+    :param failed: 可选，返回 40003 的比例
+    :return: dict，``concurrency`` 为并发数到 (msgs/sec, 失败数, 平均发送次数) 的 dict
+    """
+    from tornado.httpserver import HTTPServer
+    from tornado.testing import bind_unused_port
+    from tornado.web import Application, RequestHandler
+
+    from wechatpy_tornado import WeChatClient
+    from wechatpy_tornado.fanout import FanoutSender
+
+    class SendHandler(RequestHandler):
+
+        async def post(self):
+            await asyncio.sleep(latency)
+            value = random.random()
+            if value < failed:
+                self.write({'errcode': 40003, 'errmsg': 'invalid openid'})
+            elif value < failed + limited:
+                self.write({'errcode': 45009, 'errmsg': 'reach max api daily quota limit'})
+            else:
+                self.write({'errcode': 0, 'errmsg': 'ok'})
+
+    async def send_all(concurrency):
+        sock, port = bind_unused_port()
+        server = HTTPServer(Application([('/cgi-bin/message/custom/send', SendHandler)]))
+        server.add_sockets([sock])
+        client = WeChatClient(APP_ID, 'secret', access_token='benchmark')
+        client.API_BASE_URL = 'http://127.0.0.1:{0}/cgi-bin/'.format(port)
+
+        async def send(openid, content):
+            return await client.message.send_text(openid, content)
+
+        sender = FanoutSender(send, concurrency=concurrency, backoff=0.01, max_backoff=0.1)
+        recipients = (('openid_{0}'.format(i), 'hello') for i in range(number))
+        errors = attempts = 0
+        try:
+            started = time.perf_counter()
+            async for item in sender.run(recipients):
+                attempts += item.attempts
+                if item.error is not None:
+                    errors += 1
+            return number / (time.perf_counter() - started), errors, attempts / float(number)
+        finally:
+            server.stop()
+
+    random.seed(seed)
+    result = {'number': number, 'latency': latency, 'concurrency': {}}
+    for concurrency in concurrencies:
+        result['concurrency'][concurrency] = asyncio.run(send_all(concurrency))
+    return result
+
+
+def format_fanout_result(result):
+    """ 把 :func:`run_fanout` 的结果格式化为文本表格 """
+    lines = [
+        'fan-out: {number} messages, {0:.0f}ms latency'.format(result['latency'] * 1000, **result),
+        '{0:<12}{1:>12}{2:>10}{3:>10}'.format('concurrency', 'msgs/sec', 'errors', 'attempts'),
+    ]
+    for concurrency, (rate, errors, attempts) in sorted(result['concurrency'].items()):
+        lines.append('{0:<12}{1:>12.0f}{2:>10}{3:>10.2f}'.format(concurrency, rate, errors, attempts))
+    return '\n'.join(lines)
+
+
+def compare(result, baseline, threshold=0.1):
+    """
+    与基线结果比较
+
+    :param result: :func:`run` 的返回结果
+    :param baseline: 作为基线的 :func:`run` 的返回结果
+    :param threshold: 可选，允许的性能下降比例，默认为 0.1
+    :return: 超过阈值的退化项的描述 list，为空表示没有退化
+    """
+    regressions = []
+    old, new = baseline['msgs_per_sec'], result['msgs_per_sec']
+    if new < old * (1 - threshold):
+        regressions.append('msgs/sec {0:.0f} -> {1:.0f} ({2:+.1%})'.format(old, new, new / old - 1))
+    for stage in STAGES:
+        if stage not in baseline.get('stages', {}):
+            continue
+        old = baseline['stages'][stage]['p50']
+        new = result['stages'][stage]['p50']
+        if new > old * (1 + threshold):
+            regressions.append('{0} p50 {1:.1f}us -> {2:.1f}us ({3:+.1%})'.format(
+                stage, old, new, new / old - 1
+            ))
+    return regressions
+
+
+def format_result(result, per_type=False):
+    """ 把 :func:`run` 的结果格式化为文本表格 """
+    lines = [
+        '{variant}: {number} messages over {fixtures} fixtures, Python {python}'.format(**result),
+        'pipeline: {0:.0f} msgs/sec'.format(result['msgs_per_sec']),
+        '{0:<10}{1:>10}{2:>10}{3:>10}{4:>12}'.format('stage', 'p50 us', 'p90 us', 'p99 us', 'alloc B'),
+    ]
+    for stage in STAGES:
+        item = result['stages'][stage]
+        lines.append('{0:<10}{1:>10.1f}{2:>10.1f}{3:>10.1f}{4:>12}'.format(
+            stage, item['p50'], item['p90'], item['p99'], item.get('alloc_bytes', '-')
+        ))
+    if per_type:
+        for name, rate in sorted(result['types'].items(), key=lambda x: x[1]):
+            lines.append('{0:<40}{1:>10.0f} msgs/sec'.format(name, rate))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m wechatpy_tornado.benchmark',
+        description='Benchmark the passive message pipeline: decrypt, parse, handle, reply, encrypt.'
+    )
+    parser.add_argument('--variant', choices=('mp', 'enterprise', 'all'), default='all')
+    parser.add_argument('-n', '--number', type=int, default=20000, help='messages per variant')
+    parser.add_argument('--types', help='comma separated fixture names, e.g. text,event.click')
+    parser.add_argument('--memory-samples', type=int, default=200,
+                        help='messages traced for allocation stats, 0 to disable')
+    parser.add_argument('--per-type', action='store_true', help='print msgs/sec of each fixture')
+    parser.add_argument('--save', metavar='FILE', help='save the results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='baseline JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='allowed slowdown against the baseline, default 0.1')
+    parser.add_argument('--workers', metavar='N,N,...',
+                        help='run the pipeline in a CryptoPool with these worker counts, e.g. 1,2,4,8')
+    parser.add_argument('--batch-size', type=int, default=64, help='CryptoPool batch size, default 64')
+    parser.add_argument('--ssl-context', action='store_true',
+                        help='measure the per-request cost of the merchant-cert SSL context instead')
+    parser.add_argument('--upload', metavar='MB', type=int,
+                        help='measure peak RSS of 3 concurrent streaming uploads of this size instead')
+    parser.add_argument('--fanout', metavar='N,N,...',
+                        help='measure FanoutSender throughput at these concurrencies instead, e.g. 1,10,50')
+    args = parser.parse_args(argv)
+
+    if args.fanout:
+        concurrencies = [int(count) for count in args.fanout.split(',')]
+        print(format_fanout_result(run_fanout(concurrencies=concurrencies)))
+        return 0
+    if args.upload:
+        print(format_upload_result(run_upload(args.upload)))
+        return 0
+    if args.ssl_context:
+        print(format_ssl_context_result(run_ssl_context()))
+        return 0
+
+    variants = ('mp', 'enterprise') if args.variant == 'all' else (args.variant,)
+    types = args.types.split(',') if args.types else None
+    if args.workers:
+        workers = [int(count) for count in args.workers.split(',')]
+        for variant in variants:
+            print(format_pool_result(run_pool(variant, args.number, workers, args.batch_size, types=types)))
+            print('')
+        return 0
+    results = {}
+    for variant in variants:
+        results[variant] = run(variant, args.number, types, args.memory_samples)
+        print(format_result(results[variant], args.per_type))
+        print('')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed = False
+        for variant, result in results.items():
+            if variant not in baseline:
+                continue
+            for regression in compare(result, baseline[variant], args.threshold):
+                failed = True
+                print('REGRESSION {0}: {1}'.format(variant, regression))
+        if failed:
+            return 1
+        print('No regression over {0:.0%} against {1}'.format(args.threshold, args.compare))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.cache
+    ~~~~~~~~~~~~~~~
+
+    This module provides an opt-in TTL cache with request coalescing for
+    idempotent read APIs.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import copy
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+
+from wechatpy_tornado.utils import json, to_binary
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存的只读接口及其缓存时间，单位秒
+DEFAULT_TTLS = {
+    # 公众号
+    'user/info': 300,
+    'menu/get': 300,
+    'get_current_selfmenu_info': 300,
+    'template/get_industry': 3600,
+    'template/get_all_private_template': 3600,
+    'getcallbackip': 3600,
+    'tags/get': 300,
+    'poi/getpoi': 300,
+    'api_getwxcategory': 86400,
+    # 企业微信
+    'department/list': 300,
+    'agent/get': 300,
+    'agent/list': 300,
+}
+
+# 写接口调用成功后需要失效的缓存：
+# {写接口: [(读接口, {读接口参数: 写接口参数或 data 中的字段})]}，
+# 匹配条件为空时失效该读接口的全部缓存
+DEFAULT_INVALIDATIONS = {
+    'user/info/updateremark': [('user/info', {'openid': 'openid'})],
+    'menu/create': [('menu/get', {}), ('get_current_selfmenu_info', {})],
+    'menu/delete': [('menu/get', {}), ('get_current_selfmenu_info', {})],
+    'menu/addconditional': [('menu/get', {})],
+    'menu/delconditional': [('menu/get', {})],
+    'template/api_set_industry': [('template/get_industry', {})],
+    'template/api_add_template': [('template/get_all_private_template', {})],
+    'template/del_private_template': [('template/get_all_private_template', {})],
+    'tags/create': [('tags/get', {})],
+    'tags/update': [('tags/get', {})],
+    'tags/delete': [('tags/get', {})],
+    'tags/members/batchtagging': [('tags/get', {}), ('user/info', {})],
+    'tags/members/batchuntagging': [('tags/get', {}), ('user/info', {})],
+    'poi/updatepoi': [('poi/getpoi', {'poi_id': 'poi_id'})],
+    'poi/delpoi': [('poi/getpoi', {'poi_id': 'poi_id'})],
+    'department/create': [('department/list', {})],
+    'department/update': [('department/list', {})],
+    'department/delete': [('department/list', {})],
+    'agent/set': [('agent/get', {'agentid': 'agentid'}), ('agent/list', {})],
+}
+
+
+class ResponseCache(object):
+    """
+    只读接口的响应缓存，相同参数的并发请求只会发出一次 HTTP 请求
+
+    默认缓存在进程内，按 LRU 淘汰；传入 ``storage`` 时使用共享的
+    :class:`wechatpy_tornado.session.SessionStorage` 作为缓存，多个进程可共享。
+    缓存的是接口原始返回数据，每次命中时返回一份拷贝。
+
+    使用示例::
+
+        from wechatpy_tornado import WeChatClient
+        from wechatpy_tornado.cache import ResponseCache
+
+        client = WeChatClient('appid', 'secret')
+        client.cache = ResponseCache(ttls={'user/info': 60, 'menu/get': 600})
+
+        user = await client.user.get('openid')  # 请求接口
+        user = await client.user.get('openid')  # 命中缓存
+        await client.user.update_remark('openid', 'remark')  # 失效 user/info 缓存
+
+    :param ttls: 可选，接口到缓存时间（秒）的 dict，只有其中的接口会被缓存，
+                 默认为 ``DEFAULT_TTLS``
+    :param maxsize: 可选，进程内缓存的最大条目数，默认为 1024
+    :param storage: 可选，共享的 ``SessionStorage`` ，传入时不再使用进程内缓存
+    :param invalidations: 可选，写接口到需失效的读接口的映射，默认为 ``DEFAULT_INVALIDATIONS``
+    :param prefix: 可选，缓存键前缀，默认为 ``response_cache``
+    """
+
+    def __init__(self, ttls=None, maxsize=1024, storage=None,
+                 invalidations=None, prefix='response_cache'):
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.maxsize = maxsize
+        self.storage = storage
+        self.invalidations = DEFAULT_INVALIDATIONS if invalidations is None else invalidations
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _params(kwargs):
+        params = dict(kwargs.get('params') or {})
+        params.pop('access_token', None)
+        return params
+
+    def _key(self, appid, method, endpoint, kwargs):
+        params = self._params(kwargs)
+        data = kwargs.get('data')
+        payload = json.dumps(
+            [method, kwargs.get('api_base_url'), params, data],
+            sort_keys=True,
+            default=str
+        )
+        digest = hashlib.sha1(to_binary(payload)).hexdigest()
+        return '{0}:{1}:{2}:{3}'.format(self.prefix, appid, endpoint, digest), params, data
+
+    def _generation_key(self, endpoint):
+        return '{0}:{1}:generation'.format(self.prefix, endpoint)
+
+    async def _storage_key(self, key, endpoint):
+        generation = await self.storage.aget(self._generation_key(endpoint), 0)
+        return '{0}:{1}'.format(key, generation)
+
+    async def _get(self, key, endpoint):
+        if self.storage is not None:
+            entry = await self.storage.aget(await self._storage_key(key, endpoint))
+            if entry is None or entry['expires_at'] <= time.time():
+                return None
+            return entry
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry['expires_at'] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _set(self, key, endpoint, appid, params, data, value, ttl):
+        entry = {
+            'expires_at': time.time() + ttl,
+            'value': value,
+        }
+        if self.storage is not None:
+            await self.storage.aset(await self._storage_key(key, endpoint), entry, ttl)
+            return
+        entry.update(endpoint=endpoint, appid=appid, params=params, data=data)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, endpoint, match=None, appid=None):
+        """
+        失效读接口的缓存
+
+        :param endpoint: 读接口，如 ``user/info``
+        :param match: 可选，只失效请求参数（params 或 data）包含这些键值的缓存，
+                      使用共享 ``storage`` 时会失效该接口的全部缓存
+        :param appid: 可选，只失效该 appid 的缓存
+        """
+        if self.storage is not None:
+            key = self._generation_key(endpoint)
+            self.storage.set(key, self.storage.get(key, 0) + 1)
+            return
+        match = match or {}
+        for key, entry in list(self._entries.items()):
+            if entry['endpoint'] != endpoint:
+                continue
+            if appid is not None and entry['appid'] != appid:
+                continue
+            fields = dict(entry['data']) if isinstance(entry['data'], dict) else {}
+            fields.update(entry['params'])
+            if all(fields.get(name) == value for name, value in match.items()):
+                del self._entries[key]
+
+    async def ainvalidate(self, endpoint, match=None, appid=None):
+        """ ``invalidate`` 的异步版本，``storage`` 只支持异步方法时需要使用此方法 """
+        if self.storage is not None:
+            key = self._generation_key(endpoint)
+            await self.storage.aset(key, await self.storage.aget(key, 0) + 1)
+            return
+        self.invalidate(endpoint, match, appid)
+
+    def clear(self):
+        """ 清空进程内缓存 """
+        self._entries.clear()
+
+    async def _invalidate_after(self, appid, endpoint, kwargs):
+        rules = self.invalidations.get(endpoint)
+        if not rules:
+            return
+        fields = dict(kwargs.get('data') or {}) if isinstance(kwargs.get('data'), dict) else {}
+        fields.update(self._params(kwargs))
+        for read_endpoint, mapping in rules:
+            match = {}
+            for name, source in mapping.items():
+                if source not in fields:
+                    # 无法确定失效范围时失效该接口的全部缓存
+                    match = None
+                    break
+                match[name] = fields[source]
+            await self.ainvalidate(read_endpoint, match, appid)
+
+    async def request(self, client, method, endpoint, request, kwargs):
+        """
+        经过缓存调用接口
+
+        :param client: ``WeChatClient`` 实例
+        :param method: HTTP 方法
+        :param endpoint: 接口路径
+        :param request: 实际发起请求的协程函数，如 ``client.get``
+        :param kwargs: 传给 ``request`` 的参数
+        """
+        appid = getattr(client, 'appid', None)
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            result = await request(endpoint, **kwargs)
+            await self._invalidate_after(appid, endpoint, kwargs)
+            return result
+
+        key, params, data = self._key(appid, method, endpoint, kwargs)
+        entry = await self._get(key, endpoint)
+        if entry is not None:
+            self.hits += 1
+            return copy.deepcopy(entry['value'])
+
+        future = self._pending.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return copy.deepcopy(await asyncio.shield(future))
+
+        self.misses += 1
+        future = self._pending[key] = asyncio.ensure_future(request(endpoint, **kwargs))
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        try:
+            await self._set(key, endpoint, appid, params, data, copy.deepcopy(result), ttl)
+        except Exception:
+            logger.warning('Failed to cache response of %s', endpoint, exc_info=True)
+        return result
@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 
-import time
-
 from wechatpy_tornado.client.base import BaseWeChatClient
 from wechatpy_tornado.client import api
 
@@ -57,7 +55,7 @@ class WeChatClient(BaseWeChatClient):
         :return: 返回的 JSON 数据包
         """
         return await self._fetch_access_token(
-            url='https://api.weixin.qq.com/cgi-bin/token',
+            url='{0}token'.format(self.API_BASE_URL),
             params={
                 'grant_type': 'client_credential',
                 'appid': self.appid,
@@ -82,12 +80,10 @@ class WeChatComponentClient(WeChatClient):
         # 如果公众号是刚授权，外部还没有缓存access_token和refresh_token
         # 可以传入这两个值，session 会缓存起来。
         # 如果外部已经缓存，这里只需要传入 appid，component和session即可
-        cache_access_token = self.session.get(self.access_token_key)
-
-        if access_token and (not cache_access_token or cache_access_token != access_token):
-            self.session.set(self.access_token_key, access_token, 7200)
+        if access_token:
+            self._init_session_value(self.access_token_key, access_token, 7200, changed_only=True)
         if refresh_token:
-            self.session.set(self.refresh_token_key, refresh_token)
+            self._init_session_value(self.refresh_token_key, refresh_token)
 
     @property
     def access_token_key(self):
@@ -98,16 +94,25 @@ class WeChatComponentClient(WeChatClient):
         return '{0}_refresh_token'.format(self.appid)
 
     async def access_token(self):
-        access_token = self.session.get(self.access_token_key)
+        if self._session_writes:
+            await self._flush_session_writes()
+        access_token = await self.session.aget(self.access_token_key)
         if not access_token:
-            await self.fetch_access_token()
-            access_token = self.session.get(self.access_token_key)
+            await self._refresh_access_token()
+            access_token = await self.session.aget(self.access_token_key)
         return access_token
 
     @property
     def refresh_token(self):
+        """ 同步读取 refresh token ，协程中请使用 ``get_refresh_token`` """
         return self.session.get(self.refresh_token_key)
 
+    async def get_refresh_token(self):
+        """ 读取 refresh token """
+        if self._session_writes:
+            await self._flush_session_writes()
+        return await self.session.aget(self.refresh_token_key)
+
     async def fetch_access_token(self):
         """
         获取 access token
@@ -121,14 +126,9 @@ class WeChatComponentClient(WeChatClient):
         """
         expires_in = 7200
         result = await self.component.refresh_authorizer_token(
-            self.appid, self.refresh_token)
+            self.appid, await self.get_refresh_token())
 
         if 'expires_in' in result:
             expires_in = result['expires_in']
-        self.session.set(
-            self.access_token_key,
-            result['authorizer_access_token'],
-            expires_in
-        )
-        self.expires_at = int(time.time()) + expires_in
+        await self._save_access_token(result['authorizer_access_token'], expires_in)
         return result
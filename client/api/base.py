@@ -11,13 +11,29 @@ class BaseWeChatAPI(object):
     async def _get(self, url, **kwargs):
         if getattr(self, 'API_BASE_URL', None):
             kwargs['api_base_url'] = self.API_BASE_URL
+        cache = getattr(self._client, 'cache', None)
+        if cache is not None:
+            return await cache.request(self._client, 'GET', url, self._client.get, kwargs)
         return await self._client.get(url, **kwargs)
 
     async def _post(self, url, **kwargs):
         if getattr(self, 'API_BASE_URL', None):
             kwargs['api_base_url'] = self.API_BASE_URL
+        cache = getattr(self._client, 'cache', None)
+        if cache is not None:
+            return await cache.request(self._client, 'POST', url, self._client.post, kwargs)
         return await self._client.post(url, **kwargs)
 
+    async def _download(self, url, dest, resume=False, **kwargs):
+        if getattr(self, 'API_BASE_URL', None):
+            kwargs['api_base_url'] = self.API_BASE_URL
+        return await self._client.download(url, dest, resume, **kwargs)
+
+    def _iter_download(self, url, offset=0, **kwargs):
+        if getattr(self, 'API_BASE_URL', None):
+            kwargs['api_base_url'] = self.API_BASE_URL
+        return self._client.iter_download(url, offset, **kwargs)
+
     async def access_token(self):
         return await self._client.access_token()
 
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 import json
+from collections import OrderedDict
 from enum import IntEnum
 
+from tornado.httpclient import HTTPRequest
 
 from wechatpy_tornado.client.api.base import BaseWeChatAPI
+from wechatpy_tornado.multipart import MultipartEncoder
 
 
 class FileType(IntEnum):
@@ -308,37 +311,42 @@ class WeChatCloud(BaseWeChatAPI):
 
     async def upload_file(self, env, path):
         """
-        获取文件上传链接
+        上传文件
 
         详情请参考
         https://developers.weixin.qq.com/miniprogram/dev/wxcloud/reference-http-api/storage/uploadFile.html
 
         :param env: 云开发环境 ID
+        :param path: 文件路径，同时作为云存储中的路径
+        :return: 上传请求的响应
         """
-        # TODO: 此处传递的为文件句柄, 后期再测试是否有影响
+        res = await self._post(
+            'tcb/uploadfile',
+            data={
+                'env': env,
+                'path': path,
+            }
+        )
         with open(path, 'rb') as f:
-            res = await self._post(
-                'tcb/uploadfile',
-                data={
-                    'env': env,
-                    'path': path,
-                }
-            )
-            signature = res['authorization']
-            token = res['token']
-            cos_file_id = res['cos_file_id']
-            upload_res = await self._post(
+            # COS 要求 file 为最后一个表单字段
+            encoder = MultipartEncoder(OrderedDict([
+                ('key', path),
+                ('Signature', res['authorization']),
+                ('x-cos-security-token', res['token']),
+                ('x-cos-meta-fileid', res['cos_file_id']),
+                ('file', f),
+            ]))
+            # 上传地址是 COS 的预签名地址，不能附加 access_token
+            req = HTTPRequest(
                 res['url'],
-                files={
-                    'file': f,
-                    'key': path,
-                    'Signature': signature,
-                    'x-cos-security-token': token,
-                    'x-cos-meta-fileid': cos_file_id,
-                },
+                method='POST',
+                headers=encoder.headers,
+                body_producer=encoder,
+                request_timeout=self._client.timeout
             )
-            upload_res.raise_for_status()
-            return upload_res
+            upload_res = await self._client._http.fetch(req, raise_error=False)
+        upload_res.rethrow()
+        return upload_res
 
     async def download_files(self, env, file_list):
         """
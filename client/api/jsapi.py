@@ -30,6 +30,27 @@ class WeChatJSAPI(BaseWeChatAPI):
             params={'type': type}
         )
 
+    async def _refresh_ticket(self, type, ticket_key, expires_at_key):
+        ticket_response = await self.get_ticket(type)
+        expires_at = int(time.time()) + int(ticket_response['expires_in'])
+        await self.session.amset({
+            ticket_key: ticket_response['ticket'],
+            expires_at_key: expires_at,
+        })
+        return ticket_response
+
+    async def refresh_jsapi_ticket(self):
+        """
+        强制刷新微信 JS-SDK ticket 并缓存到 session
+
+        :return: 返回的 JSON 数据包
+        """
+        return await self._refresh_ticket(
+            'jsapi',
+            '{0}_jsapi_ticket'.format(self.appid),
+            '{0}_jsapi_ticket_expires_at'.format(self.appid)
+        )
+
     async def get_jsapi_ticket(self):
         """
         获取微信 JS-SDK ticket
@@ -40,14 +61,11 @@ class WeChatJSAPI(BaseWeChatAPI):
         """
         ticket_key = '{0}_jsapi_ticket'.format(self.appid)
         expires_at_key = '{0}_jsapi_ticket_expires_at'.format(self.appid)
-        ticket = self.session.get(ticket_key)
-        expires_at = self.session.get(expires_at_key, 0)
+        ticket, expires_at = await self.session.amget([ticket_key, expires_at_key])
+        expires_at = expires_at or 0
         if not ticket or expires_at < int(time.time()):
-            jsapi_ticket_response = await self.get_ticket('jsapi')
+            jsapi_ticket_response = await self.refresh_jsapi_ticket()
             ticket = jsapi_ticket_response['ticket']
-            expires_at = int(time.time()) + int(jsapi_ticket_response['expires_in'])
-            self.session.set(ticket_key, ticket)
-            self.session.set(expires_at_key, expires_at)
         return ticket
 
     def get_jsapi_signature(self, noncestr, ticket, timestamp, url):
@@ -70,6 +88,18 @@ class WeChatJSAPI(BaseWeChatAPI):
         signer.add_data(*data)
         return signer.signature
 
+    async def refresh_jsapi_card_ticket(self):
+        """
+        强制刷新卡券 api_ticket 并缓存到 session
+
+        :return: 返回的 JSON 数据包
+        """
+        return await self._refresh_ticket(
+            'wx_card',
+            '{0}_jsapi_card_ticket'.format(self.appid),
+            '{0}_jsapi_card_ticket_expires_at'.format(self.appid)
+        )
+
     async def get_jsapi_card_ticket(self):
         """
         获取 api_ticket：是用于调用微信卡券JS API的临时票据，有效期为7200 秒，通过access_token 来获取。
@@ -81,14 +111,13 @@ class WeChatJSAPI(BaseWeChatAPI):
         jsapi_card_ticket_key = '{0}_jsapi_card_ticket'.format(self.appid)
         jsapi_card_ticket_expire_at_key = '{0}_jsapi_card_ticket_expires_at'.format(self.appid)
 
-        ticket = self.session.get(jsapi_card_ticket_key)
-        expires_at = self.session.get(jsapi_card_ticket_expire_at_key, 0)
+        ticket, expires_at = await self.session.amget(
+            [jsapi_card_ticket_key, jsapi_card_ticket_expire_at_key]
+        )
+        expires_at = expires_at or 0
         if not ticket or int(expires_at) < int(time.time()):
-            ticket_response = await self.get_ticket('wx_card')
+            ticket_response = await self.refresh_jsapi_card_ticket()
             ticket = ticket_response['ticket']
-            expires_at = int(time.time()) + int(ticket_response['expires_in'])
-            self.session.set(jsapi_card_ticket_key, ticket)
-            self.session.set(jsapi_card_ticket_expire_at_key, expires_at)
         return ticket
 
     def get_jsapi_card_params(self, card_ticket, card_type, **kwargs):
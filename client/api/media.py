@@ -23,17 +23,37 @@ class WeChatMedia(BaseWeChatAPI):
         """
         return await self._post(url='media/upload', params={'type': media_type}, files={'media': media_file})
 
-    async def download(self, media_id):
+    async def download(self, media_id, dest=None, resume=False):
         """
         获取临时素材
         详情请参考
         https://developers.weixin.qq.com/doc/offiaccount/Asset_Management/Get_temporary_materials.html
 
         :param media_id: 媒体文件 ID
+        :param dest: 可选，流式下载的目标，文件路径或带 ``write`` 方法（可以是协程）的对象，
+                     不传时返回完整读入内存的响应
+        :param resume: 可选，``dest`` 为文件路径时是否断点续传
 
-        :return: requests 的 Response 实例
+        :return: tornado 的 HTTPResponse 实例，视频素材返回 JSON 数据包
         """
-        return await self._get('media/get', params={'media_id': media_id})
+        if dest is None:
+            return await self._get('media/get', params={'media_id': media_id})
+        return await self._download('media/get', dest, resume, params={'media_id': media_id})
+
+    def iter_download(self, media_id, offset=0):
+        """
+        流式获取临时素材，返回数据块的异步迭代器
+
+        :param media_id: 媒体文件 ID
+        :param offset: 可选，从该字节位置开始下载
+
+        使用示例::
+
+            async for chunk in client.media.iter_download('media_id'):
+                await sink.write(chunk)
+
+        """
+        return self._iter_download('media/get', offset, params={'media_id': media_id})
 
     async def get_url(self, media_id):
         """
@@ -3,6 +3,8 @@ from __future__ import absolute_import, unicode_literals
 
 from wechatpy_tornado.utils import to_text
 from wechatpy_tornado.client.api.base import BaseWeChatAPI
+from wechatpy_tornado.client.api.user import _follower_page
+from wechatpy_tornado.concurrency import prefetch
 
 
 class WeChatTag(BaseWeChatAPI):
@@ -166,6 +168,21 @@ class WeChatTag(BaseWeChatAPI):
             if not first_user_id:
                 return
 
+    def iter_tag_user_pages(self, tag_id, first_user_id=None, read_ahead=2):
+        """
+        按页获取标签下粉丝openid列表，处理当前页时会预取后面的页，
+        用法见 :meth:`wechatpy_tornado.client.api.user.WeChatUser.iter_follower_pages`
+
+        :param tag_id: 标签 ID
+        :param first_user_id: 可选。第一个拉取的 OPENID，不填默认从头开始拉取
+        :param read_ahead: 可选，最多预取的页数，默认为 2
+        :return: 返回一个异步迭代器，得到每一页的 :class:`FollowerPage`
+        """
+        async def fetch(next_openid):
+            return _follower_page(await self.get_tag_users(tag_id, next_openid))
+
+        return prefetch(fetch, first_user_id, read_ahead)
+
     async def get_black_list(self, begin_openid=None):
         """
         获取公众号的黑名单列表
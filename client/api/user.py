@@ -1,9 +1,24 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 
+from collections import namedtuple
+
 import six
 
 from wechatpy_tornado.client.api.base import BaseWeChatAPI
+from wechatpy_tornado.concurrency import bounded_map, chunked, prefetch
+
+# 一页粉丝 openid，next_openid 可用于中断后从下一页继续拉取
+FollowerPage = namedtuple('FollowerPage', ['openids', 'next_openid', 'total'])
+
+
+def _follower_page(follower_data):
+    # 没有下一页时也会返回 next_openid，需通过 data 是否存在判断
+    if 'data' not in follower_data:
+        return None, None
+    next_openid = follower_data.get('next_openid')
+    page = FollowerPage(follower_data['data']['openid'], next_openid, follower_data.get('total'))
+    return page, next_openid
 
 
 class WeChatUser(BaseWeChatAPI):
@@ -93,6 +108,32 @@ class WeChatUser(BaseWeChatAPI):
             if not first_user_id:
                 return
 
+    def iter_follower_pages(self, first_user_id=None, read_ahead=2):
+        """
+        按页获取所有的用户openid列表，处理当前页时会预取后面的页
+
+        每页为 :class:`FollowerPage` ，处理完一页后保存其 ``next_openid`` ，
+        中断后将其作为 ``first_user_id`` 传入即可从下一页继续拉取。
+
+        :param first_user_id: 可选。第一个拉取的 OPENID，不填默认从头开始拉取
+        :param read_ahead: 可选，最多预取的页数，默认为 2
+        :return: 返回一个异步迭代器，得到每一页的 :class:`FollowerPage`
+
+        使用示例::
+
+            from wechatpy_tornado import WeChatClient
+
+            client = WeChatClient('appid', 'secret')
+            async for page in client.user.iter_follower_pages(checkpoint):
+                await process(page.openids)
+                checkpoint = page.next_openid
+
+        """
+        async def fetch(next_openid):
+            return _follower_page(await self.get_followers(next_openid))
+
+        return prefetch(fetch, first_user_id, read_ahead)
+
     async def update_remark(self, user_id, remark):
         """
         设置用户备注名
@@ -177,6 +218,47 @@ class WeChatUser(BaseWeChatAPI):
         )
         return res
 
+    async def iter_batch(self, user_list, concurrency=4, rate=None, ordered=True):
+        """
+        批量获取任意数量用户的基本信息
+
+        自动按每次 100 个拆分请求并发执行，``user_list`` 可以是异步迭代器
+        （如 :meth:`iter_followers` 的返回值），只在有空闲并发位置时才会继续读取。
+
+        :param user_list: openid 或 ``{'openid': ..., 'lang': ...}`` 的可迭代对象或异步可迭代对象
+        :param concurrency: 可选，同时进行的请求数，默认为 4
+        :param rate: 可选，每秒最多发起的请求数，或 :class:`wechatpy_tornado.concurrency.TokenBucket`
+        :param ordered: 可选，为 True 时按输入顺序返回，否则按完成顺序返回，默认为 True
+        :return: 返回一个异步迭代器，得到每个用户的信息
+
+        使用示例::
+
+            from wechatpy_tornado import WeChatClient
+
+            client = WeChatClient('appid', 'secret')
+            async for user in client.user.iter_batch(client.user.iter_followers(), concurrency=8):
+                print(user['nickname'])
+
+        """
+        chunks = bounded_map(
+            self.get_batch,
+            chunked(user_list, 100),
+            concurrency=concurrency,
+            rate=rate,
+            ordered=ordered
+        )
+        async for users in chunks:
+            for user in users:
+                yield user
+
+    async def get_batch_all(self, user_list, concurrency=4, rate=None):
+        """
+        批量获取任意数量用户的基本信息，参数见 :meth:`iter_batch`
+
+        :return: 按输入顺序排列的用户信息 list
+        """
+        return [user async for user in self.iter_batch(user_list, concurrency, rate)]
+
     async def change_openid(self, from_appid, openid_list):
         '''微信公众号主体变更迁移用户 openid
 
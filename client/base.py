@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
+import os
+import re
 import time
+import asyncio
+import tempfile
+import contextvars
 import inspect
 import logging
 import warnings
@@ -10,15 +15,33 @@ import six
 from wechatpy_tornado.constants import WeChatErrorCode
 from wechatpy_tornado.utils import json, get_querystring
 from wechatpy_tornado.session.memorystorage import MemoryStorage
-from wechatpy_tornado.exceptions import WeChatClientException, APILimitedException
+from wechatpy_tornado.exceptions import WeChatClientException, APILimitedException, DownloadResultException
 from wechatpy_tornado.client.api.base import BaseWeChatAPI
+from wechatpy_tornado.multipart import CHUNK_SIZE, MultipartEncoder
+from wechatpy_tornado.instrument import APICall, record_fetch, record_timing, run_call
+from wechatpy_tornado.ratelimit import LIMITED_ERRCODES
 from wechatpy_tornado.utils import to_binary
+from wechatpy_tornado.transport import get_transport
 
-from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpclient import HTTPClientError, HTTPRequest, HTTPResponse
+from tornado.httputil import HTTPHeaders
 from urllib.parse import urlencode
+from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
+_CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+# 当前刷新 access token 持有的租约锁的 fencing token
+_access_token_fence = contextvars.ContextVar('wechatpy_tornado_access_token_fence', default=None)
+
+# 需要刷新 access token 后重试请求的错误码
+ACCESS_TOKEN_ERRCODES = (
+    WeChatErrorCode.INVALID_CREDENTIAL.value,
+    WeChatErrorCode.INVALID_ACCESS_TOKEN.value,
+    WeChatErrorCode.EXPIRED_ACCESS_TOKEN.value,
+)
+
 
 def _is_api_endpoint(obj):
     return isinstance(obj, BaseWeChatAPI)
@@ -27,6 +50,27 @@ def _is_api_endpoint(obj):
 class BaseWeChatClient(object):
     API_BASE_URL = ''
 
+    # 刷新 access token 时持有的 session 租约锁过期时间，单位秒
+    ACCESS_TOKEN_LOCK_TTL = 10
+    # 未获得租约锁时轮询新 access token 的间隔，单位秒
+    ACCESS_TOKEN_LOCK_POLL_INTERVAL = 0.1
+    # 异步写入和迭代下载时每次 Range 请求的字节数，也是缓冲数据的上限
+    DOWNLOAD_WINDOW_SIZE = 1024 * 1024
+
+    # in-flight access token fetch of this client, shared by concurrent callers
+    _access_token_future = None
+
+    # 可选的只读接口响应缓存，见 :class:`wechatpy_tornado.cache.ResponseCache`
+    cache = None
+    # 可选的客户端限速器，见 :class:`wechatpy_tornado.ratelimit.RateLimiter`
+    rate_limiter = None
+    # 可选的请求重试策略，默认不重试，见 :class:`wechatpy_tornado.retry.RetryPolicy`
+    retry_policy = None
+    # 可选的 GET 请求对冲策略，见 :class:`wechatpy_tornado.hedge.HedgePolicy`
+    hedge_policy = None
+    # 接口调用的 hooks，见 :class:`wechatpy_tornado.instrument.Hook`
+    hooks = ()
+
     def __new__(cls, *args, **kwargs):
         self = super(BaseWeChatClient, cls).__new__(cls)
         api_endpoints = inspect.getmembers(self, _is_api_endpoint)
@@ -37,7 +81,7 @@ class BaseWeChatClient(object):
         return self
 
     def __init__(self, appid, access_token=None, session=None, timeout=None, auto_retry=True):
-        self._http = AsyncHTTPClient()
+        self._http = get_transport()
         self.appid = appid
         self.expires_at = None
         self.session = session or MemoryStorage()
@@ -55,14 +99,59 @@ class BaseWeChatClient(object):
             storage = ShoveStorage(shove, prefix)
             self.session = storage
 
+        # 构造函数中无法等待异步存储，见 ``_init_session_value``
+        self._session_writes = []
         if access_token:
-            self.session.set(self.access_token_key, access_token)
+            self._init_session_value(self.access_token_key, access_token)
+
+    def _init_session_value(self, key, value, ttl=None, changed_only=False):
+        """
+        在构造函数中写入 session ，只支持异步方法的存储推迟到 ``_flush_session_writes``
+
+        :param changed_only: 可选，是否只在 session 中的值不同时写入
+        """
+        try:
+            if not changed_only or self.session.get(key) != value:
+                self.session.set(key, value, ttl)
+        except NotImplementedError:
+            self._session_writes.append((key, value, ttl, changed_only))
+
+    async def _flush_session_writes(self):
+        writes, self._session_writes = self._session_writes, []
+        for key, value, ttl, changed_only in writes:
+            if not changed_only or await self.session.aget(key) != value:
+                await self.session.aset(key, value, ttl)
+
+    @property
+    def _max_token_retries(self):
+        if self.retry_policy is None:
+            return 1
+        return self.retry_policy.max_token_retries
 
     @property
     def access_token_key(self):
         return '{0}_access_token'.format(self.appid)
 
+    @property
+    def access_token_expires_at_key(self):
+        return '{0}_expires_at'.format(self.access_token_key)
+
+    @property
+    def access_token_lock_key(self):
+        return '{0}_lock'.format(self.access_token_key)
+
+    @property
+    def access_token_fence_key(self):
+        return '{0}_fence'.format(self.access_token_key)
+
     async def _request(self, method, url_or_endpoint, **kwargs):
+        coro = self._send_request(method, url_or_endpoint, **kwargs)
+        if not self.hooks:
+            return await coro
+        call = APICall('client', self.appid, method, url_or_endpoint)
+        return await run_call(self.hooks, call, coro)
+
+    async def _send_request(self, method, url_or_endpoint, **kwargs):
         if not url_or_endpoint.startswith(('http://', 'https://')):
             api_base_url = kwargs.pop('api_base_url', self.API_BASE_URL)
             url = '{base}{endpoint}'.format(
@@ -74,56 +163,81 @@ class BaseWeChatClient(object):
 
         params = kwargs.pop('params', {})
         if 'access_token' not in params:
+            started_at = time.perf_counter()
             params['access_token'] = await self.access_token()
-
-        params = urlencode(dict((k, to_binary(v)) for k, v in params.items()))
-        url = '{0}?{1}'.format(url, params)
+            record_timing('token', started_at)
 
         data = kwargs.pop('data') if 'data' in kwargs else {}
-
-        if isinstance(data, dict):
+        timeout = kwargs.pop('timeout', self.timeout)
+        result_processor = kwargs.pop('result_processor', None)
+        token_retries = kwargs.pop('token_retries', 0)
+
+        req_kwargs = dict(kwargs)
+        files = req_kwargs.pop('files', None)
+        if files:
+            fields = dict(data) if isinstance(data, dict) else {}
+            fields.update(files)
+            encoder = MultipartEncoder(fields)
+            headers = dict(req_kwargs.get('headers') or {})
+            headers.update(encoder.headers)
+            req_kwargs['headers'] = headers
+            req_kwargs['body_producer'] = encoder
+        elif isinstance(data, dict) and method != 'GET':
+            started_at = time.perf_counter()
             body = json.dumps(data, ensure_ascii=False)
             body = body.encode('utf-8')
-            kwargs['body'] = body
+            req_kwargs['body'] = body
+            record_timing('encode', started_at)
+        req_kwargs['request_timeout'] = timeout
+
+        async def _fetch():
+            # 每次重试都按 params 重新生成请求，使用刷新后的 access token
+            query = urlencode(dict((k, to_binary(v)) for k, v in params.items()))
+            req = HTTPRequest('{0}?{1}'.format(url, query), method=method, **req_kwargs)
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire(self.appid, url)
+            started_at = time.perf_counter()
+            if self.hedge_policy is not None and self.hedge_policy.applies_to(req):
+                res = await self.hedge_policy.fetch(self._http.fetch, req)
+            else:
+                res = await self._http.fetch(req)
+            record_fetch(started_at, res)
 
-        kwargs['request_timeout'] = kwargs.pop('timeout', self.timeout)
-        result_processor = kwargs.pop('result_processor', None)
-        req = HTTPRequest(url, method=method, **kwargs)
-        res = await self._http.fetch(req)
+            if res.error is not None:
+                raise WeChatClientException(
+                    errcode=None,
+                    errmsg=None,
+                    client=self,
+                    request=req,
+                    response=res
+                )
 
-        if res.error is not None:
-            raise WeChatClientException(
-                errcode=None,
-                errmsg=None,
-                client=self,
-                request=req,
-                response=res
+            # keep the original arguments so the request can be replayed
+            # with a new access token
+            return await self._handle_result(
+                res, method, url, result_processor,
+                params=params, data=data, timeout=timeout,
+                token_retries=token_retries, **kwargs
             )
 
-        return self._handle_result(
-            res, method, url, result_processor, **kwargs
-        )
+        if self.retry_policy is None or 'streaming_callback' in kwargs or token_retries:
+            # 已经写出的流式数据无法撤回，不重试；
+            # 刷新 access token 后的重放已经在外层的重试策略中
+            return await _fetch()
+        return await self.retry_policy.execute(method, url, _fetch)
 
     def _decode_result(self, res):
+        started_at = time.perf_counter()
         try:
             result = json.loads(res.body.decode('utf-8', 'ignore'), strict=False)
         except (TypeError, ValueError):
             # Return origin response object if we can not decode it as JSON
             logger.debug('Can not decode response as JSON', exc_info=True)
             return res
+        finally:
+            record_timing('decode', started_at)
         return result
 
-    def decode_result(self, res):
-        try:
-            result = json.loads(res.body.decode('utf-8', 'ignore'), strict=False)
-        except (TypeError, ValueError):
-            # Return origin response object if we can not decode it as JSON
-            logger.debug('Can not decode response as JSON', exc_info=True)
-            return res
-        return result
-
-
-
     async def _handle_result(self, res, method=None, url=None,
                              result_processor=None, **kwargs):
         if not isinstance(res, dict):
@@ -144,22 +258,26 @@ class BaseWeChatClient(object):
         if 'errcode' in result and result['errcode'] != 0:
             errcode = result['errcode']
             errmsg = result.get('errmsg', errcode)
-            if self.auto_retry and errcode in (
-                    WeChatErrorCode.INVALID_CREDENTIAL.value,
-                    WeChatErrorCode.INVALID_ACCESS_TOKEN.value,
-                    WeChatErrorCode.EXPIRED_ACCESS_TOKEN.value):
+            token_retries = kwargs.pop('token_retries', 0)
+            if self.auto_retry and errcode in ACCESS_TOKEN_ERRCODES and \
+                    token_retries < self._max_token_retries:
                 logger.info('Access token expired, fetch a new one and retry request')
-                await self.fetch_access_token()
-                access_token = self.session.get(self.access_token_key)
-                kwargs['params']['access_token'] = access_token
-                return await self._request(
+                params = kwargs.get('params', {})
+                await self._refresh_access_token(params.get('access_token'))
+                params['access_token'] = await self.session.aget(self.access_token_key)
+                kwargs['params'] = params
+                kwargs['token_retries'] = token_retries + 1
+                # 在外层的重试策略和 hooks 中重放，不再嵌套
+                return await self._send_request(
                     method=method,
                     url_or_endpoint=url,
                     result_processor=result_processor,
                     **kwargs
                 )
-            elif errcode == WeChatErrorCode.OUT_OF_API_FREQ_LIMIT.value:
+            elif errcode in LIMITED_ERRCODES:
                 # api freq out of limit
+                if self.rate_limiter is not None and url:
+                    await self.rate_limiter.penalize(self.appid, url)
                 raise APILimitedException(
                     errcode,
                     errmsg,
@@ -176,7 +294,12 @@ class BaseWeChatClient(object):
                     response=res
                 )
 
-        return result if not result_processor else result_processor(result)
+        if not result_processor:
+            return result
+        started_at = time.perf_counter()
+        result = result_processor(result)
+        record_timing('process', started_at)
+        return result
 
     async def get(self, url, **kwargs):
         return await self._request(
@@ -204,6 +327,196 @@ class BaseWeChatClient(object):
                       DeprecationWarning, stacklevel=2)
         return await self.post(url, **kwargs)
 
+    async def _download(self, url_or_endpoint, write, offset=0, end=None, **kwargs):
+        """
+        Stream the response body into ``write`` chunk by chunk
+
+        JSON bodies, detected from the Content-Type header, are buffered and
+        handled like a normal API response instead.
+
+        :param write: 接收数据块的函数
+        :param offset: 可选，从该字节位置开始下载（HTTP Range）
+        :param end: 可选，下载到该字节位置（含）为止
+        :return: JSON 数据包，或 body 已写入 ``write`` 的 tornado HTTPResponse
+        """
+        params = kwargs.pop('params', {})
+        headers = dict(kwargs.pop('headers', None) or {})
+        token_retries = kwargs.pop('token_retries', 0)
+        if offset or end is not None:
+            headers['Range'] = 'bytes={0}-{1}'.format(offset, '' if end is None else end)
+        state = {'code': None, 'headers': None, 'json': False, 'skip': 0}
+        buffer = []
+
+        def header_callback(line):
+            if line.startswith('HTTP/'):
+                # a new response starts (e.g. after a redirect)
+                state['code'] = int(line.split()[1])
+                state['headers'] = HTTPHeaders()
+            elif line.strip():
+                state['headers'].parse_line(line)
+            else:
+                content_type = state['headers'].get('Content-Type', '')
+                state['json'] = content_type.startswith(('application/json', 'text/plain'))
+                # server ignored the Range header and sends the whole body
+                state['skip'] = offset if state['code'] == 200 else 0
+
+        def streaming_callback(chunk):
+            if state['json']:
+                buffer.append(chunk)
+                return
+            if state['code'] >= 400:
+                # 错误页面不写入，请求会抛出 HTTPClientError
+                return
+            if state['skip']:
+                skipped = min(state['skip'], len(chunk))
+                state['skip'] -= skipped
+                chunk = chunk[skipped:]
+                if not chunk:
+                    return
+            write(chunk)
+
+        # 刷新 access token 后的重放属于同一次调用，不再触发 hooks
+        request = self._send_request if token_retries else self._request
+        res = await request(
+            method='GET',
+            url_or_endpoint=url_or_endpoint,
+            params=params,
+            headers=headers,
+            header_callback=header_callback,
+            streaming_callback=streaming_callback,
+            **kwargs
+        )
+        if not state['json']:
+            return res
+
+        body = b''.join(buffer)
+        result = self._decode_result(HTTPResponse(res.request, res.code, res.headers, BytesIO(body)))
+        if isinstance(result, dict) and 'errcode' in result:
+            errcode = int(result['errcode'])
+            if self.auto_retry and errcode in ACCESS_TOKEN_ERRCODES and \
+                    token_retries < self._max_token_retries:
+                logger.info('Access token expired, fetch a new one and retry download')
+                await self._refresh_access_token(params.get('access_token'))
+                params['access_token'] = await self.session.aget(self.access_token_key)
+                return await self._download(
+                    url_or_endpoint, write, offset, end,
+                    params=params, headers=headers, token_retries=token_retries + 1, **kwargs
+                )
+        return await self._handle_result(
+            HTTPResponse(res.request, res.code, res.headers, BytesIO(body)),
+            'GET', url_or_endpoint, params=params, token_retries=self._max_token_retries, **kwargs
+        )
+
+    async def download(self, url_or_endpoint, dest, resume=False, **kwargs):
+        """
+        流式下载接口返回的文件，内存占用与文件大小无关
+
+        :param url_or_endpoint: 接口地址
+        :param dest: 下载目标，文件路径，或带 ``write`` 方法的对象，``write`` 可以是协程函数
+        :param resume: 可选，``dest`` 为文件路径时是否从已下载的位置断点续传
+        :return: 返回的 JSON 数据包（如视频素材的下载地址），或 tornado 的 HTTPResponse ，
+                 返回 JSON 数据包时 ``dest`` 为文件路径的文件不会被创建或清空
+        """
+        if isinstance(dest, (six.string_types, os.PathLike)):
+            offset = 0
+            if resume and os.path.exists(dest):
+                offset = os.path.getsize(dest)
+            files = []
+
+            def write(chunk):
+                # 收到文件内容时才打开，返回 JSON 数据包时不影响已有的文件
+                if not files:
+                    files.append(open(dest, 'ab' if offset else 'wb'))
+                files[0].write(chunk)
+
+            try:
+                res = await self._download(url_or_endpoint, write, offset, **kwargs)
+                if not files and isinstance(res, HTTPResponse):
+                    # 空文件
+                    write(b'')
+                return res
+            except HTTPClientError as e:
+                if offset and e.code == 416:
+                    # Range Not Satisfiable, already downloaded
+                    return e.response
+                raise
+            finally:
+                for f in files:
+                    f.close()
+
+        if not inspect.iscoroutinefunction(dest.write):
+            return await self._download(url_or_endpoint, dest.write, **kwargs)
+
+        result = {}
+        async for chunk in self._iter_download_windows(url_or_endpoint, 0, result, **kwargs):
+            await dest.write(chunk)
+        return result.get('response')
+
+    async def iter_download(self, url_or_endpoint, offset=0, **kwargs):
+        """
+        流式下载接口返回的文件，返回数据块的异步迭代器
+
+        文件按 ``DOWNLOAD_WINDOW_SIZE`` 分段请求，上一段被消费完才请求下一段，
+        服务端不支持 Range 时整个文件先写入临时文件
+
+        接口返回 JSON 数据包（如视频素材的下载地址）而不是文件时，
+        抛出 :class:`wechatpy_tornado.exceptions.DownloadResultException` ，``result`` 为该数据包
+
+        :param url_or_endpoint: 接口地址
+        :param offset: 可选，从该字节位置开始下载
+        """
+        result = {}
+        async for chunk in self._iter_download_windows(url_or_endpoint, offset, result, **kwargs):
+            yield chunk
+        res = result['response']
+        if not isinstance(res, HTTPResponse):
+            raise DownloadResultException(res, client=self)
+
+    async def _iter_download_windows(self, url_or_endpoint, offset, result, **kwargs):
+        """
+        Download the file one Range window at a time, spooling each window
+        so at most ``DOWNLOAD_WINDOW_SIZE`` bytes are held in memory, and
+        only request the next window once the caller consumed this one
+
+        :param result: 保存最后一次请求的响应（或 JSON 数据包）的 dict
+        """
+        window = self.DOWNLOAD_WINDOW_SIZE
+        params = kwargs.pop('params', {})
+        start = offset
+        while True:
+            with tempfile.SpooledTemporaryFile(max_size=window) as f:
+                try:
+                    res = await self._download(
+                        url_or_endpoint, f.write, offset, offset + window - 1,
+                        params=dict(params), **kwargs
+                    )
+                except HTTPClientError as e:
+                    if e.code == 416 and 'response' in result:
+                        # Range Not Satisfiable, the last window ended at the end of the file
+                        return
+                    raise
+                result['response'] = res
+                if not isinstance(res, HTTPResponse):
+                    if offset != start:
+                        # 已经返回了部分文件内容
+                        raise DownloadResultException(res, client=self)
+                    return
+                f.seek(0)
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            if res.code != 206:
+                # the server ignored the Range header and sent the whole file
+                return
+            match = _CONTENT_RANGE_RE.match(res.headers.get('Content-Range', ''))
+            if match is None:
+                return
+            offset = int(match.group(2)) + 1
+            if match.group(3) != '*' and offset >= int(match.group(3)):
+                return
+
     async def _fetch_access_token(self, url, params):
         """ The real fetch access token """
         logger.info('Fetching access token')
@@ -236,20 +549,121 @@ class BaseWeChatClient(object):
         expires_in = 7200
         if 'expires_in' in result:
             expires_in = result['expires_in']
-        self.session.set(
-            self.access_token_key,
-            result['access_token'],
-            expires_in
-        )
-        self.expires_at = int(time.time()) + expires_in
+        await self._save_access_token(result['access_token'], expires_in)
         return result
 
+    async def _save_access_token(self, access_token, expires_in):
+        """
+        保存新获取的 access token
+
+        在租约锁内获取时，按锁的 fencing token 写入，
+        租约已过期的持有者不会覆盖之后的持有者写入的 access token
+        """
+        expires_at = int(time.time()) + expires_in
+        mapping = {
+            self.access_token_key: access_token,
+            self.access_token_expires_at_key: expires_at,
+        }
+        fence = _access_token_fence.get()
+        if fence is None:
+            await self.session.amset(mapping, expires_in)
+        elif not await self.session.aset_fenced(mapping, self.access_token_fence_key, fence, expires_in):
+            logger.warning('Access token lease %s expired, discard the fetched access token', fence)
+            await self._load_access_token_expires_at()
+            return
+        self.expires_at = expires_at
+
     async def fetch_access_token(self):
         raise NotImplementedError()
 
+    async def _refresh_access_token(self, stale_token=None):
+        """
+        Refresh access token, concurrent callers share one in-flight fetch
+        per client; clients sharing a session coordinate through the
+        session lease
+
+        :param stale_token: 可选，调用方认为已失效的 access token，
+                            如果缓存中的 token 已被其他请求刷新则不再重复获取
+        """
+        key = self.access_token_key
+        future = self._access_token_future
+        if future is None:
+            if stale_token:
+                self.session.invalidate(key, self.access_token_expires_at_key)
+                access_token = await self.session.aget(key)
+                if access_token and access_token != stale_token:
+                    # already refreshed by another request
+                    await self._load_access_token_expires_at()
+                    return
+            # 共享的请求不属于任何一次接口调用，不继承第一个调用方的 APICall
+            future = contextvars.Context().run(
+                asyncio.ensure_future, self._fetch_access_token_exclusive(stale_token)
+            )
+            self._access_token_future = future
+
+            def _done(f):
+                if self._access_token_future is f:
+                    self._access_token_future = None
+
+            future.add_done_callback(_done)
+        # shield the shared fetch from cancellation of a single waiter
+        return await asyncio.shield(future)
+
+    async def _load_access_token_expires_at(self):
+        """ Adopt the access token expire time shared through session """
+        expires_at = await self.session.aget(self.access_token_expires_at_key)
+        if expires_at:
+            self.expires_at = expires_at
+        return expires_at
+
+    async def _is_access_token_refreshed(self, stale_token=None):
+        """
+        Check whether the access token in session has been refreshed by
+        another process, and adopt its expire time if so
+        """
+        self.session.invalidate(self.access_token_key, self.access_token_expires_at_key)
+        access_token, expires_at = await self.session.amget(
+            [self.access_token_key, self.access_token_expires_at_key]
+        )
+        if not access_token or access_token == stale_token:
+            return False
+        if not expires_at or expires_at - time.time() <= 60:
+            return False
+        self.expires_at = expires_at
+        return True
+
+    async def _fetch_access_token_exclusive(self, stale_token=None):
+        """
+        Fetch access token while holding the session lease, so only one
+        process sharing the session refreshes it, the others poll the
+        session until the new access token shows up
+        """
+        while True:
+            if await self._is_access_token_refreshed(stale_token):
+                return
+            lock = await self.session.aacquire_lock(
+                self.access_token_lock_key,
+                self.ACCESS_TOKEN_LOCK_TTL
+            )
+            if lock is not None:
+                try:
+                    # the previous lease holder may have just finished
+                    if await self._is_access_token_refreshed(stale_token):
+                        return
+                    fence = _access_token_fence.set(lock)
+                    try:
+                        return await self.fetch_access_token()
+                    finally:
+                        _access_token_fence.reset(fence)
+                finally:
+                    await self.session.arelease_lock(self.access_token_lock_key, lock)
+            await asyncio.sleep(self.ACCESS_TOKEN_LOCK_POLL_INTERVAL)
+
     async def access_token(self):
         """ WeChat access token """
-        access_token = self.session.get(self.access_token_key)
+        if self._session_writes:
+            await self._flush_session_writes()
+        access_token = await self.session.aget(self.access_token_key)
         if access_token:
             if not self.expires_at:
                 # user provided access_token, just return it
@@ -259,5 +673,5 @@ class BaseWeChatClient(object):
             if self.expires_at - timestamp > 60:
                 return access_token
 
-        await self.fetch_access_token()
-        return self.session.get(self.access_token_key)
+        await self._refresh_access_token()
+        return await self.session.aget(self.access_token_key)
@@ -15,7 +15,6 @@ import time
 import warnings
 
 import six
-import xmltodict
 from urllib.parse import quote
 from wechatpy_tornado.client import WeChatComponentClient
 from wechatpy_tornado.constants import WeChatErrorCode
@@ -26,9 +25,12 @@ from wechatpy_tornado.fields import DateTimeField, StringField
 from wechatpy_tornado.messages import MessageMetaClass
 from wechatpy_tornado.session.memorystorage import MemoryStorage
 from wechatpy_tornado.utils import get_querystring, json, to_binary, to_text, ObjectDict
-from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpclient import HTTPRequest
 from urllib.parse import urlencode
 from wechatpy_tornado.utils import to_binary
+from wechatpy_tornado.transport import get_transport
+from wechatpy_tornado.instrument import APICall, record_fetch, record_timing, run_call
+from wechatpy_tornado.xmlparser import parse_xml
 
 logger = logging.getLogger(__name__)
 
@@ -115,6 +117,11 @@ class ComponentUnknownMessage(BaseComponentMessage):
 class BaseWeChatComponent(object):
     API_BASE_URL = 'https://api.weixin.qq.com/cgi-bin'
 
+    # 可选的请求重试策略，默认不重试，见 :class:`wechatpy_tornado.retry.RetryPolicy`
+    retry_policy = None
+    # 接口调用的 hooks，见 :class:`wechatpy_tornado.instrument.Hook`
+    hooks = ()
+
     def __init__(self,
                  component_appid,
                  component_appsecret,
@@ -128,7 +135,7 @@ class BaseWeChatComponent(object):
         :param component_token: 公众号消息校验Token
         :param encoding_aes_key: 公众号消息加解密Key
         """
-        self._http = AsyncHTTPClient()
+        self._http = get_transport()
         self.component_appid = component_appid
         self.component_appsecret = component_appsecret
         self.expires_at = None
@@ -150,9 +157,21 @@ class BaseWeChatComponent(object):
 
     @property
     def component_verify_ticket(self):
+        """ 同步读取 component_verify_ticket ，协程中请使用 ``get_component_verify_ticket`` """
         return self.session.get('component_verify_ticket')
 
+    async def get_component_verify_ticket(self):
+        """ 读取 component_verify_ticket """
+        return await self.session.aget('component_verify_ticket')
+
     async def _request(self, method, url_or_endpoint, **kwargs):
+        coro = self._send_request(method, url_or_endpoint, **kwargs)
+        if not self.hooks:
+            return await coro
+        call = APICall('component', self.component_appid, method, url_or_endpoint)
+        return await run_call(self.hooks, call, coro)
+
+    async def _send_request(self, method, url_or_endpoint, **kwargs):
         if not url_or_endpoint.startswith(('http://', 'https://')):
             api_base_url = kwargs.pop('api_base_url', self.API_BASE_URL)
             url = '{base}{endpoint}'.format(
@@ -163,51 +182,71 @@ class BaseWeChatComponent(object):
             url = url_or_endpoint
 
         params = kwargs.pop('params', {})
-
-        if isinstance(kwargs['params'], dict) and \
-                        'component_access_token' not in params:
-            params[
-                'component_access_token'] = await self.access_token()
-
-        params = urlencode(dict((k, to_binary(v)) for k, v in params.items()))
-        url = '{0}?{1}'.format(url, params)
+        if 'component_access_token' not in params:
+            started_at = time.perf_counter()
+            params['component_access_token'] = await self.access_token()
+            record_timing('token', started_at)
 
         data = kwargs.pop('data', {})
+        token_retries = kwargs.pop('token_retries', 0)
+
+        req_kwargs = dict(kwargs)
+        if isinstance(data, dict) and method != 'GET':
+            started_at = time.perf_counter()
+            req_kwargs['body'] = json.dumps(data)
+            record_timing('encode', started_at)
+
+        async def _fetch():
+            # 每次重试都按 params 重新生成请求，使用刷新后的 access token
+            query = urlencode(dict((k, to_binary(v)) for k, v in params.items()))
+            req = HTTPRequest('{0}?{1}'.format(url, query), method=method, **req_kwargs)
+            started_at = time.perf_counter()
+            res = await self._http.fetch(req)
+            record_fetch(started_at, res)
+            if res.error is not None:
+                raise WeChatClientException(
+                    errcode=None,
+                    errmsg=None,
+                    client=self,
+                    request=req,
+                    response=res
+                )
 
-        if isinstance(data, dict):
-            kwargs['body'] = json.dumps(data)
-
-        req = HTTPRequest(url, method=method, **kwargs)
-        res = await self._http.fetch(req)
-        if res.error is not None:
-            raise WeChatClientException(
-                errcode=None,
-                errmsg=None,
-                client=self,
-                request=req,
-                response=res
+            return await self._handle_result(
+                res, method, url,
+                params=params, data=data, token_retries=token_retries, **kwargs
             )
 
-        return await self._handle_result(res, method, url, **kwargs)
+        if self.retry_policy is None or token_retries:
+            # 刷新 access token 后的重放已经在外层的重试策略中
+            return await _fetch()
+        return await self.retry_policy.execute(method, url, _fetch)
 
     async def _handle_result(self, res, method=None, url=None, **kwargs):
+        started_at = time.perf_counter()
         result = json.loads(res.body.decode('utf-8', 'ignore'), strict=False)
+        record_timing('decode', started_at)
         if 'errcode' in result:
             result['errcode'] = int(result['errcode'])
 
         if 'errcode' in result and result['errcode'] != 0:
             errcode = result['errcode']
             errmsg = result.get('errmsg', errcode)
+            token_retries = kwargs.pop('token_retries', 0)
+            max_token_retries = self.retry_policy.max_token_retries if self.retry_policy else 1
             if self.auto_retry and errcode in (
                     WeChatErrorCode.INVALID_CREDENTIAL.value,
                     WeChatErrorCode.INVALID_ACCESS_TOKEN.value,
-                    WeChatErrorCode.EXPIRED_ACCESS_TOKEN.value):
+                    WeChatErrorCode.EXPIRED_ACCESS_TOKEN.value) and \
+                    token_retries < max_token_retries:
                 logger.info('Component access token expired, fetch a new one and retry request')
                 await self.fetch_access_token()
-                kwargs['params']['component_access_token'] = self.session.get(
+                kwargs['params']['component_access_token'] = await self.session.aget(
                     'component_access_token'
                 )
-                return await self._request(
+                kwargs['token_retries'] = token_retries + 1
+                # 在外层的重试策略和 hooks 中重放，不再嵌套
+                return await self._send_request(
                     method=method,
                     url_or_endpoint=url,
                     **kwargs
@@ -248,14 +287,14 @@ class BaseWeChatComponent(object):
             data=json.dumps({
                 'component_appid': self.component_appid,
                 'component_appsecret': self.component_appsecret,
-                'component_verify_ticket': self.component_verify_ticket
+                'component_verify_ticket': await self.get_component_verify_ticket()
             })
         )
 
     async def _fetch_access_token(self, url, data):
         """ The real fetch access token """
         logger.info('Fetching component access token')
-        req = HTTPRequest(url, body=data)
+        req = HTTPRequest(url, method='POST', body=data)
         res = await self._http.fetch(req)
 
         if res.error is not None:
@@ -280,7 +319,7 @@ class BaseWeChatComponent(object):
         expires_in = 7200
         if 'expires_in' in result:
             expires_in = result['expires_in']
-        self.session.set(
+        await self.session.aset(
             'component_access_token',
             result['component_access_token'],
             expires_in
@@ -290,7 +329,7 @@ class BaseWeChatComponent(object):
 
     async def access_token(self):
         """ WeChat component access token """
-        access_token = self.session.get('component_access_token')
+        access_token = await self.session.aget('component_access_token')
         if access_token:
             if not self.expires_at:
                 # user provided access_token, just return it
@@ -301,7 +340,7 @@ class BaseWeChatComponent(object):
                 return access_token
 
         await self.fetch_access_token()
-        return self.session.get('component_access_token')
+        return await self.session.aget('component_access_token')
 
     async def get(self, url, **kwargs):
         return await self._request(
@@ -382,12 +421,12 @@ class WeChatComponent(BaseWeChatComponent):
             expires_in = 7200
             if 'expires_in' in result['authorization_info']:
                 expires_in = result['authorization_info']['expires_in']
-            self.session.set(access_token_key, access_token, expires_in)
+            await self.session.aset(access_token_key, access_token, expires_in)
         if 'authorizer_refresh_token' in result['authorization_info'] \
                 and result['authorization_info']['authorizer_refresh_token']:
             refresh_token = result['authorization_info']['authorizer_refresh_token']
             refresh_token_key = '{0}_refresh_token'.format(authorizer_appid)
-            self.session.set(refresh_token_key, refresh_token)  # refresh_token 需要永久储存，不建议使用内存储存，否则每次重启服务需要重新扫码授权
+            await self.session.aset(refresh_token_key, refresh_token)  # refresh_token 需要永久储存，不建议使用内存储存，否则每次重启服务需要重新扫码授权
         return result
 
     async def refresh_authorizer_token(
@@ -499,8 +538,7 @@ class WeChatComponent(BaseWeChatComponent):
         """
         access_token_key = '{0}_access_token'.format(authorizer_appid)
         refresh_token_key = '{0}_refresh_token'.format(authorizer_appid)
-        access_token = self.session.get(access_token_key)
-        refresh_token = self.session.get(refresh_token_key)
+        access_token, refresh_token = await self.session.amget([access_token_key, refresh_token_key])
         assert refresh_token
 
         if not access_token:
@@ -514,7 +552,7 @@ class WeChatComponent(BaseWeChatComponent):
             expires_in = 7200
             if 'expires_in' in ret:
                 expires_in = ret['expires_in']
-            self.session.set(access_token_key, access_token, expires_in)
+            await self.session.aset(access_token_key, access_token, expires_in)
 
         return WeChatComponentClient(
             authorizer_appid,
@@ -532,12 +570,12 @@ class WeChatComponent(BaseWeChatComponent):
         :params nonce: 随机数
         """
         content = self.crypto.decrypt_message(msg, msg_signature, timestamp, nonce)
-        message = xmltodict.parse(to_text(content))['xml']
+        message = parse_xml(to_text(content))['xml']
         message_type = message['InfoType'].lower()
         message_class = COMPONENT_MESSAGE_TYPES.get(message_type, ComponentUnknownMessage)
         msg = message_class(message)
         if msg.type == 'component_verify_ticket':
-            self.session.set(msg.type, msg.verify_ticket)
+            await self.session.aset(msg.type, msg.verify_ticket)
         elif msg.type in ('authorized', 'updateauthorized'):
             msg.query_auth_result = await self.query_auth(msg.authorization_code)
         return msg
@@ -555,7 +593,7 @@ class WeChatComponent(BaseWeChatComponent):
                       'Use `parse_message` instead',
                       DeprecationWarning, stacklevel=2)
         content = self.crypto.decrypt_message(msg, signature, timestamp, nonce)
-        message = xmltodict.parse(to_text(content))['xml']
+        message = parse_xml(to_text(content))['xml']
         o = ComponentVerifyTicketMessage(message)
         self.session.set(o.type, o.verify_ticket)
 
@@ -572,7 +610,7 @@ class WeChatComponent(BaseWeChatComponent):
                       'Use `parse_message` instead',
                       DeprecationWarning, stacklevel=2)
         content = self.crypto.decrypt_message(msg, signature, timestamp, nonce)
-        message = xmltodict.parse(to_text(content))['xml']
+        message = parse_xml(to_text(content))['xml']
         return ComponentUnauthorizedMessage(message)
 
     def get_component_oauth(self, authorizer_appid):
@@ -600,7 +638,7 @@ class ComponentOAuth(object):
         :param app_id: 微信公众号 app_id
         :param component: WeChatComponent
         """
-        self._http = AsyncHTTPClient()
+        self._http = get_transport()
         self.app_id = app_id
         self.component = component
         if self.component is None:
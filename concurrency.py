@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.concurrency
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    This module provides helpers for running many API calls with bounded
+    concurrency and a rate budget.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import collections
+import time
+
+
+class TokenBucket(object):
+    """
+    令牌桶限速器
+
+    :param rate: 每秒产生的令牌数
+    :param capacity: 可选，桶的容量，即允许的突发请求数，默认等于 ``rate``
+    """
+
+    def __init__(self, rate, capacity=None):
+        assert rate > 0
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self, tokens=1):
+        """
+        预留令牌，不等待
+
+        :return: 需要等待的秒数，为 0 时可立即执行
+        """
+        self._refill()
+        # 允许欠账，后来者按顺序排在后面等待
+        self.tokens -= tokens
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+    async def acquire(self, tokens=1):
+        """ 获取令牌，令牌不足时等待 """
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+async def _aiter(iterable):
+    if hasattr(iterable, '__aiter__'):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+async def chunked(iterable, size):
+    """
+    将同步或异步可迭代对象按 ``size`` 分块，返回异步迭代器，不会一次性读入全部数据
+
+    :param iterable: 可迭代对象或异步可迭代对象
+    :param size: 每块的最大长度
+    """
+    chunk = []
+    async for item in _aiter(iterable):
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def bounded_map(func, iterable, concurrency=4, rate=None, ordered=True):
+    """
+    以有限的并发数对每个元素调用协程函数 ``func`` ，返回结果的异步迭代器
+
+    只有在有空闲并发位置时才会从 ``iterable`` 读取下一个元素，
+    因此可以安全地处理非常大的异步迭代器。任一调用出错时取消其余调用并抛出异常。
+
+    :param func: 协程函数，接收一个元素
+    :param iterable: 可迭代对象或异步可迭代对象
+    :param concurrency: 可选，最大并发数，默认为 4
+    :param rate: 可选，每秒最多发起的调用数，或 :class:`TokenBucket` 实例，默认不限制
+    :param ordered: 可选，为 True 时按输入顺序返回结果，否则按完成顺序返回，默认为 True
+    """
+    assert concurrency > 0
+    if rate is not None and not isinstance(rate, TokenBucket):
+        rate = TokenBucket(rate)
+
+    async def run(item):
+        if rate is not None:
+            await rate.acquire()
+        return await func(item)
+
+    items = _aiter(iterable)
+    tasks = collections.deque()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(tasks) < concurrency:
+                try:
+                    item = await items.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                tasks.append(asyncio.ensure_future(run(item)))
+            if not tasks:
+                return
+            if ordered:
+                task = tasks.popleft()
+                yield await task
+            else:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                for task in done:
+                    yield task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def prefetch(fetch, cursor=None, read_ahead=2):
+    """
+    预取分页数据，在调用方处理当前页时就请求下一页
+
+    :param fetch: 协程函数，接收游标，返回 ``(page, next_cursor)`` ，
+                  ``page`` 为 None 表示没有更多数据，``next_cursor`` 为空表示这是最后一页
+    :param cursor: 可选，起始游标
+    :param read_ahead: 可选，最多预取的页数，默认为 2
+    :return: 返回一个异步迭代器，得到每一页的 ``page``
+    """
+    assert read_ahead > 0
+    queue = asyncio.Queue(read_ahead)
+    finished = object()
+
+    async def produce(cursor):
+        try:
+            while True:
+                page, cursor = await fetch(cursor)
+                if page is None:
+                    break
+                await queue.put(page)
+                if not cursor:
+                    break
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(finished)
+
+    task = asyncio.ensure_future(produce(cursor))
+    try:
+        while True:
+            page = await queue.get()
+            if page is finished:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        task.cancel()
@@ -292,6 +292,9 @@ class WeChatErrorCode(IntEnum):
     # 模板消息数量超过限制
     OUT_OF_TEMPLATE_SIZE_LIMIT = 45026
 
+    # 客服接口下行条数超过上限
+    OUT_OF_CUSTOM_MESSAGE_LIMIT = 45047
+
     # 模板消息与行业信息冲突
     TEMPLATE_CONFLICT_WITH_INDUSTRY = 45027
 
@@ -22,6 +22,8 @@ from wechatpy_tornado.exceptions import (
 )
 from wechatpy_tornado.crypto.base import BasePrpCrypto, WeChatCipher, BaseRefundCrypto
 from wechatpy_tornado.crypto.pkcs7 import PKCS7Encoder
+from wechatpy_tornado.offload import decrypt_and_parse, render_and_encrypt
+from wechatpy_tornado.xmlparser import parse_xml
 
 
 def _get_signature(token, timestamp, nonce, encrypt):
@@ -41,12 +43,54 @@ class PrpCrypto(BasePrpCrypto):
 
 class BaseWeChatCrypto(object):
 
+    # 设置为 :class:`wechatpy_tornado.offload.CryptoPool` 后，
+    # ``decrypt_message_async`` 和 ``encrypt_message_async`` 在其中执行
+    pool = None
+
     def __init__(self, token, encoding_aes_key, _id):
         encoding_aes_key = to_binary(encoding_aes_key + '=')
         self.key = base64.b64decode(encoding_aes_key)
         assert len(self.key) == 32
         self.token = token
         self._id = _id
+        self._cryptos = {}
+
+    def _get_crypto(self, crypto_class):
+        """ 同一个 key 的 ``crypto_class`` 实例只创建一次 """
+        crypto = self._cryptos.get(crypto_class)
+        if crypto is None:
+            crypto = self._cryptos[crypto_class] = crypto_class(self.key)
+        return crypto
+
+    def __getstate__(self):
+        # 加密对象和 pool 不能 pickle
+        state = self.__dict__.copy()
+        state['_cryptos'] = {}
+        state.pop('pool', None)
+        return state
+
+    def parse_message(self, xml):
+        raise NotImplementedError()
+
+    async def decrypt_message_async(self, msg, signature, timestamp, nonce):
+        """
+        解密并解析消息，设置了 ``pool`` 时在其中执行
+
+        :return: 消息或事件对象
+        """
+        if self.pool is None:
+            return self.parse_message(self.decrypt_message(msg, signature, timestamp, nonce))
+        return await self.pool.submit(decrypt_and_parse, self, msg, signature, timestamp, nonce)
+
+    async def encrypt_message_async(self, msg, nonce, timestamp=None):
+        """
+        渲染并加密回复，设置了 ``pool`` 时在其中执行
+
+        :param msg: 回复对象或 XML 字符串
+        """
+        if self.pool is None:
+            return self.encrypt_message(msg, nonce, timestamp)
+        return await self.pool.submit(render_and_encrypt, self, msg, nonce, timestamp)
 
     def _check_signature(self,
                          signature,
@@ -57,7 +101,7 @@ class BaseWeChatCrypto(object):
         _signature = _get_signature(self.token, timestamp, nonce, echo_str)
         if _signature != signature:
             raise InvalidSignatureException()
-        pc = crypto_class(self.key)
+        pc = self._get_crypto(crypto_class)
         return pc.decrypt(echo_str, self._id)
 
     def _encrypt_message(self,
@@ -74,9 +118,9 @@ class BaseWeChatCrypto(object):
 <Nonce><![CDATA[{nonce}]]></Nonce>
 </xml>"""
         if isinstance(msg, BaseReply):
-            msg = msg.render()
+            msg = msg.render(binary=True)
         timestamp = timestamp or to_text(int(time.time()))
-        pc = crypto_class(self.key)
+        pc = self._get_crypto(crypto_class)
         encrypt = to_text(pc.encrypt(msg, self._id))
         signature = _get_signature(self.token, timestamp, nonce, encrypt)
         return to_text(xml.format(
@@ -93,15 +137,13 @@ class BaseWeChatCrypto(object):
                          nonce,
                          crypto_class=None):
         if not isinstance(msg, dict):
-            import xmltodict
-
-            msg = xmltodict.parse(to_text(msg))['xml']
+            msg = parse_xml(to_text(msg))['xml']
 
         encrypt = msg['Encrypt']
         _signature = _get_signature(self.token, timestamp, nonce, encrypt)
         if _signature != signature:
             raise InvalidSignatureException()
-        pc = crypto_class(self.key)
+        pc = self._get_crypto(crypto_class)
         return pc.decrypt(encrypt, self._id)
 
 
@@ -111,6 +153,11 @@ class WeChatCrypto(BaseWeChatCrypto):
         super(WeChatCrypto, self).__init__(token, encoding_aes_key, app_id)
         self.app_id = app_id
 
+    def parse_message(self, xml):
+        from wechatpy_tornado.parser import parse_message
+
+        return parse_message(xml)
+
     def encrypt_message(self, msg, nonce, timestamp=None):
         return self._encrypt_message(msg, nonce, timestamp, PrpCrypto)
 
@@ -153,20 +200,26 @@ class WeChatRefundCrypto(object):
     def __init__(self, key):
         self.key = to_binary(hashlib.md5(to_binary(key)).hexdigest())
         assert len(self.key) == 32
+        self._cryptos = {}
+
+    def _get_crypto(self, crypto_class):
+        crypto = self._cryptos.get(crypto_class)
+        if crypto is None:
+            crypto = self._cryptos[crypto_class] = crypto_class(self.key)
+        return crypto
 
     def _decrypt_message(self, msg, appid, mch_id, crypto_class=None):
-        import xmltodict
         if not isinstance(msg, dict):
-            msg = xmltodict.parse(to_text(msg))['xml']
+            msg = parse_xml(to_text(msg))['xml']
 
         req_info = msg['req_info']
         if msg['appid'] != appid:
             raise InvalidAppIdException()
         if msg['mch_id'] != mch_id:
             raise InvalidMchIdException()
-        pc = crypto_class(self.key)
+        pc = self._get_crypto(crypto_class)
         ret = pc.decrypt(req_info)
-        return xmltodict.parse(to_text(ret))['root']
+        return parse_xml(to_text(ret))['root']
 
     def decrypt_message(self, msg, appid, mch_id):
         return self._decrypt_message(msg, appid, mch_id, RefundCrypto)
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 import struct
-import socket
 import base64
 
+import six
+
 from wechatpy_tornado.utils import to_text, to_binary, random_string, byte2int
 from wechatpy_tornado.crypto.pkcs7 import PKCS7Encoder
 try:
@@ -15,7 +16,18 @@ except ImportError:
         raise Exception('You must install either cryptography or pycryptodome!')
 
 
+# PKCS#7 填充，下标为填充的字节数
+_PADDINGS = [bytes(bytearray([n] * n)) for n in range(33)]
+
+
 class BasePrpCrypto(object):
+    """
+    消息加解密，同一个 key 的实例可以重复使用，见 ``BaseWeChatCrypto``
+
+    明文格式为 16 字节随机串 + 4 字节网络序的消息长度 + 消息 + appid ，按 32 字节做 PKCS#7 填充
+    """
+
+    block_size = 32
 
     def __init__(self, key):
         self.cipher = WeChatCipher(key)
@@ -25,28 +37,34 @@ class BasePrpCrypto(object):
 
     def _encrypt(self, text, _id):
         text = to_binary(text)
-        tmp_list = []
-        tmp_list.append(to_binary(self.get_random_string()))
-        length = struct.pack(b'I', socket.htonl(len(text)))
-        tmp_list.append(length)
-        tmp_list.append(text)
-        tmp_list.append(to_binary(_id))
-
-        text = b''.join(tmp_list)
-        text = PKCS7Encoder.encode(text)
+        _id = to_binary(_id)
+        text_end = 20 + len(text)
+        length = text_end + len(_id)
+        padding = self.block_size - length % self.block_size
 
-        ciphertext = to_binary(self.cipher.encrypt(text))
+        # 一次分配整个明文，原地写入各部分和填充
+        buf = bytearray(length + padding)
+        buf[0:16] = to_binary(self.get_random_string())
+        struct.pack_into(b'>I', buf, 16, len(text))
+        buf[20:text_end] = text
+        buf[text_end:length] = _id
+        buf[length:] = _PADDINGS[padding]
+
+        ciphertext = self.cipher.encrypt(buf)
         return base64.b64encode(ciphertext)
 
     def _decrypt(self, text, _id, exception=None):
         text = to_binary(text)
         plain_text = self.cipher.decrypt(base64.b64decode(text))
         padding = byte2int(plain_text[-1])
-        content = plain_text[16:-padding]
-        xml_length = socket.ntohl(struct.unpack(b'I', content[:4])[0])
-        xml_content = to_text(content[4:xml_length + 4])
-        from_id = to_text(content[xml_length + 4:])
-        if from_id != _id:
+        content_end = len(plain_text) - padding if padding else 16
+        xml_length = struct.unpack_from(b'>I', plain_text, 16)[0]
+        xml_end = min(20 + xml_length, content_end)
+        # memoryview 切片不复制数据，直接解码
+        view = memoryview(plain_text)
+        xml_content = six.text_type(view[20:xml_end], 'utf-8')
+        from_id = six.text_type(view[xml_end:content_end], 'utf-8')
+        if from_id != to_text(_id):
             exception = exception or Exception
             raise exception()
         return xml_content
@@ -16,10 +16,15 @@ class BaseWeChatCipher(object):
 
 
 class WeChatCipher(BaseWeChatCipher):
+    """ CBC 模式的 cipher 对象有状态，每次加解密都创建新的对象，实例可以重复使用 """
 
     def __init__(self, key, iv=None):
-        iv = iv or key[:16]
-        super(WeChatCipher, self).__init__(AES.new(key, AES.MODE_CBC, iv))
+        self.key = key
+        self.iv = iv or key[:16]
+
+    @property
+    def cipher(self):
+        return AES.new(self.key, AES.MODE_CBC, self.iv)
 
 
 class AesEcbCipher(BaseWeChatCipher):
@@ -54,6 +54,27 @@ class WeChatJSAPI(BaseWeChatAPI):
         """
         return await self._get('ticket/get', params={'type': 'agent_config'})
 
+    async def _refresh_ticket(self, get_ticket, ticket_key, expires_at_key):
+        jsapi_ticket = await get_ticket()
+        expires_at = int(time.time()) + int(jsapi_ticket['expires_in'])
+        await self.session.amset({
+            ticket_key: jsapi_ticket['ticket'],
+            expires_at_key: expires_at,
+        })
+        return jsapi_ticket
+
+    async def refresh_jsapi_ticket(self):
+        """
+        强制刷新企业的jsapi_ticket并缓存到 session
+
+        :return: 返回的 JSON 数据包
+        """
+        return await self._refresh_ticket(
+            self.get_ticket,
+            '{}_jsapi_ticket'.format(self._client.corp_id),
+            '{}_jsapi_ticket_expires_at'.format(self._client.corp_id)
+        )
+
     async def get_jsapi_ticket(self):
         """
         获取微信 JS-SDK ticket
@@ -64,16 +85,25 @@ class WeChatJSAPI(BaseWeChatAPI):
         """
         ticket_key = '{}_jsapi_ticket'.format(self._client.corp_id)
         expires_at_key = '{}_jsapi_ticket_expires_at'.format(self._client.corp_id)
-        ticket = self.session.get(ticket_key)
-        expires_at = self.session.get(expires_at_key, 0)
+        ticket, expires_at = await self.session.amget([ticket_key, expires_at_key])
+        expires_at = expires_at or 0
         if not ticket or expires_at < int(time.time()):
-            jsapi_ticket = await self.get_ticket()
+            jsapi_ticket = await self.refresh_jsapi_ticket()
             ticket = jsapi_ticket['ticket']
-            expires_at = int(time.time()) + int(jsapi_ticket['expires_in'])
-            self.session.set(ticket_key, ticket)
-            self.session.set(expires_at_key, expires_at)
         return ticket
 
+    async def refresh_agent_jsapi_ticket(self):
+        """
+        强制刷新应用的jsapi_ticket并缓存到 session
+
+        :return: 返回的 JSON 数据包
+        """
+        return await self._refresh_ticket(
+            self.get_agent_ticket,
+            '{}_agent_jsapi_ticket'.format(self._client.corp_id),
+            '{}_agent_jsapi_ticket_expires_at'.format(self._client.corp_id)
+        )
+
     async def get_agent_jsapi_ticket(self):
         """
         获取应用的jsapi_ticket
@@ -84,12 +114,9 @@ class WeChatJSAPI(BaseWeChatAPI):
         """
         ticket_key = '{}_agent_jsapi_ticket'.format(self._client.corp_id)
         expires_at_key = '{}_agent_jsapi_ticket_expires_at'.format(self._client.corp_id)
-        ticket = self.session.get(ticket_key)
-        expires_at = self.session.get(expires_at_key, 0)
+        ticket, expires_at = await self.session.amget([ticket_key, expires_at_key])
+        expires_at = expires_at or 0
         if not ticket or expires_at < int(time.time()):
-            jsapi_ticket = await self.get_agent_ticket()
+            jsapi_ticket = await self.refresh_agent_jsapi_ticket()
             ticket = jsapi_ticket['ticket']
-            expires_at = int(time.time()) + int(jsapi_ticket['expires_in'])
-            self.session.set(ticket_key, ticket)
-            self.session.set(expires_at_key, expires_at)
         return ticket
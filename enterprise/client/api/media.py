@@ -75,13 +75,27 @@ class WeChatMedia(BaseWeChatAPI):
         )
         return ''.join(parts)
 
-    async def download(self, media_id):
+    async def download(self, media_id, dest=None, resume=False):
         """
         获取临时素材文件
 
         https://work.weixin.qq.com/api/doc#90000/90135/90254
 
         :param media_id: 媒体文件id
-        :return: requests 的 Response 实例
+        :param dest: 可选，流式下载的目标，文件路径或带 ``write`` 方法（可以是协程）的对象，
+                     不传时返回完整读入内存的响应
+        :param resume: 可选，``dest`` 为文件路径时是否断点续传
+        :return: tornado 的 HTTPResponse 实例
         """
-        return await self._get(self.get_url(media_id))
+        if dest is None:
+            return await self._get('media/get', params={'media_id': media_id})
+        return await self._download('media/get', dest, resume, params={'media_id': media_id})
+
+    def iter_download(self, media_id, offset=0):
+        """
+        流式获取临时素材文件，返回数据块的异步迭代器
+
+        :param media_id: 媒体文件id
+        :param offset: 可选，从该字节位置开始下载
+        """
+        return self._iter_download('media/get', offset, params={'media_id': media_id})
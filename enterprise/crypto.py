@@ -19,6 +19,11 @@ class WeChatCrypto(BaseWeChatCrypto):
         super(WeChatCrypto, self).__init__(token, encoding_aes_key, corp_id)
         self.corp_id = corp_id
 
+    def parse_message(self, xml):
+        from wechatpy_tornado.enterprise.parser import parse_message
+
+        return parse_message(xml)
+
     def check_signature(self, signature, timestamp, nonce, echo_str):
         return self._check_signature(
             signature,
@@ -59,6 +59,23 @@ class WeChatClientException(WeChatException):
         self.response = response
 
 
+class DownloadResultException(WeChatClientException):
+    """WeChat API returned a JSON result instead of the file being downloaded"""
+
+    def __init__(self, result, client=None, request=None, response=None):
+        """
+        :param result: 接口返回的 JSON 数据包，如视频素材的 ``{'down_url': ...}``
+        """
+        super(DownloadResultException, self).__init__(
+            None,
+            'JSON result instead of file',
+            client,
+            request,
+            response
+        )
+        self.result = result
+
+
 class InvalidSignatureException(WeChatException):
     """Invalid signature exception class"""
 
@@ -71,6 +88,13 @@ class APILimitedException(WeChatClientException):
     pass
 
 
+class CircuitOpenException(WeChatClientException):
+    """Circuit breaker open exception class"""
+
+    def __init__(self, errcode=None, errmsg='Circuit breaker is open'):
+        super(CircuitOpenException, self).__init__(errcode, errmsg)
+
+
 class InvalidAppIdException(WeChatException):
     """Invalid app_id exception class"""
 
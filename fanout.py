@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.fanout
+    ~~~~~~~~~~~~~~~~
+
+    This module provides a rate limited fan-out sender for mass sending
+    custom, template and subscribe messages.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import logging
+import random
+from collections import namedtuple
+
+from wechatpy_tornado.concurrency import TokenBucket, bounded_map
+from wechatpy_tornado.constants import WeChatErrorCode
+from wechatpy_tornado.retry import is_unprocessed
+
+logger = logging.getLogger(__name__)
+
+# 服务端明确表示未处理、可以重试的错误码
+RETRY_ERRCODES = (
+    WeChatErrorCode.SYSTEM_BUSY.value,
+    WeChatErrorCode.OUT_OF_API_FREQ_LIMIT.value,
+)
+
+SendResult = namedtuple('SendResult', ['index', 'openid', 'result', 'error', 'attempts'])
+SendResult.__doc__ = """
+单个接收者的发送结果
+
+:param index: 在输入中的序号
+:param openid: 接收者
+:param result: 发送成功时接口的返回数据
+:param error: 最终失败时的异常，成功时为 None
+:param attempts: 发送次数
+"""
+
+
+class FanoutSender(object):
+    """
+    批量消息发送器，限速、限制并发，失败时按错误码退避重试，逐个返回发送结果
+
+    只重试服务端一定没有处理的失败：``retry_errcodes`` 中的错误码、连接被拒绝和 DNS 解析失败，
+    超时、5xx 等情况消息可能已经发出，不会重发，见 :func:`wechatpy_tornado.retry.is_unprocessed`
+
+    传入 ``storage`` 和 ``progress_key`` 时会在 session 中记录已连续完成的条数，
+    任务中断后用相同的输入再次运行会跳过已完成的部分。
+
+    使用示例::
+
+        from wechatpy_tornado import WeChatClient
+        from wechatpy_tornado.fanout import FanoutSender
+
+        client = WeChatClient('appid', 'secret')
+
+        async def send(openid, data):
+            return await client.message.send_template(openid, 'template_id', data)
+
+        sender = FanoutSender(send, rate=300, concurrency=50,
+                              storage=client.session, progress_key='campaign_42')
+        async for item in sender.run(recipients):
+            if item.error is not None:
+                print(item.openid, item.error)
+
+    :param send: 协程函数，接收 ``(openid, payload)`` ，发送一条消息
+    :param rate: 可选，每秒最多发送的消息数（含重试），或 :class:`wechatpy_tornado.concurrency.TokenBucket`
+    :param concurrency: 可选，最大并发数，默认为 10
+    :param max_attempts: 可选，每条消息最多发送次数，默认为 3
+    :param backoff: 可选，第一次重试前的等待时间，单位秒，之后每次翻倍，默认为 1
+    :param max_backoff: 可选，重试等待时间上限，单位秒，默认为 30
+    :param retry_errcodes: 可选，服务端明确表示未处理、可以重试的错误码，默认为 ``RETRY_ERRCODES``
+    :param storage: 可选，记录发送进度的 ``SessionStorage``
+    :param progress_key: 可选，发送进度在 ``storage`` 中的键
+    """
+
+    def __init__(self, send, rate=None, concurrency=10, max_attempts=3, backoff=1,
+                 max_backoff=30, retry_errcodes=RETRY_ERRCODES, storage=None, progress_key=None):
+        if rate is not None and not isinstance(rate, TokenBucket):
+            rate = TokenBucket(rate)
+        self.send = send
+        self.rate = rate
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_errcodes = retry_errcodes
+        self.storage = storage
+        self.progress_key = progress_key
+        self.completed = 0
+        self._done = set()
+
+    def _is_retryable(self, e):
+        # 发送消息不是幂等的，超时、5xx 时消息可能已经发出，重试会重复发送
+        return is_unprocessed(e, self.retry_errcodes)
+
+    async def _get_progress(self):
+        if self.storage is None or not self.progress_key:
+            return 0
+        return await self.storage.aget(self.progress_key, 0)
+
+    async def _mark_done(self, index):
+        # completed 为从头开始连续完成的条数，即下次可以跳过的条数
+        self._done.add(index)
+        completed = self.completed
+        while completed in self._done:
+            self._done.remove(completed)
+            completed += 1
+        if completed != self.completed:
+            self.completed = completed
+            if self.storage is not None and self.progress_key:
+                await self.storage.aset(self.progress_key, completed)
+
+    async def _send(self, item):
+        index, (openid, payload) = item
+        attempts = 0
+        while True:
+            attempts += 1
+            if self.rate is not None:
+                await self.rate.acquire()
+            try:
+                result = await self.send(openid, payload)
+            except Exception as e:
+                if attempts >= self.max_attempts or not self._is_retryable(e):
+                    logger.debug('Failed to send message to %s', openid, exc_info=True)
+                    return SendResult(index, openid, None, e, attempts)
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1))
+            else:
+                return SendResult(index, openid, result, None, attempts)
+
+    async def _enumerate(self, items, start):
+        index = 0
+        if hasattr(items, '__aiter__'):
+            async for item in items:
+                if index >= start:
+                    yield index, item
+                index += 1
+        else:
+            for item in items:
+                if index >= start:
+                    yield index, item
+                index += 1
+
+    async def run(self, items):
+        """
+        发送消息
+
+        :param items: ``(openid, payload)`` 的可迭代对象或异步可迭代对象，
+                      断点续发时需与上次的输入顺序相同
+        :return: 返回一个异步迭代器，按完成顺序得到每个接收者的 :class:`SendResult`
+        """
+        self.completed = await self._get_progress()
+        self._done = set()
+        results = bounded_map(
+            self._send,
+            self._enumerate(items, self.completed),
+            concurrency=self.concurrency,
+            ordered=False
+        )
+        async for result in results:
+            await self._mark_done(result.index)
+            yield result
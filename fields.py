@@ -22,23 +22,56 @@ from wechatpy_tornado.utils import to_text, to_binary, ObjectDict, timezone
 default_timezone = timezone('Asia/Shanghai')
 
 
+def escape_cdata(value):
+    """ CDATA 中不能出现 ``]]>`` ，将其拆分到两个相邻的 CDATA 中 """
+    if isinstance(value, six.text_type) and ']]>' in value:
+        return value.replace(']]>', ']]]]><![CDATA[>')
+    return value
+
+
+# 可以在实例间共享、不需要复制的默认值类型
+_IMMUTABLE_TYPES = (type(None), bool, int, float, six.text_type, bytes, frozenset)
+
+
 class FieldDescriptor(object):
+    """
+    读取字段时转换原始值，转换结果缓存在实例上，原始值被替换后重新转换
+
+    :param field: 字段
+    :param name: 可选，字段在类上的属性名，用于区分同一个 XML 节点的多个字段
+    """
 
-    def __init__(self, field):
+    def __init__(self, field, name=None):
         self.field = field
         self.attr_name = field.name
+        self.cache_key = name or field.name
+        self.shared_default = isinstance(field.default, _IMMUTABLE_TYPES)
+        converter = field.converter
+        self.converter = converter if six.callable(converter) else None
 
     def __get__(self, instance, instance_type=None):
         if instance is not None:
-            value = instance._data.get(self.attr_name)
+            data = instance._data
+            value = data.get(self.attr_name)
+            cache = instance.__dict__.get('_field_values')
+            if cache is None:
+                cache = instance.__dict__['_field_values'] = {}
+            else:
+                cached = cache.get(self.cache_key)
+                if cached is not None and cached[0] is value:
+                    return cached[1]
             if value is None:
-                value = copy.deepcopy(self.field.default)
-                instance._data[self.attr_name] = value
+                value = self.field.default
+                if not self.shared_default:
+                    value = copy.deepcopy(value)
+                data[self.attr_name] = value
+            raw = value
             if isinstance(value, dict):
                 value = ObjectDict(value)
-            if value and not isinstance(value, (dict, list, tuple)) and \
-                    six.callable(self.field.converter):
-                value = self.field.converter(value)
+            elif value and self.converter is not None and \
+                    not isinstance(value, (list, tuple)):
+                value = self.converter(value)
+            cache[self.cache_key] = (raw, value)
             return value
         return self.field
 
@@ -56,6 +89,13 @@ class BaseField(object):
     def to_xml(self, value):
         raise NotImplementedError()
 
+    def compile_xml(self):
+        """
+        返回把字段值渲染为 XML 节点的函数，在定义消息类时调用一次，
+        子类可以预先生成固定的 XML 片段
+        """
+        return self.to_xml
+
     @classmethod
     def from_xml(cls, value):
         raise NotImplementedError()
@@ -73,7 +113,19 @@ class BaseField(object):
     def add_to_class(self, klass, name):
         self.klass = klass
         klass._fields[name] = self
-        setattr(klass, name, FieldDescriptor(self))
+        setattr(klass, name, FieldDescriptor(self, name))
+
+
+def _compile_number(field):
+    prefix = '<{name}>'.format(name=field.name)
+    suffix = '</{name}>'.format(name=field.name)
+    converter = field.converter
+    default = field.default
+
+    def to_xml(value):
+        value = converter(value) if value is not None else default
+        return prefix + str(value) + suffix
+    return to_xml
 
 
 class StringField(BaseField):
@@ -84,10 +136,21 @@ class StringField(BaseField):
     converter = __to_text
 
     def to_xml(self, value):
-        value = self.converter(value)
+        value = escape_cdata(self.converter(value))
         tpl = '<{name}><![CDATA[{value}]]></{name}>'
         return tpl.format(name=self.name, value=value)
 
+    def compile_xml(self):
+        if type(self).to_xml is not StringField.to_xml:
+            return self.to_xml
+        prefix = '<{name}><![CDATA['.format(name=self.name)
+        suffix = ']]></{name}>'.format(name=self.name)
+        converter = self.converter
+
+        def to_xml(value):
+            return prefix + escape_cdata(converter(value)) + suffix
+        return to_xml
+
     @classmethod
     def from_xml(cls, value):
         return value
@@ -101,6 +164,11 @@ class IntegerField(BaseField):
         tpl = '<{name}>{value}</{name}>'
         return tpl.format(name=self.name, value=value)
 
+    def compile_xml(self):
+        if type(self).to_xml is not IntegerField.to_xml:
+            return self.to_xml
+        return _compile_number(self)
+
     @classmethod
     def from_xml(cls, value):
         return cls.converter(value)
@@ -118,6 +186,16 @@ class DateTimeField(BaseField):
         tpl = '<{name}>{value}</{name}>'
         return tpl.format(name=self.name, value=value)
 
+    def compile_xml(self):
+        if type(self).to_xml is not DateTimeField.to_xml:
+            return self.to_xml
+        prefix = '<{name}>'.format(name=self.name)
+        suffix = '</{name}>'.format(name=self.name)
+
+        def to_xml(value):
+            return prefix + str(int(time.mktime(datetime.timetuple(value)))) + suffix
+        return to_xml
+
     @classmethod
     def from_xml(cls, value):
         return cls.converter(None, value)
@@ -131,6 +209,11 @@ class FloatField(BaseField):
         tpl = '<{name}>{value}</{name}>'
         return tpl.format(name=self.name, value=value)
 
+    def compile_xml(self):
+        if type(self).to_xml is not FloatField.to_xml:
+            return self.to_xml
+        return _compile_number(self)
+
     @classmethod
     def from_xml(cls, value):
         return cls.converter(value)
@@ -139,7 +222,7 @@ class FloatField(BaseField):
 class ImageField(StringField):
 
     def to_xml(self, value):
-        value = self.converter(value)
+        value = escape_cdata(self.converter(value))
         tpl = """<Image>
         <MediaId><![CDATA[{value}]]></MediaId>
         </Image>"""
@@ -153,7 +236,7 @@ class ImageField(StringField):
 class VoiceField(StringField):
 
     def to_xml(self, value):
-        value = self.converter(value)
+        value = escape_cdata(self.converter(value))
         tpl = """<Voice>
         <MediaId><![CDATA[{value}]]></MediaId>
         </Voice>"""
@@ -167,13 +250,13 @@ class VoiceField(StringField):
 class VideoField(StringField):
 
     def to_xml(self, value):
-        kwargs = dict(media_id=self.converter(value['media_id']))
+        kwargs = dict(media_id=escape_cdata(self.converter(value['media_id'])))
         content = '<MediaId><![CDATA[{media_id}]]></MediaId>'
         if 'title' in value:
-            kwargs['title'] = self.converter(value['title'])
+            kwargs['title'] = escape_cdata(self.converter(value['title']))
             content += '<Title><![CDATA[{title}]]></Title>'
         if 'description' in value:
-            kwargs['description'] = self.converter(value['description'])
+            kwargs['description'] = escape_cdata(self.converter(value['description']))
             content += '<Description><![CDATA[{description}]]></Description>'
         tpl = """<Video>
         {content}
@@ -193,19 +276,19 @@ class VideoField(StringField):
 class MusicField(StringField):
 
     def to_xml(self, value):
-        kwargs = dict(thumb_media_id=self.converter(value['thumb_media_id']))
+        kwargs = dict(thumb_media_id=escape_cdata(self.converter(value['thumb_media_id'])))
         content = '<ThumbMediaId><![CDATA[{thumb_media_id}]]></ThumbMediaId>'
         if 'title' in value:
-            kwargs['title'] = self.converter(value['title'])
+            kwargs['title'] = escape_cdata(self.converter(value['title']))
             content += '<Title><![CDATA[{title}]]></Title>'
         if 'description' in value:
-            kwargs['description'] = self.converter(value['description'])
+            kwargs['description'] = escape_cdata(self.converter(value['description']))
             content += '<Description><![CDATA[{description}]]></Description>'
         if 'music_url' in value:
-            kwargs['music_url'] = self.converter(value['music_url'])
+            kwargs['music_url'] = escape_cdata(self.converter(value['music_url']))
             content += '<MusicUrl><![CDATA[{music_url}]]></MusicUrl>'
         if 'hq_music_url' in value:
-            kwargs['hq_music_url'] = self.converter(value['hq_music_url'])
+            kwargs['hq_music_url'] = escape_cdata(self.converter(value['hq_music_url']))
             content += '<HQMusicUrl><![CDATA[{hq_music_url}]]></HQMusicUrl>'
         tpl = """<Music>
         {content}
@@ -229,33 +312,25 @@ class MusicField(StringField):
 class ArticlesField(StringField):
 
     def to_xml(self, articles):
-        article_count = len(articles)
+        converter = self.converter
         items = []
         for article in articles:
-            title = self.converter(article.get('title', ''))
-            description = self.converter(article.get('description', ''))
-            image = self.converter(article.get('image', ''))
-            url = self.converter(article.get('url', ''))
-            item_tpl = """<item>
-            <Title><![CDATA[{title}]]></Title>
-            <Description><![CDATA[{description}]]></Description>
-            <PicUrl><![CDATA[{image}]]></PicUrl>
-            <Url><![CDATA[{url}]]></Url>
-            </item>"""
-            item = item_tpl.format(
-                title=title,
-                description=description,
-                image=image,
-                url=url
-            )
-            items.append(item)
-        items_str = '\n'.join(items)
-        tpl = """<ArticleCount>{article_count}</ArticleCount>
-        <Articles>{items}</Articles>"""
-        return tpl.format(
-            article_count=article_count,
-            items=items_str
-        )
+            items.append(''.join((
+                '<item>\n            <Title><![CDATA[',
+                escape_cdata(converter(article.get('title', ''))),
+                ']]></Title>\n            <Description><![CDATA[',
+                escape_cdata(converter(article.get('description', ''))),
+                ']]></Description>\n            <PicUrl><![CDATA[',
+                escape_cdata(converter(article.get('image', ''))),
+                ']]></PicUrl>\n            <Url><![CDATA[',
+                escape_cdata(converter(article.get('url', ''))),
+                ']]></Url>\n            </item>',
+            )))
+        return ''.join((
+            '<ArticleCount>', str(len(articles)), '</ArticleCount>\n        <Articles>',
+            '\n'.join(items),
+            '</Articles>',
+        ))
 
     @classmethod
     def from_xml(cls, value):
@@ -293,6 +368,6 @@ class HardwareField(StringField):
         </{name}>"""
         return tpl.format(
             name=self.name,
-            view=value.get('view'),
-            action=value.get('action')
+            view=escape_cdata(value.get('view')),
+            action=escape_cdata(value.get('action'))
         )
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.hedge
+    ~~~~~~~~~~~~~~~
+
+    This module provides hedged requests for latency-critical idempotent
+    GET endpoints.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import collections
+import copy
+import time
+from urllib.parse import urlsplit
+
+from tornado.httputil import HTTPHeaders
+
+
+class HedgePolicy(object):
+    """
+    对冲请求：GET 请求在 ``delay`` 秒内未返回时再发送一个相同的请求，
+    使用先返回的结果并取消另一个
+
+    ``delay`` 默认根据最近 ``window`` 次请求的耗时取 ``percentile`` 分位数，
+    样本不足时使用 ``initial_delay`` 。对冲请求数不会超过总请求数的 ``budget`` 比例。
+    被取消的请求只是不再等待，tornado 的连接会在请求完成或超时后才释放。
+
+    使用示例::
+
+        from wechatpy_tornado import WeChatClient
+        from wechatpy_tornado.hedge import HedgePolicy
+
+        client = WeChatClient('appid', 'secret')
+        client.hedge_policy = HedgePolicy(endpoints=('user/info', 'ticket/getticket'), budget=0.05)
+
+    :param endpoints: 可选，需要对冲的接口，默认为所有 GET 请求
+    :param delay: 可选，固定的对冲延迟，单位秒，默认根据耗时分位数自动计算
+    :param percentile: 可选，自动计算对冲延迟时使用的分位数，默认为 0.95
+    :param initial_delay: 可选，样本不足时的对冲延迟，单位秒，默认为 0.5
+    :param min_delay: 可选，对冲延迟的下限，单位秒，默认为 0.01
+    :param budget: 可选，对冲请求数占总请求数的比例上限，默认为 0.05
+    :param window: 可选，计算分位数的样本数，默认为 1000
+    """
+
+    def __init__(self, endpoints=None, delay=None, percentile=0.95, initial_delay=0.5,
+                 min_delay=0.01, budget=0.05, window=1000):
+        self.endpoints = endpoints
+        self.delay = delay
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.budget = budget
+        self._latencies = collections.deque(maxlen=window)
+        self._samples = 0
+        self._current_delay = initial_delay
+        # 每个请求积累 budget 个对冲额度，最多积累 10 个
+        self._allowance = 0.0
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+
+    def applies_to(self, request):
+        """ 请求是否需要对冲 """
+        if request.method != 'GET' or request.streaming_callback is not None \
+                or request.header_callback is not None:
+            return False
+        if self.endpoints is None:
+            return True
+        path = urlsplit(request.url).path.strip('/')
+        return any(path == name or path.endswith('/' + name) for name in self.endpoints)
+
+    def get_delay(self):
+        """ 当前的对冲延迟 """
+        if self.delay is not None:
+            return self.delay
+        return self._current_delay
+
+    def _record(self, latency):
+        self._latencies.append(latency)
+        self._samples += 1
+        if len(self._latencies) >= 20 and self._samples % 20 == 0:
+            latencies = sorted(self._latencies)
+            index = min(len(latencies) - 1, int(len(latencies) * self.percentile))
+            self._current_delay = max(self.min_delay, latencies[index])
+
+    def stats(self):
+        """
+        对冲统计
+
+        :return: dict，``requests`` 为经过对冲策略的请求数，``hedged`` 为发出的对冲请求数，
+                 ``hedge_wins`` 为对冲请求先返回的次数，``skipped`` 为因额度不足未对冲的次数
+        """
+        return {
+            'requests': self.requests,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'skipped': self.skipped,
+            'delay': self.get_delay(),
+        }
+
+    async def fetch(self, fetch, request):
+        """
+        对冲执行 ``fetch(request)``
+
+        :param fetch: 发送请求的协程函数，如 ``HTTPTransport.fetch``
+        :param request: tornado ``HTTPRequest``
+        """
+        self.requests += 1
+        self._allowance = min(10.0, self._allowance + self.budget)
+        start = time.time()
+        primary = asyncio.ensure_future(fetch(request))
+        try:
+            done, _ = await asyncio.wait([primary], timeout=self.get_delay())
+        except BaseException:
+            # asyncio.wait 被取消时不会取消等待的请求
+            primary.cancel()
+            raise
+        if done:
+            self._record(time.time() - start)
+            return primary.result()
+
+        if self._allowance < 1:
+            self.skipped += 1
+            try:
+                return await primary
+            finally:
+                self._record(time.time() - start)
+        self._allowance -= 1
+        self.hedged += 1
+
+        hedge_request = copy.copy(request)
+        hedge_request.headers = HTTPHeaders(request.headers)
+        hedge_start = time.time()
+        hedge = asyncio.ensure_future(fetch(hedge_request))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # 同时完成时优先返回成功的请求
+                for future in sorted(done, key=lambda f: f.exception() is not None):
+                    if future.exception() is None or not pending:
+                        if future is hedge:
+                            self.hedge_wins += 1
+                            self._record(time.time() - hedge_start)
+                        else:
+                            self._record(time.time() - start)
+                        return future.result()
+                # 先完成的请求失败了，继续等待另一个
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.instrument
+    ~~~~~~~~~~~~~~~~~~~~
+
+    This module provides instrumentation hooks for API calls, an in-memory
+    histogram collector and a Prometheus text exporter.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import bisect
+import contextvars
+import logging
+import time
+from urllib.parse import urlsplit
+
+from wechatpy_tornado.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+_current_call = contextvars.ContextVar('wechatpy_tornado_api_call', default=None)
+
+# 该域名下的地址路径即为接口名
+API_HOST_SUFFIX = '.weixin.qq.com'
+
+# 各阶段的名称
+PHASES = ('token', 'encode', 'queue', 'network', 'decode', 'process', 'total')
+
+
+def _endpoint(url_or_endpoint):
+    # 作为指标的标签，取值必须有限：去掉查询参数，
+    # 微信以外的地址（如下载文件、上传 COS 的地址）只保留域名
+    parts = urlsplit(url_or_endpoint)
+    if parts.netloc and not parts.hostname.endswith(API_HOST_SUFFIX):
+        return parts.hostname
+    return RateLimiter.endpoint(url_or_endpoint)
+
+
+class APICall(object):
+    """
+    一次接口调用的信息，传给 :class:`Hook` 的各个方法
+
+    :param kind: 调用方类型，``client`` 、``pay`` 、``component`` 或 ``oauth``
+    :param appid: 调用方的 appid
+    :param method: HTTP 方法
+    :param url_or_endpoint: 请求地址或接口名，``endpoint`` 为去掉查询参数和 ``cgi-bin/`` 的接口名
+    """
+
+    def __init__(self, kind, appid, method, url_or_endpoint):
+        self.kind = kind
+        self.appid = appid
+        self.method = method
+        self.endpoint = _endpoint(url_or_endpoint)
+        # 各阶段耗时，单位秒，见 ``PHASES``
+        self.timings = {}
+        self.errcode = None
+        self.error = None
+        self.result = None
+        self.started_at = time.perf_counter()
+
+    def add_timing(self, phase, started_at):
+        self.timings[phase] = self.timings.get(phase, 0) + time.perf_counter() - started_at
+
+    def finish(self, result=None, error=None):
+        self.timings['total'] = time.perf_counter() - self.started_at
+        self.result = result
+        self.error = error
+        if error is None:
+            self.errcode = 0
+            return
+        # 微信支付没有 err_code 时使用 return_code ，HTTP 错误使用 http_状态码
+        errcode = getattr(error, 'errcode', None)
+        if errcode is None:
+            errcode = getattr(error, 'return_code', None)
+        if errcode is None:
+            response = getattr(error, 'response', None)
+            code = getattr(response, 'code', None) or getattr(error, 'code', None)
+            errcode = 'http_{0}'.format(code) if code else type(error).__name__
+        self.errcode = errcode
+
+
+def current_call():
+    """ 当前正在进行的 :class:`APICall` ，没有时返回 None """
+    return _current_call.get()
+
+
+def record_timing(phase, started_at):
+    """
+    记录当前调用的一个阶段的耗时，不在调用中时什么也不做
+
+    :param phase: 阶段名称
+    :param started_at: 阶段开始时 ``time.perf_counter()`` 的值
+    """
+    call = _current_call.get()
+    if call is not None:
+        call.add_timing(phase, started_at)
+
+
+def record_fetch(started_at, response):
+    """
+    记录 HTTP 请求的排队时间和网络时间
+
+    ``response.request_time`` 是从 ``AsyncHTTPClient`` 开始处理请求算起的时间，
+    总耗时减去它即为在传输层和 ``AsyncHTTPClient`` 队列中等待的时间
+
+    :param started_at: 调用 ``fetch`` 前 ``time.perf_counter()`` 的值
+    :param response: tornado ``HTTPResponse``
+    """
+    call = _current_call.get()
+    if call is None:
+        return
+    elapsed = time.perf_counter() - started_at
+    network = getattr(response, 'request_time', None)
+    if network is None or network > elapsed:
+        network = elapsed
+    call.timings['queue'] = call.timings.get('queue', 0) + elapsed - network
+    call.timings['network'] = call.timings.get('network', 0) + network
+
+
+async def run_call(hooks, call, coro):
+    """
+    执行一次接口调用并触发 hooks
+
+    :param hooks: :class:`Hook` 列表
+    :param call: :class:`APICall`
+    :param coro: 执行调用的协程对象
+    """
+    token = _current_call.set(call)
+    try:
+        _dispatch(hooks, 'before_request', call)
+        try:
+            result = await coro
+        except Exception as e:
+            call.finish(error=e)
+            _dispatch(hooks, 'on_error', call, e)
+            raise
+        call.finish(result=result)
+        _dispatch(hooks, 'after_response', call)
+        return result
+    finally:
+        _current_call.reset(token)
+
+
+def _dispatch(hooks, name, *args):
+    for hook in hooks:
+        try:
+            getattr(hook, name)(*args)
+        except Exception:
+            logger.exception('Error in %s.%s', type(hook).__name__, name)
+
+
+class Hook(object):
+    """
+    接口调用的 hook 基类，设置 ``client.hooks = [hook]`` 后每次调用都会触发
+
+    hook 中抛出的异常会被记录到日志，不会影响接口调用
+    """
+
+    def before_request(self, call):
+        """ 调用开始前 """
+        pass
+
+    def after_response(self, call):
+        """ 调用成功后，``call.timings`` 中为各阶段的耗时 """
+        pass
+
+    def on_error(self, call, error):
+        """ 调用出错后 """
+        pass
+
+
+# 默认的直方图分桶，单位秒
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class HistogramCollector(Hook):
+    """
+    在内存中按阶段、接口、appid 和错误码统计耗时直方图
+
+    使用示例::
+
+        from wechatpy_tornado.instrument import HistogramCollector
+
+        collector = HistogramCollector()
+        client.hooks = [collector]
+        pay.hooks = [collector]
+
+        # 在 /metrics 接口中返回
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(collector.export_prometheus())
+
+    :param buckets: 可选，直方图分桶的上界，单位秒，默认为 ``DEFAULT_BUCKETS``
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._histograms = {}
+
+    def _observe(self, labels, value):
+        histogram = self._histograms.get(labels)
+        if histogram is None:
+            histogram = self._histograms[labels] = {
+                'buckets': [0] * (len(self.buckets) + 1),
+                'sum': 0.0,
+                'count': 0,
+            }
+        histogram['buckets'][bisect.bisect_left(self.buckets, value)] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+    def _collect(self, call):
+        for phase, value in call.timings.items():
+            labels = (phase, call.kind, call.endpoint, call.appid or '', str(call.errcode))
+            self._observe(labels, value)
+
+    def after_response(self, call):
+        self._collect(call)
+
+    def on_error(self, call, error):
+        self._collect(call)
+
+    def reset(self):
+        self._histograms.clear()
+
+    def snapshot(self):
+        """
+        当前的统计数据
+
+        :return: list，每项为 dict，包含 ``phase`` 、``kind`` 、``endpoint`` 、``appid`` 、
+                 ``errcode`` 、``count`` 、``sum`` 和 ``buckets`` （上界到累计次数的 list）
+        """
+        result = []
+        for labels, histogram in self._histograms.items():
+            phase, kind, endpoint, appid, errcode = labels
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(self.buckets + (float('inf'),), histogram['buckets']):
+                cumulative += count
+                buckets.append((bound, cumulative))
+            result.append({
+                'phase': phase,
+                'kind': kind,
+                'endpoint': endpoint,
+                'appid': appid,
+                'errcode': errcode,
+                'count': histogram['count'],
+                'sum': histogram['sum'],
+                'buckets': buckets,
+            })
+        return result
+
+    def slowest(self, phase='total', limit=10):
+        """
+        平均耗时最长的接口
+
+        :return: ``(平均耗时, kind, endpoint, appid, errcode, count)`` 的 list
+        """
+        result = []
+        for item in self.snapshot():
+            if item['phase'] == phase and item['count']:
+                result.append((
+                    item['sum'] / item['count'], item['kind'], item['endpoint'],
+                    item['appid'], item['errcode'], item['count']
+                ))
+        result.sort(reverse=True)
+        return result[:limit]
+
+    def export_prometheus(self, name='wechatpy_tornado_api_duration_seconds'):
+        """
+        导出为 Prometheus 文本格式
+
+        :param name: 可选，指标名称
+        :return: str
+        """
+        lines = [
+            '# HELP {0} WeChat API call duration by phase'.format(name),
+            '# TYPE {0} histogram'.format(name),
+        ]
+        for item in sorted(self.snapshot(), key=lambda x: (x['endpoint'], x['phase'], x['kind'], x['appid'], x['errcode'])):
+            labels = ','.join('{0}="{1}"'.format(key, _escape(item[key]))
+                              for key in ('phase', 'kind', 'endpoint', 'appid', 'errcode'))
+            for bound, count in item['buckets']:
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(name, labels, le, count))
+            lines.append('{0}_sum{{{1}}} {2!r}'.format(name, labels, item['sum']))
+            lines.append('{0}_count{{{1}}} {2}'.format(name, labels, item['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
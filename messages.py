@@ -51,6 +51,10 @@ class MessageMetaClass(type):
         for name, field in cls.__dict__.items():
             if isinstance(field, BaseField):
                 field.add_to_class(cls, name)
+        # 渲染 XML 时按顺序调用的 (属性名, 渲染函数)，见 ``BaseReply.render``
+        cls._render_plan = tuple(
+            (name, field.compile_xml()) for name, field in cls._fields.items()
+        )
         return cls
 
 
@@ -66,6 +70,10 @@ class BaseMessage(six.with_metaclass(MessageMetaClass)):
     def __init__(self, message):
         self._data = message
 
+    def __getstate__(self):
+        # 只传递原始数据，不包含字段值的缓存
+        return {'_data': self._data}
+
     def __repr__(self):
         _repr = "{klass}({msg})".format(
             klass=self.__class__.__name__,
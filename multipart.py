@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.multipart
+    ~~~~~~~~~~~~~~~~~~~
+
+    This module provides a streaming multipart/form-data encoder for
+    tornado ``HTTPRequest.body_producer``.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import io
+import mimetypes
+import os
+import uuid
+
+import six
+
+from wechatpy_tornado.utils import to_binary, to_text
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _file_size(fileobj):
+    """ Remaining size of a file object, or None if it can not be known """
+    try:
+        return os.fstat(fileobj.fileno()).st_size - fileobj.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    try:
+        position = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell() - position
+        fileobj.seek(position)
+        return size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+class _Part(object):
+
+    def __init__(self, name, value):
+        filename = None
+        content_type = None
+        if isinstance(value, tuple):
+            if len(value) > 2:
+                content_type = value[2]
+            filename, value = value[0], value[1]
+
+        self.path = None
+        self.fileobj = None
+        self.data = None
+        if isinstance(value, os.PathLike):
+            self.path = os.fspath(value)
+            filename = filename or os.path.basename(self.path)
+            self.size = os.path.getsize(self.path)
+        elif hasattr(value, 'read'):
+            self.fileobj = value
+            filename = filename or os.path.basename(to_text(getattr(value, 'name', name)))
+            self.size = _file_size(value)
+        elif filename is not None and isinstance(value, six.string_types):
+            # (filename, path)
+            self.path = value
+            self.size = os.path.getsize(self.path)
+        else:
+            if not isinstance(value, (six.binary_type, six.text_type)):
+                value = six.text_type(value)
+            self.data = to_binary(value)
+            self.size = len(self.data)
+
+        disposition = 'form-data; name="{0}"'.format(name)
+        headers = []
+        if filename is not None:
+            disposition = '{0}; filename="{1}"'.format(disposition, filename)
+            content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        headers.append('Content-Disposition: {0}'.format(disposition))
+        if content_type:
+            headers.append('Content-Type: {0}'.format(content_type))
+        self.headers = to_binary('\r\n'.join(headers) + '\r\n\r\n')
+
+    async def write_to(self, write, chunk_size):
+        if self.data is not None:
+            await write(self.data)
+            return
+        fileobj = self.fileobj
+        if fileobj is None:
+            fileobj = open(self.path, 'rb')
+        position = None
+        if self.fileobj is not None:
+            try:
+                position = fileobj.tell()
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
+        try:
+            while True:
+                chunk = fileobj.read(chunk_size)
+                if not chunk:
+                    break
+                await write(to_binary(chunk))
+        finally:
+            if self.fileobj is None:
+                fileobj.close()
+            elif position is not None:
+                # rewind so the request can be replayed
+                fileobj.seek(position)
+
+
+class MultipartEncoder(object):
+    """
+    流式的 multipart/form-data 编码器，可直接作为 tornado ``HTTPRequest`` 的
+    ``body_producer`` 使用，文件按 ``chunk_size`` 分块读取，不会整体读入内存
+
+    ``fields`` 的值可以是：
+
+    * 字符串、bytes 或数字：普通表单字段
+    * File-object 或 ``os.PathLike`` ：文件，文件名取自文件路径
+    * ``(filename, fileobj_or_path_or_bytes[, content_type])`` 元组
+
+    :param fields: 表单字段 dict
+    :param boundary: 可选，multipart 分隔符，默认随机生成
+    :param chunk_size: 可选，读取文件的块大小，默认 64KB
+    """
+
+    def __init__(self, fields, boundary=None, chunk_size=CHUNK_SIZE):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self._parts = [_Part(name, value) for name, value in fields.items()]
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary={0}'.format(self.boundary)
+
+    @property
+    def content_length(self):
+        """ 请求体的总长度，存在无法获取大小的文件时为 None """
+        boundary = to_binary(self.boundary)
+        # --boundary\r\n headers data \r\n ... --boundary--\r\n
+        length = len(boundary) + 6
+        for part in self._parts:
+            if part.size is None:
+                return None
+            length += len(boundary) + 4 + len(part.headers) + part.size + 2
+        return length
+
+    @property
+    def headers(self):
+        headers = {'Content-Type': self.content_type}
+        content_length = self.content_length
+        if content_length is not None:
+            headers['Content-Length'] = str(content_length)
+        return headers
+
+    async def __call__(self, write):
+        boundary = to_binary(self.boundary)
+        for part in self._parts:
+            await write(b'--' + boundary + b'\r\n' + part.headers)
+            await part.write_to(write, self.chunk_size)
+            await write(b'\r\n')
+        await write(b'--' + boundary + b'--\r\n')
@@ -10,13 +10,16 @@
 """
 from __future__ import absolute_import, unicode_literals
 
+import time
 from urllib.parse import quote
 
 from wechatpy_tornado.exceptions import WeChatOAuthException
 from wechatpy_tornado.utils import json
-from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpclient import HTTPRequest
 from urllib.parse import urlencode
 from wechatpy_tornado.utils import to_binary
+from wechatpy_tornado.transport import get_transport
+from wechatpy_tornado.instrument import APICall, record_fetch, record_timing, run_call
 
 
 class WeChatOAuth(object):
@@ -29,6 +32,9 @@ class WeChatOAuth(object):
     API_BASE_URL = 'https://api.weixin.qq.com/'
     OAUTH_BASE_URL = 'https://open.weixin.qq.com/connect/'
 
+    # 接口调用的 hooks，见 :class:`wechatpy_tornado.instrument.Hook`
+    hooks = ()
+
     def __init__(self, app_id, secret, redirect_uri, scope='snsapi_base', state=''):
         """
 
@@ -43,9 +49,16 @@ class WeChatOAuth(object):
         self.redirect_uri = redirect_uri
         self.scope = scope
         self.state = state
-        self._http = AsyncHTTPClient()
+        self._http = get_transport()
 
     async def _request(self, method, url_or_endpoint, **kwargs):
+        coro = self._send_request(method, url_or_endpoint, **kwargs)
+        if not self.hooks:
+            return await coro
+        call = APICall('oauth', self.app_id, method, url_or_endpoint)
+        return await run_call(self.hooks, call, coro)
+
+    async def _send_request(self, method, url_or_endpoint, **kwargs):
         if not url_or_endpoint.startswith(('http://', 'https://')):
             url = '{base}{endpoint}'.format(
                 base=self.API_BASE_URL,
@@ -59,13 +72,17 @@ class WeChatOAuth(object):
         url = '{0}?{1}'.format(url, params)
 
         data = kwargs.pop('data', {})
-        if isinstance(data, dict):
+        if isinstance(data, dict) and method != 'GET':
+            started_at = time.perf_counter()
             body = json.dumps(data, ensure_ascii=False)
             body = body.encode('utf-8')
             kwargs['body'] = body
+            record_timing('encode', started_at)
 
         req = HTTPRequest(url, method=method, **kwargs)
+        started_at = time.perf_counter()
         res = await self._http.fetch(req)
+        record_fetch(started_at, res)
         if res.error is not None:
             raise WeChatOAuthException(
                 errcode=None,
@@ -74,7 +91,9 @@ class WeChatOAuth(object):
                 request=req,
                 response=res
             )
+        started_at = time.perf_counter()
         result = json.loads(res.body.decode('utf-8', 'ignore'), strict=False)
+        record_timing('decode', started_at)
 
         if 'errcode' in result and result['errcode'] != 0:
             errcode = result['errcode']
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.offload
+    ~~~~~~~~~~~~~~~~~
+
+    This module provides a worker pool that decrypts and parses callback
+    messages, and renders and encrypts replies, outside the IOLoop thread.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import functools
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# 工作进程中按 (类型, token, key, id) 缓存的 crypto ，避免每批任务重新创建加密对象，按 LRU 淘汰
+_worker_cryptos = OrderedDict()
+_worker_cryptos_lock = threading.Lock()
+WORKER_CRYPTO_CACHE_SIZE = 64
+
+
+def _local_crypto(crypto):
+    if multiprocessing.parent_process() is None:
+        # 线程池中直接使用传入的 crypto ，不需要缓存
+        return crypto
+    key = (type(crypto), crypto.token, crypto.key, crypto._id)
+    with _worker_cryptos_lock:
+        cached = _worker_cryptos.get(key)
+        if cached is None:
+            cached = _worker_cryptos[key] = crypto
+            if len(_worker_cryptos) > WORKER_CRYPTO_CACHE_SIZE:
+                _worker_cryptos.popitem(last=False)
+        else:
+            _worker_cryptos.move_to_end(key)
+    return cached
+
+
+def decrypt_and_parse(crypto, msg, signature, timestamp, nonce):
+    """ 解密并解析消息，在工作进程中执行 """
+    crypto = _local_crypto(crypto)
+    return crypto.parse_message(crypto.decrypt_message(msg, signature, timestamp, nonce))
+
+
+def render_and_encrypt(crypto, msg, nonce, timestamp=None):
+    """ 渲染并加密回复，在工作进程中执行 """
+    crypto = _local_crypto(crypto)
+    return crypto.encrypt_message(msg, nonce, timestamp)
+
+
+def _run_batch(tasks):
+    results = []
+    for func, args in tasks:
+        try:
+            results.append((True, func(*args)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+class CryptoPool(object):
+    """
+    在进程池（或线程池）中执行消息的解密、解析和回复的渲染、加密
+
+    同一轮 IOLoop 迭代中提交的任务会合并为一批，每批最多 ``batch_size`` 个，
+    一次提交给 executor ，以减少进程间通信的次数。
+    crypto 、消息和回复对象会被 pickle 后在进程间传递。
+
+    使用示例::
+
+        from wechatpy_tornado.crypto import WeChatCrypto
+        from wechatpy_tornado.offload import CryptoPool
+
+        crypto = WeChatCrypto(token, encoding_aes_key, appid)
+        crypto.pool = CryptoPool(max_workers=4)
+
+        msg = await crypto.decrypt_message_async(xml, signature, timestamp, nonce)
+        reply = create_reply('Hello', msg)
+        xml = await crypto.encrypt_message_async(reply, nonce, timestamp)
+
+    :param max_workers: 可选，工作进程数，默认为 CPU 核数
+    :param executor: 可选，使用的 ``concurrent.futures`` executor ，
+                     默认创建 ``ProcessPoolExecutor(max_workers)``
+    :param batch_size: 可选，每批的最大任务数，默认为 64
+    """
+
+    def __init__(self, max_workers=None, executor=None, batch_size=64):
+        assert batch_size > 0
+        self.executor = executor or ProcessPoolExecutor(max_workers)
+        self.batch_size = batch_size
+        self._pending = []
+        self.batches = 0
+        self.tasks = 0
+
+    def submit(self, func, *args):
+        """
+        提交任务
+
+        :param func: 模块级函数，如 :func:`decrypt_and_parse`
+        :return: asyncio Future
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((func, args, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif len(self._pending) == 1:
+            loop.call_soon(self._flush)
+        return future
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.batch_size):
+            chunk = [item for item in pending[i:i + self.batch_size] if not item[2].cancelled()]
+            if not chunk:
+                continue
+            self.batches += 1
+            self.tasks += len(chunk)
+            tasks = [(func, args) for func, args, _ in chunk]
+            futures = [future for _, _, future in chunk]
+            try:
+                batch = asyncio.wrap_future(self.executor.submit(_run_batch, tasks))
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            batch.add_done_callback(functools.partial(self._resolve, futures))
+
+    def _resolve(self, futures, batch):
+        if batch.cancelled() or batch.exception() is not None:
+            error = batch.exception() if not batch.cancelled() else asyncio.CancelledError()
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for future, (ok, value) in zip(futures, batch.result()):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def shutdown(self, wait=True):
+        """ 关闭 executor """
+        self.executor.shutdown(wait=wait)
@@ -8,11 +8,10 @@
     :license: MIT, see LICENSE for more details.
 """
 from __future__ import absolute_import, unicode_literals
-import xmltodict
-
 from wechatpy_tornado.messages import MESSAGE_TYPES, UnknownMessage
 from wechatpy_tornado.events import EVENT_TYPES
 from wechatpy_tornado.utils import to_text
+from wechatpy_tornado.xmlparser import parse_xml
 
 
 def parse_message(xml):
@@ -24,7 +23,7 @@ def parse_message(xml):
     """
     if not xml:
         return
-    message = xmltodict.parse(to_text(xml))['xml']
+    message = parse_xml(to_text(xml))['xml']
     message_type = message['MsgType'].lower()
     event_type = None
     if message_type == 'event' or message_type.startswith('device_'):
@@ -2,8 +2,8 @@
 from __future__ import absolute_import, unicode_literals
 import inspect
 import logging
+import time
 
-import ssl
 import xmltodict
 from xml.parsers.expat import ExpatError
 from optionaldict import optionaldict
@@ -12,13 +12,16 @@ from wechatpy_tornado.crypto import WeChatRefundCrypto
 from wechatpy_tornado.utils import random_string
 from wechatpy_tornado.exceptions import WeChatPayException, InvalidSignatureException, RequestException
 from wechatpy_tornado.pay.utils import (
-    calculate_signature, calculate_signature_hmac, _check_signature, dict_to_xml
+    calculate_signature, calculate_signature_hmac, _check_signature, dict_to_xml, get_ssl_context
 )
 from wechatpy_tornado.pay.base import BaseWeChatPayAPI
 from wechatpy_tornado.pay import api
-from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpclient import HTTPRequest
 from urllib.parse import urlencode
 from wechatpy_tornado.utils import to_binary
+from wechatpy_tornado.transport import get_transport
+from wechatpy_tornado.instrument import APICall, record_fetch, record_timing, run_call
+from wechatpy_tornado.xmlparser import parse_xml
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +66,11 @@ class WeChatPay(object):
 
     API_BASE_URL = 'https://api.mch.weixin.qq.com/'
 
+    # 可选的请求重试策略，默认不重试，见 :class:`wechatpy_tornado.retry.RetryPolicy`
+    retry_policy = None
+    # 接口调用的 hooks，见 :class:`wechatpy_tornado.instrument.Hook`
+    hooks = ()
+
     def __new__(cls, *args, **kwargs):
         self = super(WeChatPay, cls).__new__(cls)
         api_endpoints = inspect.getmembers(self, _is_api_endpoint)
@@ -84,7 +92,7 @@ class WeChatPay(object):
         self.timeout = timeout
         self.sandbox = sandbox
         self._sandbox_api_key = None
-        self._http = AsyncHTTPClient()
+        self._http = get_transport()
 
     async def _fetch_sandbox_api_key(self):
         nonce_str = random_string(32)
@@ -97,9 +105,16 @@ class WeChatPay(object):
         api_url = '{base}sandboxnew/pay/getsignkey'.format(base=self.API_BASE_URL)
         request = HTTPRequest(api_url, method='POST', body=payload, headers=headers)
         response = await self._http.fetch(request)
-        return xmltodict.parse(response.body.decode('utf-8'))['xml'].get('sandbox_signkey')
+        return parse_xml(response.body.decode('utf-8'))['xml'].get('sandbox_signkey')
 
     async def _request(self, method, url_or_endpoint, **kwargs):
+        coro = self._send_request(method, url_or_endpoint, **kwargs)
+        if not self.hooks:
+            return await coro
+        call = APICall('pay', self.appid, method, url_or_endpoint)
+        return await run_call(self.hooks, call, coro)
+
+    async def _send_request(self, method, url_or_endpoint, **kwargs):
         if not url_or_endpoint.startswith(('http://', 'https://')):
             api_base_url = kwargs.pop('api_base_url', self.API_BASE_URL)
             if self.sandbox:
@@ -118,6 +133,14 @@ class WeChatPay(object):
         data = kwargs.pop('data', {})
 
         if isinstance(data, dict):
+            if self.sandbox:
+                started_at = time.perf_counter()
+                api_key = await self.sandbox_api_key()
+                record_timing('token', started_at)
+            else:
+                api_key = self.api_key
+
+            started_at = time.perf_counter()
             if 'mchid' not in data:
                 data.setdefault('mch_id', self.mch_id)
             data.setdefault('sub_mch_id', self.sub_mch_id)
@@ -125,18 +148,17 @@ class WeChatPay(object):
             data = optionaldict(data)
 
             if data.get('sign_type', 'MD5') == 'HMAC-SHA256':
-                sign = calculate_signature_hmac(data, await self.sandbox_api_key() if self.sandbox else self.api_key)
+                sign = calculate_signature_hmac(data, api_key)
             else:
-                sign = calculate_signature(data, await self.sandbox_api_key() if self.sandbox else self.api_key)
+                sign = calculate_signature(data, api_key)
             body = dict_to_xml(data, sign)
             body = body.encode('utf-8')
             kwargs['body'] = body
+            record_timing('encode', started_at)
 
         # 商户证书
         if self.mch_cert and self.mch_key:
-            ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            ssl_ctx.load_cert_chain(self.mch_cert, self.mch_key)
-            kwargs['ssl_options'] = ssl_ctx
+            kwargs['ssl_options'] = get_ssl_context(self.mch_cert, self.mch_key)
 
         kwargs['request_timeout'] = kwargs.pop('timeout') if 'timeout' in kwargs else self.timeout
         logger.debug('Request to WeChat API: %s %s\n%s', method, url, kwargs)
@@ -147,25 +169,36 @@ class WeChatPay(object):
             **kwargs
         )
 
-        res = await self._http.fetch(req)
-        if res.error is not None:
-            raise WeChatPayException(
-                return_code=None,
-                client=self,
-                request=req,
-                response=res
-            )
-
-        return self._handle_result(res)
+        async def _fetch():
+            started_at = time.perf_counter()
+            res = await self._http.fetch(req)
+            record_fetch(started_at, res)
+            if res.error is not None:
+                raise WeChatPayException(
+                    return_code=None,
+                    client=self,
+                    request=req,
+                    response=res
+                )
+
+            return self._handle_result(res)
+
+        if self.retry_policy is None or 'streaming_callback' in kwargs:
+            # 已经写出的流式数据无法撤回，不重试
+            return await _fetch()
+        return await self.retry_policy.execute(method, url, _fetch)
 
     def _handle_result(self, res):
+        started_at = time.perf_counter()
         xml = res.body.decode('utf-8')
         logger.debug('Response from WeChat API \n %s', xml)
         try:
-            data = xmltodict.parse(xml)['xml']
+            data = parse_xml(xml)['xml']
         except (xmltodict.ParsingInterrupted, ExpatError):
             logger.debug('WeChat payment result xml parsing error', exc_info=True)
             return xml
+        finally:
+            record_timing('decode', started_at)
 
         return_code = data['return_code']
         return_msg = data.get('return_msg')
@@ -222,7 +255,7 @@ class WeChatPay(object):
 
         """
         try:
-            data = xmltodict.parse(xml)
+            data = parse_xml(xml)
         except (xmltodict.ParsingInterrupted, ExpatError):
             raise ValueError("invalid xml")
         if not data or 'xml' not in data:
@@ -238,7 +271,7 @@ class WeChatPay(object):
     async def parse_payment_result(self, xml):
         """解析微信支付结果通知"""
         try:
-            data = xmltodict.parse(xml)
+            data = parse_xml(xml)
         except (xmltodict.ParsingInterrupted, ExpatError):
             raise InvalidSignatureException()
 
@@ -3,7 +3,7 @@ from __future__ import absolute_import, unicode_literals
 import random
 from datetime import datetime
 
-from wechatpy_tornado.pay.utils import get_external_ip
+from wechatpy_tornado.pay.utils import get_external_ip_async
 from wechatpy_tornado.pay.base import BaseWeChatPayAPI
 
 
@@ -41,8 +41,7 @@ class WeChatMicroPay(BaseWeChatPayAPI):
             'out_trade_no': out_trade_no,
             'total_fee': total_fee,
             'fee_type': fee_type,
-            # TODO: get_external_ip 需要异步化
-            'spbill_create_ip': client_ip or get_external_ip(),
+            'spbill_create_ip': client_ip or await get_external_ip_async(),
             'goods_tag': goods_tag,
             'limit_pay': limit_pay,
             'auth_code': auth_code,
@@ -5,7 +5,7 @@ import random
 from datetime import datetime, timedelta
 
 from wechatpy_tornado.utils import timezone
-from wechatpy_tornado.pay.utils import get_external_ip
+from wechatpy_tornado.pay.utils import get_external_ip_async
 from wechatpy_tornado.pay.base import BaseWeChatPayAPI
 from wechatpy_tornado.utils import random_string, to_text, json
 from wechatpy_tornado.pay.utils import calculate_signature
@@ -67,7 +67,7 @@ class WeChatOrder(BaseWeChatPayAPI):
             'out_trade_no': out_trade_no,
             'fee_type': fee_type,
             'total_fee': total_fee,
-            'spbill_create_ip': client_ip or get_external_ip(),
+            'spbill_create_ip': client_ip or await get_external_ip_async(),
             'time_start': time_start.strftime('%Y%m%d%H%M%S'),
             'time_expire': time_expire.strftime('%Y%m%d%H%M%S'),
             'goods_tag': goods_tag,
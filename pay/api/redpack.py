@@ -3,7 +3,7 @@ from __future__ import absolute_import, unicode_literals
 import random
 from datetime import datetime
 
-from wechatpy_tornado.pay.utils import get_external_ip
+from wechatpy_tornado.pay.utils import get_external_ip_async
 from wechatpy_tornado.pay.base import BaseWeChatPayAPI
 
 
@@ -43,7 +43,7 @@ class WeChatRedpack(BaseWeChatPayAPI):
             'act_name': act_name,
             'wishing': wishing,
             'remark': remark,
-            'client_ip': client_ip or get_external_ip(),
+            'client_ip': client_ip or await get_external_ip_async(),
             'total_num': total_num,
             'mch_billno': out_trade_no,
             'scene_id': scene_id,
@@ -89,7 +89,7 @@ class WeChatRedpack(BaseWeChatPayAPI):
             'wishing': wishing,
             'remark': remark,
             'total_num': total_num,
-            'client_ip': client_ip or get_external_ip(),
+            'client_ip': client_ip or await get_external_ip_async(),
             'amt_type': amt_type,
             'mch_billno': out_trade_no,
             'scene_id': scene_id,
@@ -3,6 +3,7 @@ from __future__ import absolute_import, unicode_literals
 from datetime import datetime, date
 
 from wechatpy_tornado.pay.base import BaseWeChatPayAPI
+from wechatpy_tornado.pay.bill import BillStream
 
 
 class WeChatTools(BaseWeChatPayAPI):
@@ -70,6 +71,55 @@ class WeChatTools(BaseWeChatPayAPI):
             data['tar_type'] = tar_type
         return await self._post('pay/downloadfundflow', data=data)
 
+    def iter_bill(self, bill_date, bill_type='ALL', device_info=None, tar_type=None, tz=None):
+        """
+        流式下载并解析对账单，边下载边解析，内存占用与账单大小无关
+
+        返回 :class:`wechatpy_tornado.pay.bill.BillStream` ，``async for`` 迭代得到每一行的
+        dict，金额为以分为单位的 int，交易时间为 datetime，迭代结束后可通过
+        ``summary`` 属性获取汇总数据
+
+        :param bill_date: 下载对账单的日期
+        :param bill_type: 账单类型，见 :meth:`download_bill`
+        :param device_info: 微信支付分配的终端设备号，填写此字段，只下载该设备号的对账单
+        :param tar_type: 可选，固定值：GZIP，返回压缩包账单
+        :param tz: 可选，交易时间的时区，默认为 ``Asia/Shanghai``
+        :return: :class:`wechatpy_tornado.pay.bill.BillStream`
+        """
+        if isinstance(bill_date, (datetime, date)):
+            bill_date = bill_date.strftime('%Y%m%d')
+
+        data = {
+            'appid': self.appid,
+            'bill_date': bill_date,
+            'bill_type': bill_type,
+            'device_info': device_info,
+            'tar_type': tar_type,
+        }
+        return BillStream(self._client, 'pay/downloadbill', data, tz)
+
+    def iter_fundflow(self, bill_date, account_type='Basic', tar_type=None, tz=None):
+        """
+        流式下载并解析资金账单，用法同 :meth:`iter_bill`
+
+        :param bill_date: 下载对账单的日期
+        :param account_type: 账单的资金来源账户，见 :meth:`download_fundflow`
+        :param tar_type: 可选，固定值：GZIP，返回压缩包账单
+        :param tz: 可选，记账时间的时区，默认为 ``Asia/Shanghai``
+        :return: :class:`wechatpy_tornado.pay.bill.BillStream`
+        """
+        if isinstance(bill_date, (datetime, date)):
+            bill_date = bill_date.strftime('%Y%m%d')
+
+        data = {
+            'appid': self.appid,
+            'bill_date': bill_date,
+            'account_type': account_type,
+            'sign_type': 'HMAC-SHA256',
+            'tar_type': tar_type,
+        }
+        return BillStream(self._client, 'pay/downloadfundflow', data, tz)
+
     async def auto_code_to_openid(self, auth_code):
         """
         授权码查询 openid 接口
@@ -3,7 +3,7 @@ from __future__ import absolute_import, unicode_literals
 import random
 from datetime import datetime
 
-from wechatpy_tornado.pay.utils import get_external_ip, rsa_encrypt
+from wechatpy_tornado.pay.utils import get_external_ip_async, rsa_encrypt
 from wechatpy_tornado.pay.base import BaseWeChatPayAPI
 
 
@@ -47,7 +47,7 @@ class WeChatTransfer(BaseWeChatPayAPI):
             're_user_name': real_name,
             'amount': amount,
             'desc': desc,
-            'spbill_create_ip': client_ip or get_external_ip(),
+            'spbill_create_ip': client_ip or await get_external_ip_async(),
         }
         return await self._post('mmpaymkttransfers/promotion/transfers', data=data)
 
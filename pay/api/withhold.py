@@ -7,7 +7,7 @@ from datetime import datetime
 from optionaldict import optionaldict
 
 from wechatpy_tornado.utils import timezone
-from wechatpy_tornado.pay.utils import get_external_ip, calculate_signature
+from wechatpy_tornado.pay.utils import get_external_ip_async, calculate_signature
 from wechatpy_tornado.pay.base import BaseWeChatPayAPI
 
 
@@ -120,7 +120,7 @@ class WeChatWithhold(BaseWeChatPayAPI):
         """
         trade_type = 'PAP'  # 交易类型 交易类型PAP-微信委托代扣支付
         timestamp = int(time.time())  # 10位时间戳
-        spbill_create_ip = get_external_ip()  # 终端IP 调用微信支付API的机器IP
+        spbill_create_ip = await get_external_ip_async()  # 终端IP 调用微信支付API的机器IP
         if not out_trade_no:
             now = datetime.fromtimestamp(time.time(), tz=timezone('Asia/Shanghai'))
             out_trade_no = '{0}{1}{2}'.format(
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.pay.bill
+    ~~~~~~~~~~~~~~~~~~~~
+
+    This module provides a streaming parser for WeChat Pay bills
+    (``pay/downloadbill`` and ``pay/downloadfundflow``).
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import codecs
+import tempfile
+import zlib
+from datetime import datetime
+from io import BytesIO
+
+from tornado.httpclient import HTTPRequest, HTTPResponse
+
+from wechatpy_tornado.utils import timezone
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+CHUNK_SIZE = 64 * 1024
+
+_TIME_FIELDS = ('交易时间', '记账时间')
+
+
+def _is_amount_field(name):
+    return '金额' in name or '手续费' in name or '（元）' in name
+
+
+def _is_count_field(name):
+    return name.endswith('数')
+
+
+def to_fen(value):
+    """
+    将以元为单位的金额字符串转为以分为单位的整数
+
+    :param value: 金额字符串，如 ``'12.30'``
+    :return: int
+    """
+    value = value.strip()
+    if not value:
+        return 0
+    negative = value.startswith('-')
+    if negative:
+        value = value[1:]
+    yuan, _, fen = value.partition('.')
+    fen = int(yuan or 0) * 100 + int((fen + '00')[:2])
+    return -fen if negative else fen
+
+
+class BillParser(object):
+    """
+    增量解析微信支付对账单和资金账单
+
+    数据按块通过 :meth:`feed` 送入，支持 ``tar_type='GZIP'`` 的压缩账单，
+    每次返回已解析完的行。金额转换为以分为单位的 int，交易时间转换为 datetime，
+    最后的汇总行保存在 :attr:`summary` 。
+
+    :param tz: 可选，交易时间的时区，默认为 ``Asia/Shanghai``
+    """
+
+    def __init__(self, tz=None):
+        self.tz = tz or timezone('Asia/Shanghai')
+        self.header = None
+        self.summary_header = None
+        self.summary = None
+        self.error = None
+        self._decompressor = None
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._started = False
+        self._buffer = ''
+        self._converters = None
+
+    def _parse_time(self, value):
+        # 格式固定为 %Y-%m-%d %H:%M:%S，手动切片比 strptime 快得多
+        dt = datetime(
+            int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19])
+        )
+        if self.tz is None:
+            return dt
+        if hasattr(self.tz, 'localize'):
+            return self.tz.localize(dt)
+        return dt.replace(tzinfo=self.tz)
+
+    def _make_converters(self, header, summary=False):
+        converters = []
+        for name in header:
+            if name in _TIME_FIELDS:
+                converters.append(self._parse_time)
+            elif _is_amount_field(name):
+                converters.append(to_fen)
+            elif summary and _is_count_field(name):
+                converters.append(int)
+            else:
+                converters.append(None)
+        return converters
+
+    @staticmethod
+    def _split(line):
+        # 数据行的每个字段以 ` 开头，字段内容中可能包含逗号
+        if line.startswith('`'):
+            return line[1:].split(',`')
+        return line.split(',')
+
+    def _convert(self, header, converters, line):
+        values = self._split(line)
+        row = {}
+        for name, converter, value in zip(header, converters, values):
+            if converter is not None and value:
+                value = converter(value)
+            row[name] = value
+        return row
+
+    def _parse_line(self, line):
+        line = line.rstrip('\r')
+        if not line:
+            return None
+        if self.header is None:
+            self.header = self._split(line)
+            self._converters = self._make_converters(self.header)
+            return None
+        if line.startswith('`'):
+            if self.summary_header is not None:
+                self.summary = self._convert(
+                    self.summary_header,
+                    self._make_converters(self.summary_header, summary=True),
+                    line
+                )
+                return None
+            return self._convert(self.header, self._converters, line)
+        self.summary_header = self._split(line)
+        return None
+
+    def _parse_text(self, text):
+        rows = []
+        self._buffer += text
+        lines = self._buffer.split('\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            row = self._parse_line(line)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def feed(self, data):
+        """
+        送入一块原始数据
+
+        :param data: bytes
+        :return: 本次解析出的行 list
+        """
+        if not self._started:
+            if not data:
+                return []
+            self._started = True
+            if data.startswith(GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            elif data.lstrip().startswith(b'<'):
+                # 下载失败时返回 XML 格式的错误信息
+                self.error = BytesIO()
+        if self.error is not None:
+            self.error.write(data)
+            return []
+        if self._decompressor is not None:
+            data = self._decompressor.decompress(data)
+        return self._parse_text(self._decoder.decode(data))
+
+    def close(self):
+        """
+        结束解析
+
+        :return: 剩余未返回的行 list
+        """
+        if self.error is not None:
+            return []
+        data = b''
+        if self._decompressor is not None:
+            data = self._decompressor.flush()
+        text = self._decoder.decode(data, final=True)
+        rows = self._parse_text(text)
+        row = self._parse_line(self._buffer)
+        self._buffer = ''
+        if row is not None:
+            rows.append(row)
+        return rows
+
+
+def parse_bill(chunks, tz=None):
+    """
+    解析已下载的账单，返回行的迭代器和 :class:`BillParser`
+
+    使用示例::
+
+        with open('bill.gz', 'rb') as f:
+            rows, parser = parse_bill(iter(lambda: f.read(65536), b''))
+            for row in rows:
+                print(row)
+        print(parser.summary)
+
+    :param chunks: bytes 数据块的可迭代对象
+    :param tz: 可选，交易时间的时区
+    """
+    parser = BillParser(tz)
+
+    def _iter():
+        for chunk in chunks:
+            for row in parser.feed(chunk):
+                yield row
+        for row in parser.close():
+            yield row
+
+    return _iter(), parser
+
+
+def bill_to_columns(rows, use_numpy=False):
+    """
+    将账单行转为列式存储，便于对账
+
+    :param rows: 账单行的可迭代对象
+    :param use_numpy: 可选，是否转为 NumPy 数组（需安装 numpy），金额列为 int64
+    :return: dict，列名到 list 或 numpy.ndarray
+    """
+    columns = {}
+    for row in rows:
+        for name, value in row.items():
+            columns.setdefault(name, []).append(value)
+    if not use_numpy:
+        return columns
+
+    import numpy
+
+    for name, values in columns.items():
+        if _is_amount_field(name):
+            columns[name] = numpy.array(values, dtype=numpy.int64)
+        else:
+            columns[name] = numpy.array(values, dtype=object)
+    return columns
+
+
+class _SpoolBuffer(object):
+    """
+    Buffer between ``streaming_callback`` and the consumer: tornado can
+    not pause the response, so data the consumer has not read yet is
+    spooled to a temporary file once it exceeds ``max_size``
+    """
+
+    def __init__(self, max_size):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        self._max_size = max_size
+        self._size = 0
+        self._position = 0
+        self._closed = False
+        self._readable = asyncio.Event()
+
+    def write(self, data):
+        self._file.seek(0, 2)
+        self._file.write(data)
+        self._size += len(data)
+        self._readable.set()
+
+    def close(self):
+        self._closed = True
+        self._readable.set()
+
+    async def read(self):
+        """ 读取一块数据，写入结束并读完后返回 b'' """
+        while self._position >= self._size:
+            if self._closed:
+                return b''
+            self._readable.clear()
+            await self._readable.wait()
+        self._file.seek(self._position)
+        data = self._file.read(CHUNK_SIZE)
+        self._position += len(data)
+        if self._position >= self._size and self._size > self._max_size:
+            # 读完后丢弃已经落盘的数据
+            self._file.seek(0)
+            self._file.truncate()
+            self._size = self._position = 0
+        return data
+
+    def discard(self):
+        self._file.close()
+
+
+class BillStream(object):
+    """
+    流式下载并解析账单的异步迭代器，迭代结束后可通过 :attr:`summary` 获取汇总数据
+
+    使用示例::
+
+        bill = client.tools.iter_bill('20190101', tar_type='GZIP')
+        async for row in bill:
+            print(row['商户订单号'], row['应结订单金额'])
+        print(bill.summary)
+
+    tornado 无法暂停读取响应，消费不及时的数据超过 ``buffer_size`` 后写入临时文件，
+    内存占用不随账单大小增长。
+
+    :param buffer_size: 可选，内存中缓冲的原始数据上限，单位字节，默认为 1MB
+    """
+
+    def __init__(self, client, endpoint, data, tz=None, buffer_size=1024 * 1024):
+        self._client = client
+        self._endpoint = endpoint
+        self._data = data
+        self.buffer_size = buffer_size
+        self.parser = BillParser(tz)
+
+    @property
+    def header(self):
+        return self.parser.header
+
+    @property
+    def summary(self):
+        return self.parser.summary
+
+    async def __aiter__(self):
+        buffer = _SpoolBuffer(self.buffer_size)
+
+        async def run():
+            try:
+                return await self._client.post(
+                    self._endpoint,
+                    data=dict(self._data),
+                    streaming_callback=buffer.write
+                )
+            finally:
+                buffer.close()
+
+        task = asyncio.ensure_future(run())
+        try:
+            while True:
+                chunk = await buffer.read()
+                if not chunk:
+                    break
+                for row in self.parser.feed(chunk):
+                    yield row
+            await task
+            if self.parser.error is not None:
+                # raises WeChatPayException
+                self._client._handle_result(HTTPResponse(
+                    HTTPRequest(self._endpoint),
+                    200,
+                    buffer=BytesIO(self.parser.error.getvalue())
+                ))
+            for row in self.parser.close():
+                yield row
+        finally:
+            task.cancel()
+            buffer.discard()
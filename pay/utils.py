@@ -5,7 +5,11 @@ import base64
 import copy
 import hashlib
 import hmac
+import os
+import time
+import asyncio
 import socket
+import ssl
 import logging
 import six
 
@@ -57,7 +61,29 @@ def dict_to_xml(d, sign=None):
         xml.append('</xml>')
     return ''.join(xml)
 
-# TODO 异步化
+_ssl_contexts = {}
+
+
+def get_ssl_context(cert, key):
+    """
+    获取加载了商户证书的 SSL context
+
+    同一组证书路径共享一个 SSL context，证书文件修改后自动重新加载
+
+    :param cert: 商户证书路径
+    :param key: 商户证书私钥路径
+    :return: ssl.SSLContext
+    """
+    mtime = (os.path.getmtime(cert), os.path.getmtime(key))
+    cached = _ssl_contexts.get((cert, key))
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    ssl_ctx = ssl.create_default_context()
+    ssl_ctx.load_cert_chain(cert, key)
+    _ssl_contexts[(cert, key)] = (mtime, ssl_ctx)
+    return ssl_ctx
+
+
 def get_external_ip():
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
@@ -70,6 +96,59 @@ def get_external_ip():
         return '127.0.0.1'
 
 
+# 出口 IP 缓存时间，单位秒
+EXTERNAL_IP_TTL = 3600
+
+_external_ip = {}
+
+
+async def _resolve_external_ip():
+    from tornado.netutil import Resolver
+
+    resolver = Resolver()
+    try:
+        addrinfo = await resolver.resolve('api.mch.weixin.qq.com', 80, socket.AF_INET)
+    except socket.error:
+        return None
+    finally:
+        resolver.close()
+    wechat_ip = addrinfo[0][1][0]
+    # UDP connect 只查询本机路由，不会发送数据包
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect((wechat_ip, 80))
+        addr, port = sock.getsockname()
+        return addr
+    except socket.error:
+        return None
+    finally:
+        sock.close()
+
+
+async def get_external_ip_async(ttl=EXTERNAL_IP_TTL):
+    """
+    非阻塞地获取访问微信支付接口的本机出口 IP
+
+    结果会缓存 ``ttl`` 秒，并发调用共享同一次解析，建议在服务启动时调用一次预热缓存
+
+    :param ttl: 可选，缓存时间，单位秒
+    :return: IP 地址，获取失败时返回 ``127.0.0.1``
+    """
+    ip = _external_ip.get('ip')
+    if ip and _external_ip['expires_at'] > time.time():
+        return ip
+    future = _external_ip.get('future')
+    if future is None:
+        future = _external_ip['future'] = asyncio.ensure_future(_resolve_external_ip())
+        future.add_done_callback(lambda f: _external_ip.pop('future', None))
+    ip = await asyncio.shield(future)
+    if not ip:
+        return '127.0.0.1'
+    _external_ip['ip'] = ip
+    _external_ip['expires_at'] = time.time() + ttl
+    return ip
+
+
 def rsa_encrypt(data, pem, b64_encode=True):
     """
     rsa 加密
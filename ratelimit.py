@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.ratelimit
+    ~~~~~~~~~~~~~~~~~~~
+
+    This module provides a client side adaptive rate limiter which keeps
+    API calls under the WeChat quota.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import calendar
+import logging
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from wechatpy_tornado.constants import WeChatErrorCode
+from wechatpy_tornado.exceptions import APILimitedException
+from wechatpy_tornado.session.memorystorage import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+# 触发限速自适应降低的错误码
+LIMITED_ERRCODES = (
+    WeChatErrorCode.OUT_OF_API_FREQ_LIMIT.value,
+    WeChatErrorCode.OUT_OF_CUSTOM_MESSAGE_LIMIT.value,
+)
+
+
+class RateLimiter(object):
+    """
+    客户端限速器，按 appid 和接口限制调用速率，收到 45009/45047 时自动降速
+
+    速率使用 GCRA 算法计算，状态保存在 ``storage`` 中，传入 Redis 等共享的
+    session 即可在多个进程之间共享限额。降速后每隔 ``recover_interval`` 秒
+    恢复 ``recover_factor`` 倍，直到恢复到配置的速率。
+
+    使用示例::
+
+        from wechatpy_tornado import WeChatClient
+        from wechatpy_tornado.ratelimit import RateLimiter
+
+        client = WeChatClient('appid', 'secret', session=redis_storage)
+        client.rate_limiter = RateLimiter(
+            rates={'message/template/send': 100},
+            appid_rate=500,
+            storage=redis_storage,
+        )
+
+    :param rates: 可选，接口到每秒调用次数的 dict，如 ``{'message/custom/send': 50}``
+    :param default_rate: 可选，未在 ``rates`` 中配置的接口的每秒调用次数，默认不限制
+    :param appid_rate: 可选，每个 appid 所有接口合计的每秒调用次数，默认不限制
+    :param burst: 可选，允许突发的秒数，突发调用数为 速率 * burst，默认为 1
+    :param storage: 可选，保存限速状态的 ``SessionStorage`` ，默认为进程内存储
+    :param wait: 可选，超出限额时等待还是直接抛出 ``APILimitedException`` ，默认等待
+    :param max_wait: 可选，等待时间的上限，超过时抛出 ``APILimitedException`` ，单位秒
+    :param decrease_factor: 可选，收到限速错误码时速率乘以的系数，默认为 0.5
+    :param min_factor: 可选，速率最低降到配置值的比例，默认为 0.05
+    :param recover_interval: 可选，降速后每次恢复的间隔，单位秒，默认为 60
+    :param recover_factor: 可选，每次恢复时速率乘以的系数，默认为 1.25
+    :param prefix: 可选，限速状态在 ``storage`` 中的键前缀
+    """
+
+    def __init__(self, rates=None, default_rate=None, appid_rate=None, burst=1,
+                 storage=None, wait=True, max_wait=None, decrease_factor=0.5,
+                 min_factor=0.05, recover_interval=60, recover_factor=1.25,
+                 prefix='ratelimit'):
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self.appid_rate = appid_rate
+        self.burst = burst
+        self.storage = storage or MemoryStorage()
+        self.wait = wait
+        self.max_wait = max_wait
+        self.decrease_factor = decrease_factor
+        self.min_factor = min_factor
+        self.recover_interval = recover_interval
+        self.recover_factor = recover_factor
+        self.prefix = prefix
+        self._endpoints = {}
+        self._factors = {}
+        # 额度已用完的接口到恢复时间的 dict
+        self._exhausted = {}
+
+    @staticmethod
+    def endpoint(url):
+        """ 从请求地址得到接口名，如 ``message/template/send`` """
+        path = urlsplit(url).path.lstrip('/')
+        if path.startswith('cgi-bin/'):
+            path = path[len('cgi-bin/'):]
+        return path
+
+    def set_rate(self, endpoint, rate, burst=None):
+        """
+        设置接口的速率
+
+        :param endpoint: 接口名
+        :param rate: 每秒调用次数，为 None 时不限制
+        :param burst: 可选，允许突发的调用数，默认为 速率 * ``burst``
+        """
+        self.rates[endpoint] = rate if burst is None else (rate, burst)
+        self._exhausted.pop(endpoint, None)
+        self._endpoints.clear()
+
+    def seed_from_quota(self, quota, endpoint='wxa/submit_audit'):
+        """
+        根据 ``client.wxa.query_quota()`` 的返回结果设置提审接口的限额，
+        本月剩余的提审次数均匀分配到本月剩余的时间，并允许一次性用完，
+        额度已用完时在月底前直接抛出 ``APILimitedException``
+
+        :param quota: ``query_quota`` 的返回数据
+        :param endpoint: 可选，受该限额限制的接口，默认为 ``wxa/submit_audit``
+        """
+        now = datetime.now()
+        days = calendar.monthrange(now.year, now.month)[1]
+        month_end = datetime(now.year, now.month, days, 23, 59, 59)
+        remaining = max((month_end - now).total_seconds(), 1)
+        rest = int(quota.get('rest', 0))
+        if rest <= 0:
+            self.set_rate(endpoint, None)
+            self._exhausted[endpoint] = time.time() + remaining
+        else:
+            self.set_rate(endpoint, rest / remaining, rest)
+
+    def _rate(self, endpoint):
+        rate = self._endpoints.get(endpoint, False)
+        if rate is False:
+            rate = self.default_rate
+            for name, value in self.rates.items():
+                if endpoint == name or endpoint.endswith('/' + name):
+                    rate = value
+                    break
+            self._endpoints[endpoint] = rate
+        return rate
+
+    def _factor_key(self, key):
+        return '{0}:factor'.format(key)
+
+    async def _factor(self, key):
+        state = self._factors.get(key)
+        now = time.time()
+        if state is None or state[2] <= now:
+            # 每秒最多从共享存储同步一次降速状态
+            shared = await self.storage.aget(self._factor_key(key))
+            state = (shared[0], shared[1], now + 1) if shared else (1.0, 0, now + 1)
+            self._factors[key] = state
+        factor, penalized_at, _ = state
+        if factor >= 1:
+            return 1.0
+        steps = int((now - penalized_at) // self.recover_interval)
+        return min(1.0, factor * self.recover_factor ** steps)
+
+    async def _throttle(self, key, rate, burst=None, reserve=True):
+        rate = rate * await self._factor(key)
+        if burst is None:
+            burst = max(1, int(rate * self.burst))
+        return await self.storage.athrottle(key, 1.0 / rate, burst, reserve=reserve)
+
+    def _exhausted_delay(self, endpoint):
+        for name, until in list(self._exhausted.items()):
+            if endpoint == name or endpoint.endswith('/' + name):
+                delay = until - time.time()
+                if delay > 0:
+                    return delay
+                del self._exhausted[name]
+        return 0
+
+    def _keys(self, appid, endpoint):
+        keys = []
+        rate = self._rate(endpoint)
+        if rate:
+            burst = None
+            if isinstance(rate, tuple):
+                rate, burst = rate
+            keys.append(('{0}:{1}:{2}'.format(self.prefix, appid, endpoint), rate, burst))
+        if self.appid_rate:
+            keys.append(('{0}:{1}'.format(self.prefix, appid), self.appid_rate, None))
+        return keys
+
+    async def acquire(self, appid, url):
+        """
+        获取一次调用的限额，超出限额时等待或抛出 ``APILimitedException``
+
+        :param appid: 调用方的 appid
+        :param url: 请求地址或接口名
+        """
+        endpoint = self.endpoint(url)
+        delay = self._exhausted_delay(endpoint)
+        if delay:
+            raise APILimitedException(
+                WeChatErrorCode.OUT_OF_API_FREQ_LIMIT.value,
+                'quota exhausted, retry after {0:.3f}s'.format(delay)
+            )
+        keys = self._keys(appid, endpoint)
+        if not self.wait or self.max_wait is not None:
+            # 先只计算等待时间，可以立即调用或等待时间可以接受时再预留所有的键，
+            # 被拒绝的调用不占用任何键的限额
+            delay = 0
+            for key, rate, burst in keys:
+                delay = max(delay, await self._throttle(key, rate, burst, reserve=False))
+            if delay and (not self.wait or delay > self.max_wait):
+                raise APILimitedException(
+                    WeChatErrorCode.OUT_OF_API_FREQ_LIMIT.value,
+                    'client side rate limit exceeded, retry after {0:.3f}s'.format(delay)
+                )
+        delay = 0
+        for key, rate, burst in keys:
+            delay = max(delay, await self._throttle(key, rate, burst))
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def penalize(self, appid, url):
+        """
+        收到限速错误码后降低速率
+
+        :param appid: 调用方的 appid
+        :param url: 请求地址或接口名
+        """
+        endpoint = self.endpoint(url)
+        now = time.time()
+        for key, _, _ in self._keys(appid, endpoint):
+            factor = max(self.min_factor, await self._factor(key) * self.decrease_factor)
+            logger.info('WeChat API rate limited, slow down %s to %.2f of the budget', key, factor)
+            self._factors[key] = (factor, now, now + 1)
+            ttl = int(self.recover_interval * 20)
+            await self.storage.aset(self._factor_key(key), [factor, now], ttl)
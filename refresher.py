@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.refresher
+    ~~~~~~~~~~~~~~~~~~~
+
+    This module provides a background refresher which renews access tokens
+    and tickets before they expire.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRefresher(object):
+    """
+    后台主动刷新 access token 和 ticket
+
+    在凭证有效期的 ``low`` ~ ``high`` 之间随机选取时间点提前刷新，
+    请求路径上不再需要同步获取 token。多个进程共享 session 时，
+    access token 的刷新会通过 session 的租约锁保证只有一个进程真正请求。
+
+    使用示例::
+
+        from wechatpy_tornado import WeChatClient
+        from wechatpy_tornado.refresher import TokenRefresher
+
+        client = WeChatClient('appid', 'secret')
+        refresher = TokenRefresher()
+        refresher.add_client(client)
+        refresher.add_ticket(client.jsapi.refresh_jsapi_ticket)
+        refresher.start()
+
+    :param low: 可选，刷新时间点占有效期比例的下限，默认为 0.8
+    :param high: 可选，刷新时间点占有效期比例的上限，默认为 0.9
+    :param retry_interval: 可选，刷新失败后的重试间隔，也是两次刷新的最小间隔，单位秒
+    """
+
+    def __init__(self, low=0.8, high=0.9, retry_interval=30):
+        assert 0 < low <= high < 1
+        self.low = low
+        self.high = high
+        self.retry_interval = retry_interval
+        self._jobs = []
+        self._tasks = []
+
+    def add_job(self, name, refresh):
+        """
+        添加一个刷新任务
+
+        :param name: 任务名称，用于日志
+        :param refresh: 无参数的协程函数，刷新凭证后返回新凭证的过期时间戳
+        """
+        self._jobs.append((name, refresh))
+        if self._tasks:
+            self._tasks.append(asyncio.ensure_future(self._run(name, refresh)))
+
+    def add_client(self, client):
+        """
+        主动刷新 ``WeChatClient`` 、企业微信 ``WeChatClient`` 或
+        ``WeChatComponentClient`` 的 access token
+        """
+        state = {'access_token': None}
+
+        async def refresh():
+            await client._refresh_access_token(state['access_token'])
+            state['access_token'] = await client.session.aget(client.access_token_key)
+            return client.expires_at
+
+        self.add_job(client.access_token_key, refresh)
+
+    def add_component(self, component):
+        """
+        主动刷新 ``WeChatComponent`` 的 component_access_token
+        """
+        async def refresh():
+            await component.fetch_access_token()
+            return component.expires_at
+
+        self.add_job('{0}_component_access_token'.format(component.component_appid), refresh)
+
+    def add_ticket(self, refresh_ticket):
+        """
+        主动刷新 JS-SDK ticket 或卡券 api_ticket
+
+        :param refresh_ticket: 强制刷新 ticket 的方法，如
+                               ``client.jsapi.refresh_jsapi_ticket`` 、
+                               ``client.jsapi.refresh_jsapi_card_ticket``
+        """
+        async def refresh():
+            result = await refresh_ticket()
+            return int(time.time()) + int(result['expires_in'])
+
+        self.add_job(refresh_ticket.__name__, refresh)
+
+    def start(self):
+        """ 在当前 IOLoop 上启动所有刷新任务 """
+        if self._tasks:
+            return
+        for name, refresh in self._jobs:
+            self._tasks.append(asyncio.ensure_future(self._run(name, refresh)))
+
+    def stop(self):
+        """ 停止所有刷新任务 """
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def _next_delay(self, expires_at):
+        lifetime = (expires_at or 0) - time.time()
+        delay = lifetime * random.uniform(self.low, self.high)
+        return max(delay, self.retry_interval)
+
+    async def _run(self, name, refresh):
+        while True:
+            try:
+                expires_at = await refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Failed to refresh %s, retry in %s seconds', name, self.retry_interval)
+                delay = self.retry_interval
+            else:
+                delay = self._next_delay(expires_at)
+                logger.debug('Refreshed %s, next refresh in %.0f seconds', name, delay)
+            await asyncio.sleep(delay)
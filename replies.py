@@ -22,6 +22,7 @@ from wechatpy_tornado.fields import (
     ArticlesField,
     Base64EncodeField,
     HardwareField,
+    escape_cdata,
 )
 from wechatpy_tornado.messages import BaseMessage, MessageMetaClass
 from wechatpy_tornado.utils import to_text, to_binary
@@ -63,20 +64,19 @@ class BaseReply(six.with_metaclass(MessageMetaClass)):
             else:
                 setattr(self, name, value)
 
-    def render(self):
-        """Render reply from Python object to XML string"""
-        tpl = '<xml>\n{data}\n</xml>'
-        nodes = []
-        msg_type = '<MsgType><![CDATA[{msg_type}]]></MsgType>'.format(
-            msg_type=self.type
-        )
-        nodes.append(msg_type)
-        for name, field in self._fields.items():
-            value = getattr(self, name, field.default)
-            node_xml = field.to_xml(value)
-            nodes.append(node_xml)
-        data = '\n'.join(nodes)
-        return tpl.format(data=data)
+    def render(self, binary=False):
+        """
+        Render reply from Python object to XML string
+
+        :param binary: 可选，是否返回 UTF-8 编码的 bytes，可以直接传给 ``WeChatCrypto.encrypt_message``
+        """
+        nodes = ['<xml>\n<MsgType><![CDATA[', escape_cdata(self.type), ']]></MsgType>']
+        for name, to_xml in self._render_plan:
+            nodes.append('\n')
+            nodes.append(to_xml(getattr(self, name)))
+        nodes.append('\n</xml>')
+        xml = ''.join(nodes)
+        return xml.encode('utf-8') if binary else xml
 
     def __str__(self):
         if six.PY2:
@@ -95,8 +95,8 @@ class EmptyReply(BaseReply):
     def __init__(self):
         pass
 
-    def render(self):
-        return ''
+    def render(self, binary=False):
+        return b'' if binary else ''
 
 
 @register_reply('text')
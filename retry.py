@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.retry
+    ~~~~~~~~~~~~~~~
+
+    This module provides the retry policy and per-host circuit breaker
+    used by all API clients.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import logging
+import random
+import socket
+import time
+from urllib.parse import urlsplit
+
+from tornado.httpclient import HTTPClientError
+
+from wechatpy_tornado.constants import WeChatErrorCode
+from wechatpy_tornado.exceptions import CircuitOpenException, WeChatException
+
+logger = logging.getLogger(__name__)
+
+# 服务端明确表示未处理、可以重试的错误码
+RETRY_ERRCODES = (
+    WeChatErrorCode.SYSTEM_BUSY.value,
+    # 微信支付
+    'SYSTEMERROR',
+)
+
+# 可能已经执行成功、不能自动重试的接口，如退款、企业付款和红包
+NON_RETRYABLE_ENDPOINTS = (
+    'secapi/pay/refund',
+    'secapi/pay/reverse',
+    'pay/micropay',
+    'mmpaymkttransfers/promotion/transfers',
+    'mmpaymkttransfers/pay_bank',
+    'mmpaymkttransfers/sendredpack',
+    'mmpaymkttransfers/sendgroupredpack',
+    'mmpaymkttransfers/sendminiprogramhb',
+    'mmpaymkttransfers/send_coupon',
+)
+
+
+def is_unprocessed(e, retry_errcodes=RETRY_ERRCODES):
+    """
+    请求出错时服务端是否一定没有处理，非幂等请求也可以安全地重试
+
+    只有 ``retry_errcodes`` 中的错误码、连接被拒绝和 DNS 解析失败算作未处理，
+    超时、5xx 、连接中断等情况请求可能已被处理
+
+    :param e: 请求抛出的异常
+    :param retry_errcodes: 可选，服务端明确表示未处理的错误码，默认为 ``RETRY_ERRCODES``
+    """
+    if isinstance(e, WeChatException):
+        return e.errcode is not None and e.errcode in retry_errcodes
+    return isinstance(e, (ConnectionRefusedError, socket.gaierror))
+
+
+class CircuitBreaker(object):
+    """
+    按 host 熔断，连续失败 ``failure_threshold`` 次后熔断 ``recovery_timeout`` 秒，
+    期间请求直接抛出 ``CircuitOpenException`` ；之后放行一个试探请求，成功则恢复
+
+    :param failure_threshold: 可选，触发熔断的连续失败次数，默认为 5
+    :param recovery_timeout: 可选，熔断持续时间，单位秒，默认为 30
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._hosts = {}
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = {'state': self.CLOSED, 'failures': 0, 'opened_at': 0}
+        return state
+
+    def state(self, host):
+        """ host 当前的熔断状态 """
+        return self._state(host)['state']
+
+    def before_request(self, host):
+        state = self._state(host)
+        if state['state'] == self.CLOSED:
+            return
+        now = time.time()
+        if now - state['opened_at'] >= self.recovery_timeout:
+            # 放行一个试探请求，试探请求没有结果时下一个周期再放行一个
+            state['state'] = self.HALF_OPEN
+            state['opened_at'] = now
+            return
+        raise CircuitOpenException(errmsg='Circuit breaker is open for {0}'.format(host))
+
+    def record_success(self, host):
+        state = self._state(host)
+        state['state'] = self.CLOSED
+        state['failures'] = 0
+
+    def record_failure(self, host):
+        state = self._state(host)
+        state['failures'] += 1
+        if state['state'] == self.HALF_OPEN or state['failures'] >= self.failure_threshold:
+            if state['state'] != self.OPEN:
+                logger.warning('Circuit breaker opened for %s', host)
+            state['state'] = self.OPEN
+            state['opened_at'] = time.time()
+
+
+class RetryPolicy(object):
+    """
+    请求重试策略
+
+    以下情况服务端一定没有处理请求，所有请求都会重试：
+
+    * 返回 ``retry_errcodes`` 中的错误码，如 -1 系统繁忙
+    * 连接被拒绝、DNS 解析失败
+
+    超时、5xx、连接中断等情况请求可能已被处理，只有幂等请求（GET 或
+    ``idempotent_endpoints`` 中的接口）才会重试。``NON_RETRYABLE_ENDPOINTS``
+    中的接口（退款、企业付款、红包等）任何情况都不会自动重试。
+
+    使用示例::
+
+        from wechatpy_tornado import WeChatClient
+        from wechatpy_tornado.retry import RetryPolicy, CircuitBreaker
+
+        client = WeChatClient('appid', 'secret')
+        client.retry_policy = RetryPolicy(max_attempts=5, circuit_breaker=CircuitBreaker())
+
+    :param max_attempts: 可选，最多请求次数，默认为 3
+    :param backoff: 可选，第一次重试前的等待时间，单位秒，之后每次翻倍，默认为 0.1
+    :param max_backoff: 可选，重试等待时间上限，单位秒，默认为 5
+    :param jitter: 可选，是否在 0 ~ 退避时间之间随机等待（full jitter），默认为 True
+    :param retry_errcodes: 可选，可以重试的错误码，默认为 ``RETRY_ERRCODES``
+    :param retry_http_codes: 可选，幂等请求可以重试的 HTTP 状态码，599 为超时或连接错误
+    :param idempotent_endpoints: 可选，可以像 GET 一样重试的 POST 接口
+    :param non_retryable_endpoints: 可选，不自动重试的接口，默认为 ``NON_RETRYABLE_ENDPOINTS``
+    :param circuit_breaker: 可选，:class:`CircuitBreaker` 实例，默认不熔断
+    :param max_token_retries: 可选，access token 失效时刷新并重试的次数，默认为 1
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.1, max_backoff=5, jitter=True,
+                 retry_errcodes=RETRY_ERRCODES, retry_http_codes=(500, 502, 503, 504, 599),
+                 idempotent_endpoints=(), non_retryable_endpoints=NON_RETRYABLE_ENDPOINTS,
+                 circuit_breaker=None, max_token_retries=1):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_errcodes = retry_errcodes
+        self.retry_http_codes = retry_http_codes
+        self.idempotent_endpoints = idempotent_endpoints
+        self.non_retryable_endpoints = non_retryable_endpoints
+        self.circuit_breaker = circuit_breaker
+        self.max_token_retries = max_token_retries
+
+    @staticmethod
+    def _match(path, endpoints):
+        return any(path == name or path.endswith('/' + name) for name in endpoints)
+
+    def is_idempotent(self, method, url):
+        if method in ('GET', 'HEAD'):
+            return True
+        return self._match(urlsplit(url).path.strip('/'), self.idempotent_endpoints)
+
+    def is_host_failure(self, e):
+        """ 是否为 host 故障（用于熔断），业务错误码不算 """
+        if isinstance(e, HTTPClientError):
+            return e.code >= 500
+        if isinstance(e, WeChatException):
+            return e.errcode in self.retry_errcodes
+        return isinstance(e, (OSError, asyncio.TimeoutError))
+
+    def should_retry(self, method, url, e):
+        """ 判断请求出错后是否可以重试 """
+        if self._match(urlsplit(url).path.strip('/'), self.non_retryable_endpoints):
+            return False
+        if is_unprocessed(e, self.retry_errcodes):
+            return True
+        if isinstance(e, WeChatException) or not self.is_idempotent(method, url):
+            return False
+        if isinstance(e, HTTPClientError):
+            return e.code in self.retry_http_codes
+        return isinstance(e, (OSError, asyncio.TimeoutError))
+
+    def get_delay(self, attempt):
+        """ 第 ``attempt`` 次请求失败后的等待时间 """
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    async def execute(self, method, url, request):
+        """
+        按策略执行请求
+
+        :param method: HTTP 方法
+        :param url: 请求地址
+        :param request: 无参数的协程函数，执行一次请求
+        """
+        host = urlsplit(url).netloc
+        breaker = self.circuit_breaker
+        attempt = 0
+        while True:
+            attempt += 1
+            if breaker is not None:
+                breaker.before_request(host)
+            try:
+                result = await request()
+            except Exception as e:
+                if breaker is not None:
+                    if self.is_host_failure(e):
+                        breaker.record_failure(host)
+                    else:
+                        breaker.record_success(host)
+                if attempt >= self.max_attempts or not self.should_retry(method, url, e):
+                    raise
+                delay = self.get_delay(attempt)
+                logger.info('Request %s %s failed: %r, retry in %.3fs', method, url, e, delay)
+                await asyncio.sleep(delay)
+            else:
+                if breaker is not None:
+                    breaker.record_success(host)
+                return result
@@ -1,8 +1,36 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 
+import asyncio
+import functools
+import math
+import time
+
+
+def _gcra(tat, now, interval, burst, reserve):
+    """ GCRA 限速的计算，返回 (需要等待的秒数, 新的理论到达时间) ，不预留时后者为 None """
+    tat = max(tat or now, now)
+    delay = max(tat + interval - burst * interval - now, 0)
+    if not reserve:
+        return delay, None
+    return delay, tat + interval
+
 
 class SessionStorage(object):
+    """
+    session 存储基类
+
+    客户端中的协程通过 ``aget`` 、``aset`` 等异步方法访问存储。
+    默认实现直接调用同步方法，适用于进程内的存储；
+    ``blocking`` 为 True 的存储（如 redis-py 、pymemcache 客户端）
+    会在线程池 ``executor`` 中调用同步方法，不阻塞 IOLoop 。
+    原生异步的存储覆盖这些异步方法即可。
+    """
+
+    # 同步方法是否会阻塞，如进行网络请求
+    blocking = False
+    # blocking 为 True 时调用同步方法的线程池，默认使用 IOLoop 的默认线程池
+    executor = None
 
     def get(self, key, default=None):
         raise NotImplementedError()
@@ -13,6 +41,148 @@ class SessionStorage(object):
     def delete(self, key):
         raise NotImplementedError()
 
+    def acquire_lock(self, key, ttl):
+        """
+        尝试获取一个带过期时间的租约锁
+
+        默认实现适用于进程内的存储，总是获取成功；
+        多进程共享的存储需要覆盖此方法。
+
+        :param key: 锁名称
+        :param ttl: 锁的过期时间，单位秒
+        :return: 获取成功返回 fencing token，否则返回 None
+        """
+        return 0
+
+    def release_lock(self, key, token):
+        """
+        释放租约锁，仅当锁仍由 ``token`` 持有时才会删除
+
+        :param key: 锁名称
+        :param token: ``acquire_lock`` 返回的 fencing token
+        """
+        pass
+
+    def set_fenced(self, mapping, fence_key, token, ttl=None):
+        """
+        按 fencing token 写入：仅当 ``fence_key`` 中保存的 token 不大于 ``token`` 时
+        写入 ``mapping`` 并保存 ``token`` ，租约过期的持有者无法覆盖更新的写入
+
+        默认实现适用于进程内的存储；多进程共享的存储需要覆盖此方法以保证原子性。
+
+        :param mapping: 键到值的 dict
+        :param fence_key: 保存 fencing token 的键
+        :param token: ``acquire_lock`` 返回的 fencing token
+        :param ttl: 可选，``mapping`` 的过期时间，单位秒
+        :return: 是否写入
+        """
+        current = self.get(fence_key)
+        if current is not None and int(current) > token:
+            return False
+        self._mset(mapping, ttl)
+        self.set(fence_key, token)
+        return True
+
+    def throttle(self, key, interval, burst, reserve=True):
+        """
+        GCRA 限速，为 ``key`` 预留一次调用的时间窗口
+
+        默认实现基于 ``get``/``set`` ，适用于进程内的存储；
+        多进程共享的存储需要覆盖此方法以保证原子性。
+
+        :param key: 限速键
+        :param interval: 两次调用的最小间隔，单位秒，即速率的倒数
+        :param burst: 允许的突发调用数
+        :param reserve: 是否预留，为 False 时只计算需要等待的时间，不修改限速状态
+        :return: 需要等待的秒数，为 0 时可立即调用
+        """
+        now = time.time()
+        delay, tat = _gcra(self.get(key), now, interval, burst, reserve)
+        if tat is not None:
+            self.set(key, tat, int(math.ceil(tat - now)) + 1)
+        return delay
+
+    def invalidate(self, *keys):
+        """
+        丢弃这些键在进程内的缓存，下次读取时从共享存储读取
+
+        默认实现什么也不做，见 :class:`wechatpy_tornado.session.tieredstorage.TieredStorage`
+        """
+        pass
+
+    async def _call(self, func, *args, **kwargs):
+        if not self.blocking:
+            return func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def aget(self, key, default=None):
+        """ ``get`` 的异步版本 """
+        return await self._call(self.get, key, default)
+
+    async def aset(self, key, value, ttl=None):
+        """ ``set`` 的异步版本 """
+        return await self._call(self.set, key, value, ttl)
+
+    async def adelete(self, key):
+        """ ``delete`` 的异步版本 """
+        return await self._call(self.delete, key)
+
+    def _mget(self, keys, default):
+        return [self.get(key, default) for key in keys]
+
+    def _mset(self, mapping, ttl):
+        for key, value in mapping.items():
+            self.set(key, value, ttl)
+
+    async def amget(self, keys, default=None):
+        """
+        批量读取
+
+        :param keys: 键的 list
+        :param default: 可选，不存在时的默认值
+        :return: 与 ``keys`` 一一对应的值的 list
+        """
+        return await self._call(self._mget, keys, default)
+
+    def _mget_with_ttl(self, keys):
+        return [(value, None) for value in self._mget(keys, None)]
+
+    async def amget_with_ttl(self, keys):
+        """
+        批量读取值和剩余的过期时间
+
+        :param keys: 键的 list
+        :return: 与 ``keys`` 一一对应的 ``(值, 剩余秒数)`` 的 list ，
+                 不存在的键值为 None ，存储不支持读取过期时间或没有过期时间时剩余秒数为 None
+        """
+        return await self._call(self._mget_with_ttl, keys)
+
+    async def amset(self, mapping, ttl=None):
+        """
+        批量写入
+
+        :param mapping: 键到值的 dict
+        :param ttl: 可选，过期时间，单位秒
+        """
+        return await self._call(self._mset, mapping, ttl)
+
+    async def aacquire_lock(self, key, ttl):
+        """ ``acquire_lock`` 的异步版本 """
+        return await self._call(self.acquire_lock, key, ttl)
+
+    async def arelease_lock(self, key, token):
+        """ ``release_lock`` 的异步版本 """
+        return await self._call(self.release_lock, key, token)
+
+    async def aset_fenced(self, mapping, fence_key, token, ttl=None):
+        """ ``set_fenced`` 的异步版本 """
+        return await self._call(self.set_fenced, mapping, fence_key, token, ttl)
+
+    async def athrottle(self, key, interval, burst, reserve=True):
+        """ ``throttle`` 的异步版本 """
+        return await self._call(self.throttle, key, interval, burst, reserve)
+
     def __getitem__(self, key):
         self.get(key)
 
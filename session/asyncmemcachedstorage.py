@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import math
+import time
+
+from wechatpy_tornado.session import SessionStorage, _gcra
+from wechatpy_tornado.utils import to_binary, to_text
+from wechatpy_tornado.utils import json
+
+
+class AsyncMemcachedStorage(SessionStorage):
+    """
+    基于 aiomcache 的存储，只支持异步方法
+
+    使用示例::
+
+        import aiomcache
+        from wechatpy_tornado.session.asyncmemcachedstorage import AsyncMemcachedStorage
+
+        client = WeChatClient('appid', 'secret',
+                              session=AsyncMemcachedStorage(aiomcache.Client('127.0.0.1', 11211)))
+
+    :param mc: ``aiomcache.Client`` 或 API 相同的客户端
+    :param prefix: 可选，键的前缀
+    """
+
+    def __init__(self, mc, prefix='wechatpy_tornado'):
+        for method_name in ('get', 'set', 'delete', 'multi_get', 'add', 'incr', 'gets', 'cas'):
+            assert hasattr(mc, method_name)
+        self.mc = mc
+        self.prefix = prefix
+
+    def key_name(self, key):
+        return to_binary('{0}:{1}'.format(self.prefix, key))
+
+    async def aget(self, key, default=None):
+        value = await self.mc.get(self.key_name(key))
+        if value is None:
+            return default
+        return json.loads(to_text(value))
+
+    async def aset(self, key, value, ttl=None):
+        if value is None:
+            return
+        await self.mc.set(self.key_name(key), to_binary(json.dumps(value)), ttl or 0)
+
+    async def adelete(self, key):
+        await self.mc.delete(self.key_name(key))
+
+    async def amget(self, keys, default=None):
+        if not keys:
+            return []
+        values = await self.mc.multi_get(*[self.key_name(key) for key in keys])
+        return [default if value is None else json.loads(to_text(value)) for value in values]
+
+    async def amset(self, mapping, ttl=None):
+        for key, value in mapping.items():
+            await self.aset(key, value, ttl)
+
+    async def aacquire_lock(self, key, ttl):
+        key = self.key_name(key)
+        fencing_key = key + b':fencing'
+        # incr 要求键已存在
+        await self.mc.add(fencing_key, b'0', 0)
+        token = await self.mc.incr(fencing_key, 1)
+        if await self.mc.add(key, to_binary(token), ttl):
+            return int(token)
+        return None
+
+    async def arelease_lock(self, key, token):
+        key = self.key_name(key)
+        value = await self.mc.get(key)
+        if value is not None and to_text(value) == str(token):
+            await self.mc.delete(key)
+
+    async def _compare_and_set(self, key, update):
+        """ 用 gets/cas 原子地更新 ``key`` ，见 ``MemcachedStorage._compare_and_set`` """
+        while True:
+            value, cas = await self.mc.gets(key)
+            result = update(None if value is None else json.loads(to_text(value)))
+            if result is None:
+                return False, None
+            new, ttl = result
+            if value is None:
+                stored = await self.mc.add(key, to_binary(json.dumps(new)), ttl)
+            else:
+                stored = await self.mc.cas(key, to_binary(json.dumps(new)), cas, ttl)
+            if stored:
+                return True, new
+
+    async def aset_fenced(self, mapping, fence_key, token, ttl=None):
+        # fencing token 的比较和更新是原子的，之后写入 mapping 不是
+        stored, _ = await self._compare_and_set(
+            self.key_name(fence_key),
+            lambda current: None if current is not None and int(current) > token else (int(token), 0)
+        )
+        if stored:
+            await self.amset(mapping, ttl)
+        return stored
+
+    async def athrottle(self, key, interval, burst, reserve=True):
+        now = time.time()
+        delays = []
+
+        def update(tat):
+            delay, tat = _gcra(tat, now, interval, burst, reserve)
+            delays.append(delay)
+            if tat is not None:
+                return tat, int(math.ceil(tat - now)) + 1
+
+        await self._compare_and_set(self.key_name(key), update)
+        return delays[-1]
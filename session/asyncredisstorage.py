@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import time
+
+from wechatpy_tornado.session.redisstorage import RedisStorage
+from wechatpy_tornado.utils import to_text
+from wechatpy_tornado.utils import json
+
+
+class AsyncRedisStorage(RedisStorage):
+    """
+    基于 asyncio Redis 客户端的存储，只支持异步方法
+
+    使用示例::
+
+        from redis.asyncio import Redis
+        from wechatpy_tornado.session.asyncredisstorage import AsyncRedisStorage
+
+        client = WeChatClient('appid', 'secret', session=AsyncRedisStorage(Redis()))
+
+    :param redis: ``redis.asyncio.Redis`` 或 API 相同的客户端
+    :param prefix: 可选，键的前缀
+    """
+
+    blocking = False
+
+    def get(self, key, default=None):
+        raise NotImplementedError('AsyncRedisStorage only supports aget')
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError('AsyncRedisStorage only supports aset')
+
+    def delete(self, key):
+        raise NotImplementedError('AsyncRedisStorage only supports adelete')
+
+    def acquire_lock(self, key, ttl):
+        raise NotImplementedError('AsyncRedisStorage only supports aacquire_lock')
+
+    def release_lock(self, key, token):
+        raise NotImplementedError('AsyncRedisStorage only supports arelease_lock')
+
+    def throttle(self, key, interval, burst, reserve=True):
+        raise NotImplementedError('AsyncRedisStorage only supports athrottle')
+
+    def set_fenced(self, mapping, fence_key, token, ttl=None):
+        raise NotImplementedError('AsyncRedisStorage only supports aset_fenced')
+
+    async def aget(self, key, default=None):
+        value = await self.redis.get(self.key_name(key))
+        if value is None:
+            return default
+        return json.loads(to_text(value))
+
+    async def aset(self, key, value, ttl=None):
+        if value is None:
+            return
+        await self.redis.set(self.key_name(key), json.dumps(value), ex=ttl)
+
+    async def adelete(self, key):
+        await self.redis.delete(self.key_name(key))
+
+    async def amget(self, keys, default=None):
+        if not keys:
+            return []
+        values = await self.redis.mget([self.key_name(key) for key in keys])
+        return [default if value is None else json.loads(to_text(value)) for value in values]
+
+    async def amget_with_ttl(self, keys):
+        if not keys:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(self.key_name(key))
+            pipe.pttl(self.key_name(key))
+        return self._with_ttl(await pipe.execute())
+
+    async def amset(self, mapping, ttl=None):
+        pipe = self.redis.pipeline(transaction=False)
+        for key, value in mapping.items():
+            if value is not None:
+                pipe.set(self.key_name(key), json.dumps(value), ex=ttl)
+        await pipe.execute()
+
+    async def aacquire_lock(self, key, ttl):
+        key = self.key_name(key)
+        token = await self.redis.incr('{0}:fencing'.format(key))
+        if await self.redis.set(key, token, nx=True, ex=ttl):
+            return token
+        return None
+
+    async def arelease_lock(self, key, token):
+        key = self.key_name(key)
+        await self.redis.eval(self.RELEASE_LOCK_SCRIPT, 1, key, token)
+
+    async def aset_fenced(self, mapping, fence_key, token, ttl=None):
+        args = self._fenced_args(mapping, fence_key, token, ttl)
+        return bool(int(await self.redis.eval(self.SET_FENCED_SCRIPT, *args)))
+
+    async def athrottle(self, key, interval, burst, reserve=True):
+        key = self.key_name(key)
+        delay = await self.redis.eval(
+            self.THROTTLE_SCRIPT, 1, key,
+            repr(time.time()), repr(interval), burst, int(reserve)
+        )
+        return float(to_text(delay))
@@ -1,18 +1,35 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 
-from wechatpy_tornado.session import SessionStorage
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from wechatpy_tornado.session import SessionStorage, _gcra
 from wechatpy_tornado.utils import to_text
 from wechatpy_tornado.utils import json
 
 
 class MemcachedStorage(SessionStorage):
+    """
+    基于 pymemcache 的 session 存储
+
+    pymemcache 的 ``Client`` 不是线程安全的，默认在专用的单线程 ``executor`` 中调用；
+    使用 ``PooledClient`` 或 ``HashClient(use_pooling=True)`` 时可以传入多线程的 ``executor`` 。
+
+    :param mc: pymemcache 客户端
+    :param prefix: 可选，键的前缀
+    :param executor: 可选，调用 ``mc`` 的线程池，默认为专用的单线程线程池
+    """
+
+    blocking = True
 
-    def __init__(self, mc, prefix='wechatpy_tornado'):
+    def __init__(self, mc, prefix='wechatpy_tornado', executor=None):
         for method_name in ('get', 'set', 'delete'):
             assert hasattr(mc, method_name)
         self.mc = mc
         self.prefix = prefix
+        self.executor = executor or ThreadPoolExecutor(1)
 
     def key_name(self, key):
         return '{0}:{1}'.format(self.prefix, key)
@@ -34,3 +51,65 @@ class MemcachedStorage(SessionStorage):
     def delete(self, key):
         key = self.key_name(key)
         self.mc.delete(key)
+
+    def acquire_lock(self, key, ttl):
+        key = self.key_name(key)
+        fencing_key = '{0}:fencing'.format(key)
+        token = self.mc.incr(fencing_key, 1, noreply=False)
+        if token is None:
+            if self.mc.add(fencing_key, '1', 0, noreply=False):
+                token = 1
+            else:
+                token = self.mc.incr(fencing_key, 1, noreply=False)
+        if self.mc.add(key, str(token), ttl, noreply=False):
+            return int(token)
+        return None
+
+    def _compare_and_set(self, key, update):
+        """
+        用 gets/cas 原子地更新 ``key`` ，冲突时重试，每次冲突都说明有其他调用更新成功
+
+        :param update: 接收当前值（不存在时为 None），返回 ``(新值, 过期时间)`` ，返回 None 表示不更新
+        :return: ``(是否写入, 新值)``
+        """
+        while True:
+            value, cas = self.mc.gets(key)
+            result = update(None if value is None else json.loads(to_text(value)))
+            if result is None:
+                return False, None
+            new, ttl = result
+            if value is None:
+                stored = self.mc.add(key, json.dumps(new), ttl, noreply=False)
+            else:
+                stored = self.mc.cas(key, json.dumps(new), cas, ttl, noreply=False)
+            if stored:
+                return True, new
+
+    def set_fenced(self, mapping, fence_key, token, ttl=None):
+        # fencing token 的比较和更新是原子的，之后写入 mapping 不是
+        stored, _ = self._compare_and_set(
+            self.key_name(fence_key),
+            lambda current: None if current is not None and int(current) > token else (int(token), 0)
+        )
+        if stored:
+            self._mset(mapping, ttl)
+        return stored
+
+    def throttle(self, key, interval, burst, reserve=True):
+        now = time.time()
+        delays = []
+
+        def update(tat):
+            delay, tat = _gcra(tat, now, interval, burst, reserve)
+            delays.append(delay)
+            if tat is not None:
+                return tat, int(math.ceil(tat - now)) + 1
+
+        self._compare_and_set(self.key_name(key), update)
+        return delays[-1]
+
+    def release_lock(self, key, token):
+        key = self.key_name(key)
+        value = self.mc.get(key)
+        if value is not None and to_text(value) == str(token):
+            self.mc.delete(key)
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
+
+import time
+
 from wechatpy_tornado.session import SessionStorage
 from wechatpy_tornado.utils import to_text
 from wechatpy_tornado.utils import json
@@ -7,6 +10,48 @@ from wechatpy_tornado.utils import json
 
 class RedisStorage(SessionStorage):
 
+    blocking = True
+
+    # delete the lock only if it is still held by the given fencing token
+    RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+    # GCRA: KEYS[1] 保存理论到达时间，ARGV 为 now, interval, burst, reserve
+    THROTTLE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call('get', KEYS[1]) or now), now)
+local delay = tat + interval - tonumber(ARGV[3]) * interval - now
+if ARGV[4] == '0' then
+    return tostring(math.max(delay, 0))
+end
+tat = tat + interval
+redis.call('set', KEYS[1], tostring(tat), 'EX', math.ceil(tat - now) + 1)
+return tostring(math.max(delay, 0))
+"""
+
+    # KEYS[1] 保存 fencing token ，其余 KEYS 与 ARGV[3:] 一一对应，ARGV[1] 为 token ，ARGV[2] 为过期时间
+    SET_FENCED_SCRIPT = """
+local current = redis.call('get', KEYS[1])
+if current and tonumber(current) > tonumber(ARGV[1]) then
+    return 0
+end
+local ttl = tonumber(ARGV[2])
+for i = 2, #KEYS do
+    if ttl > 0 then
+        redis.call('set', KEYS[i], ARGV[i + 1], 'EX', ttl)
+    else
+        redis.call('set', KEYS[i], ARGV[i + 1])
+    end
+end
+redis.call('set', KEYS[1], ARGV[1])
+return 1
+"""
+
     def __init__(self, redis, prefix='wechatpy_tornado'):
         for method_name in ('get', 'set', 'delete'):
             assert hasattr(redis, method_name)
@@ -33,3 +78,67 @@ class RedisStorage(SessionStorage):
     def delete(self, key):
         key = self.key_name(key)
         self.redis.delete(key)
+
+    def _mget(self, keys, default):
+        if not keys or not hasattr(self.redis, 'mget'):
+            return super(RedisStorage, self)._mget(keys, default)
+        values = self.redis.mget([self.key_name(key) for key in keys])
+        return [default if value is None else json.loads(to_text(value)) for value in values]
+
+    def _mget_with_ttl(self, keys):
+        if not keys or not hasattr(self.redis, 'pipeline'):
+            return super(RedisStorage, self)._mget_with_ttl(keys)
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(self.key_name(key))
+            pipe.pttl(self.key_name(key))
+        return self._with_ttl(pipe.execute())
+
+    @staticmethod
+    def _with_ttl(replies):
+        result = []
+        for value, pttl in zip(replies[::2], replies[1::2]):
+            if value is None:
+                result.append((None, None))
+            else:
+                # 没有过期时间时 PTTL 为 -1
+                result.append((json.loads(to_text(value)), pttl / 1000.0 if pttl >= 0 else None))
+        return result
+
+    def _mset(self, mapping, ttl):
+        if not hasattr(self.redis, 'pipeline'):
+            return super(RedisStorage, self)._mset(mapping, ttl)
+        pipe = self.redis.pipeline(transaction=False)
+        for key, value in mapping.items():
+            if value is not None:
+                pipe.set(self.key_name(key), json.dumps(value), ex=ttl)
+        pipe.execute()
+
+    def acquire_lock(self, key, ttl):
+        key = self.key_name(key)
+        token = self.redis.incr('{0}:fencing'.format(key))
+        if self.redis.set(key, token, nx=True, ex=ttl):
+            return token
+        return None
+
+    def release_lock(self, key, token):
+        key = self.key_name(key)
+        self.redis.eval(self.RELEASE_LOCK_SCRIPT, 1, key, token)
+
+    def _fenced_args(self, mapping, fence_key, token, ttl):
+        items = [(key, value) for key, value in mapping.items() if value is not None]
+        keys = [self.key_name(fence_key)] + [self.key_name(key) for key, _ in items]
+        args = [int(token), int(ttl or 0)] + [json.dumps(value) for _, value in items]
+        return [len(keys)] + keys + args
+
+    def set_fenced(self, mapping, fence_key, token, ttl=None):
+        args = self._fenced_args(mapping, fence_key, token, ttl)
+        return bool(int(self.redis.eval(self.SET_FENCED_SCRIPT, *args)))
+
+    def throttle(self, key, interval, burst, reserve=True):
+        key = self.key_name(key)
+        delay = self.redis.eval(
+            self.THROTTLE_SCRIPT, 1, key,
+            repr(time.time()), repr(interval), burst, int(reserve)
+        )
+        return float(to_text(delay))
@@ -5,6 +5,8 @@ from wechatpy_tornado.session import SessionStorage
 
 class ShoveStorage(SessionStorage):
 
+    blocking = True
+
     def __init__(self, shove, prefix='wechatpy'):
         self.shove = shove
         self.prefix = prefix
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+from wechatpy_tornado.session import SessionStorage
+from wechatpy_tornado.utils import to_text
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class RedisInvalidator(object):
+    """
+    通过 Redis pub/sub 通知其他进程失效 :class:`TieredStorage` 的进程内缓存
+
+    使用示例::
+
+        from redis.asyncio import Redis
+        from wechatpy_tornado.session.asyncredisstorage import AsyncRedisStorage
+        from wechatpy_tornado.session.tieredstorage import TieredStorage, RedisInvalidator
+
+        redis = Redis()
+        session = TieredStorage(AsyncRedisStorage(redis), invalidator=RedisInvalidator(redis))
+        session.start()
+
+    :param redis: ``redis.asyncio.Redis`` 或 API 相同的客户端
+    :param channel: 可选，发布失效消息的频道
+    :param keyspace_prefix: 可选，L2 存储的键前缀，如 ``wechatpy_tornado`` ，
+                            设置后同时订阅这些键的 keyspace 通知，
+                            不经过 ``TieredStorage`` 的修改也会失效进程内缓存，
+                            需要 Redis 开启 ``notify-keyspace-events`` （如 ``K$gx``）
+    :param db: 可选，订阅 keyspace 通知的数据库编号，默认为 0
+    """
+
+    def __init__(self, redis, channel='wechatpy_tornado:invalidate', keyspace_prefix=None, db=0):
+        self.redis = redis
+        self.channel = channel
+        self.keyspace_prefix = keyspace_prefix
+        self.db = db
+
+    async def publish(self, origin, keys):
+        """
+        发布失效消息
+
+        :param origin: 发布者的标识，发布者自己收到时忽略
+        :param keys: 失效的键的 list
+        """
+        for key in keys:
+            await self.redis.publish(self.channel, '{0} {1}'.format(origin, key))
+
+    async def listen(self, callback):
+        """
+        订阅失效消息，直到被取消
+
+        :param callback: 收到消息时调用 ``callback(key, origin)`` ，keyspace 通知的 origin 为 None
+        """
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self.channel)
+        pattern_prefix = None
+        if self.keyspace_prefix:
+            pattern_prefix = '__keyspace@{0}__:{1}:'.format(self.db, self.keyspace_prefix)
+            await pubsub.psubscribe(pattern_prefix + '*')
+        try:
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    origin, key = to_text(message['data']).split(' ', 1)
+                    callback(key, origin)
+                elif message['type'] == 'pmessage':
+                    callback(to_text(message['channel'])[len(pattern_prefix):], None)
+        finally:
+            await pubsub.reset()
+
+
+class TieredStorage(SessionStorage):
+    """
+    两级存储：进程内的 LRU 缓存（L1）加共享存储（L2）
+
+    读取时先查 L1 ，未命中再读 L2 并写入 L1 ；写入时同时写 L1 和 L2 。
+    access token 等凭证在有效期内只需从 L2 读取一次，``_request`` 不再每次访问 Redis 。
+    锁和限速直接使用 L2 。
+
+    L1 中的过期时间取 ``set`` 时的 ``ttl`` ，没有 ``ttl`` 时使用 ``default_ttl`` ；
+    从 L2 读到的值使用 ``default_ttl`` 和 L2 中剩余过期时间中较小的一个
+    （L2 不支持读取过期时间时，如 Memcached ，只使用 ``default_ttl``），
+    L2 中不存在的键缓存 ``negative_ttl`` 秒。
+    读取 L2 期间本进程写入或失效了同一个键时，读到的值不写入 L1 。
+    没有 ``invalidator`` 时其他进程的修改最多在 ``default_ttl`` 秒后可见，
+    客户端发现 access token 失效时会调用 ``invalidate`` 直接读取 L2 。
+
+    使用示例::
+
+        from redis import Redis
+        from wechatpy_tornado.session.redisstorage import RedisStorage
+        from wechatpy_tornado.session.tieredstorage import TieredStorage
+
+        session = TieredStorage(RedisStorage(Redis()))
+        client = WeChatClient('appid', 'secret', session=session)
+
+    :param storage: L2 存储，如 ``RedisStorage`` 、``MemcachedStorage`` 、``ShoveStorage``
+                    或 ``AsyncRedisStorage``
+    :param maxsize: 可选，L1 的最大键数，超出时按 LRU 淘汰，默认为 1024
+    :param default_ttl: 可选，L1 的默认过期时间，单位秒，默认为 60
+    :param negative_ttl: 可选，不存在的键在 L1 中的缓存时间，单位秒，默认为 1 ，为 0 时不缓存
+    :param invalidator: 可选，在进程间同步失效的 :class:`RedisInvalidator` ，
+                        需要调用 ``start`` 开始订阅
+    """
+
+    # 订阅 keyspace 通知时，本进程写入后这么多秒内收到的同一个键的通知可能是自己的写入产生的，
+    # 先读取 L2 ，值与 L1 不同时才失效
+    own_write_window = 1
+
+    def __init__(self, storage, maxsize=1024, default_ttl=60, negative_ttl=1, invalidator=None):
+        self.storage = storage
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.invalidator = invalidator
+        self._entries = OrderedDict()
+        self._origin = uuid.uuid4().hex
+        self._listener = None
+        # 每次修改 L1 时递增，用于判断读取 L2 期间键是否被修改
+        self._version = 0
+        # 正在读取 L2 的键到读取次数的 dict
+        self._loading = {}
+        # 正在读取 L2 的键到读取期间最后一次修改时的版本
+        self._changed = {}
+        # 本进程最近写入 L2 的键到忽略其 keyspace 通知的截止时间
+        self._own_writes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def stats(self):
+        """
+        L1 的统计
+
+        :return: dict，``hits`` 为命中次数（含 ``negative_hits``），``negative_hits`` 为命中不存在的键的次数，
+                 ``misses`` 为读取 L2 的键数，``evictions`` 为 LRU 淘汰数，
+                 ``invalidations`` 为收到其他进程失效消息的次数，``size`` 为当前键数
+        """
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'size': len(self._entries),
+        }
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if entry[0] is None:
+            self.negative_hits += 1
+        return entry[0]
+
+    def _touch(self, key):
+        self._version += 1
+        if key in self._loading:
+            self._changed[key] = self._version
+
+    def _discard(self, key):
+        self._touch(key)
+        self._entries.pop(key, None)
+
+    def _store(self, key, value, ttl=None):
+        self._touch(key)
+        if value is None:
+            ttl = self.negative_ttl
+        elif not ttl:
+            ttl = self.default_ttl
+        if ttl <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self._discard(key)
+
+    def clear(self):
+        """ 清空 L1 """
+        for key in self._loading:
+            self._touch(key)
+        self._entries.clear()
+
+    def _begin_load(self, keys):
+        for key in keys:
+            self._loading[key] = self._loading.get(key, 0) + 1
+        return self._version
+
+    def _end_load(self, keys, version):
+        """ 结束读取，返回读取期间没有被修改过的键 """
+        unchanged = set()
+        for key in keys:
+            count = self._loading.pop(key) - 1
+            if count:
+                self._loading[key] = count
+                changed = self._changed.get(key, 0)
+            else:
+                changed = self._changed.pop(key, 0)
+            if changed <= version:
+                unchanged.add(key)
+        return unchanged
+
+    def _store_loaded(self, key, value, ttl):
+        # L1 中的值不能比 L2 中的晚过期
+        if value is not None and ttl is not None:
+            if ttl <= 0:
+                self._discard(key)
+                return
+            ttl = min(ttl, self.default_ttl)
+        self._store(key, value, ttl)
+
+    def _load(self, keys):
+        version = self._begin_load(keys)
+        try:
+            loaded = self.storage._mget_with_ttl(keys)
+        finally:
+            unchanged = self._end_load(keys, version)
+        return self._fill(keys, loaded, unchanged)
+
+    async def _aload(self, keys):
+        version = self._begin_load(keys)
+        try:
+            loaded = await self.storage.amget_with_ttl(keys)
+        finally:
+            unchanged = self._end_load(keys, version)
+        return self._fill(keys, loaded, unchanged)
+
+    def _fill(self, keys, loaded, unchanged):
+        # 读取期间本进程写入或收到失效消息的键，读到的值可能已经过期，不写入 L1
+        for key, (value, ttl) in zip(keys, loaded):
+            if key in unchanged:
+                self._store_loaded(key, value, ttl)
+        return [value for value, ttl in loaded]
+
+    def _mark_written(self, keys):
+        if self.invalidator is None or not getattr(self.invalidator, 'keyspace_prefix', None):
+            return
+        now = time.monotonic()
+        for key in keys:
+            self._own_writes[key] = now + self.own_write_window
+            self._own_writes.move_to_end(key)
+        while self._own_writes:
+            key, deadline = next(iter(self._own_writes.items()))
+            if deadline > now:
+                break
+            del self._own_writes[key]
+
+    def _is_own_write(self, key):
+        deadline = self._own_writes.get(key)
+        return deadline is not None and deadline > time.monotonic()
+
+    def _publish(self, keys):
+        if self.invalidator is None:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        asyncio.ensure_future(self._apublish(keys))
+
+    async def _apublish(self, keys):
+        if self.invalidator is None:
+            return
+        try:
+            await self.invalidator.publish(self._origin, keys)
+        except Exception:
+            logger.warning('Failed to publish invalidation of %s', keys, exc_info=True)
+
+    def _on_invalidate(self, key, origin):
+        if origin == self._origin:
+            return
+        if origin is None and self._is_own_write(key):
+            # 可能是本进程写入产生的 keyspace 通知，L2 中的值与 L1 不同时才失效
+            asyncio.ensure_future(self._revalidate(key))
+            return
+        self.invalidations += 1
+        self._discard(key)
+
+    async def _revalidate(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        version = self._begin_load([key])
+        try:
+            (value, ttl), = await self.storage.amget_with_ttl([key])
+        except Exception:
+            logger.warning('Failed to revalidate %s', key, exc_info=True)
+            value = _MISSING
+        finally:
+            unchanged = self._end_load([key], version)
+        if key in unchanged and value != entry[0]:
+            self.invalidations += 1
+            self._discard(key)
+
+    def start(self):
+        """ 开始订阅 ``invalidator`` 的失效消息，需要在 IOLoop 中调用 """
+        if self.invalidator is not None and self._listener is None:
+            self._listener = asyncio.ensure_future(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                await self.invalidator.listen(self._on_invalidate)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning('Invalidation listener failed, retry in 1s', exc_info=True)
+            # 断开期间可能错过失效消息
+            self.clear()
+            await asyncio.sleep(1)
+
+    def close(self):
+        """ 停止订阅失效消息 """
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            value, = self._load([key])
+        return default if value is None else value
+
+    def set(self, key, value, ttl=None):
+        if value is None:
+            return
+        self._mark_written([key])
+        self.storage.set(key, value, ttl)
+        self._store(key, value, ttl)
+        self._publish([key])
+
+    def delete(self, key):
+        self._mark_written([key])
+        self.storage.delete(key)
+        self._store(key, None)
+        self._publish([key])
+
+    async def aget(self, key, default=None):
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            value, = await self._aload([key])
+        return default if value is None else value
+
+    async def aset(self, key, value, ttl=None):
+        if value is None:
+            return
+        self._mark_written([key])
+        await self.storage.aset(key, value, ttl)
+        self._store(key, value, ttl)
+        await self._apublish([key])
+
+    async def adelete(self, key):
+        self._mark_written([key])
+        await self.storage.adelete(key)
+        self._store(key, None)
+        await self._apublish([key])
+
+    async def amget(self, keys, default=None):
+        values = [self._lookup(key) for key in keys]
+        missing = [key for key, value in zip(keys, values) if value is _MISSING]
+        if missing:
+            self.misses += len(missing)
+            loaded = dict(zip(missing, await self._aload(missing)))
+            values = [loaded[key] if value is _MISSING else value for key, value in zip(keys, values)]
+        return [default if value is None else value for value in values]
+
+    async def amset(self, mapping, ttl=None):
+        self._mark_written(mapping)
+        await self.storage.amset(mapping, ttl)
+        for key, value in mapping.items():
+            if value is not None:
+                self._store(key, value, ttl)
+        await self._apublish(list(mapping))
+
+    def set_fenced(self, mapping, fence_key, token, ttl=None):
+        self._mark_written(mapping)
+        stored = self.storage.set_fenced(mapping, fence_key, token, ttl)
+        self._after_fenced(mapping, ttl, stored)
+        if stored:
+            self._publish(list(mapping))
+        return stored
+
+    async def aset_fenced(self, mapping, fence_key, token, ttl=None):
+        self._mark_written(mapping)
+        stored = await self.storage.aset_fenced(mapping, fence_key, token, ttl)
+        self._after_fenced(mapping, ttl, stored)
+        if stored:
+            await self._apublish(list(mapping))
+        return stored
+
+    def _after_fenced(self, mapping, ttl, stored):
+        # 写入被拒绝说明 L2 中有更新的值，丢弃 L1 中可能过期的值
+        for key, value in mapping.items():
+            if stored and value is not None:
+                self._store(key, value, ttl)
+            else:
+                self._discard(key)
+
+    def acquire_lock(self, key, ttl):
+        return self.storage.acquire_lock(key, ttl)
+
+    def release_lock(self, key, token):
+        return self.storage.release_lock(key, token)
+
+    def throttle(self, key, interval, burst, reserve=True):
+        return self.storage.throttle(key, interval, burst, reserve)
+
+    async def aacquire_lock(self, key, ttl):
+        return await self.storage.aacquire_lock(key, ttl)
+
+    async def arelease_lock(self, key, token):
+        return await self.storage.arelease_lock(key, token)
+
+    async def athrottle(self, key, interval, burst, reserve=True):
+        return await self.storage.athrottle(key, interval, burst, reserve)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+from unittest import mock
+
+from tornado.testing import AsyncHTTPTestCase, AsyncTestCase, gen_test
+from tornado.web import Application, RequestHandler
+
+from wechatpy_tornado import WeChatClient
+from wechatpy_tornado.exceptions import WeChatClientException
+from wechatpy_tornado.instrument import Hook
+from wechatpy_tornado.session.memorystorage import MemoryStorage
+
+
+class TokenHandler(RequestHandler):
+
+    def initialize(self, stub):
+        self.stub = stub
+
+    async def get(self):
+        self.stub.fetches += 1
+        number = self.stub.fetches
+        # 保持获取过程足够长，让所有调用方都在等待同一次获取
+        await asyncio.sleep(0.05)
+        if self.stub.errcode:
+            self.write({'errcode': self.stub.errcode, 'errmsg': 'invalid appid'})
+        else:
+            self.write({
+                'access_token': 'token_{0}'.format(number),
+                'expires_in': 7200,
+            })
+
+
+class CallbackIPHandler(RequestHandler):
+
+    def get(self):
+        access_token = self.get_argument('access_token')
+        if access_token == 'expired':
+            self.write({'errcode': 40001, 'errmsg': 'invalid credential'})
+        else:
+            self.write({'ip_list': [access_token]})
+
+
+class AccessTokenSingleFlightTestCase(AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.fetches = 0
+        self.errcode = None
+        return Application([
+            ('/cgi-bin/token', TokenHandler, {'stub': self}),
+            ('/cgi-bin/getcallbackip', CallbackIPHandler),
+        ])
+
+    def _client(self, appid, session=None):
+        client = WeChatClient(appid, 'secret', session=session)
+        client.API_BASE_URL = self.get_url('/cgi-bin/')
+        return client
+
+    @gen_test
+    async def test_concurrent_requests_share_one_fetch(self):
+        client = self._client('single_flight_ok')
+        results = await asyncio.gather(*[client.misc.get_wechat_ips() for _ in range(1000)])
+        self.assertEqual(1, self.fetches)
+        self.assertEqual([['token_1']] * 1000, results)
+
+    @gen_test
+    async def test_concurrent_requests_share_one_error(self):
+        self.errcode = 40013
+        client = self._client('single_flight_error')
+        results = await asyncio.gather(
+            *[client.misc.get_wechat_ips() for _ in range(1000)],
+            return_exceptions=True
+        )
+        self.assertEqual(1, self.fetches)
+        self.assertIsInstance(results[0], WeChatClientException)
+        self.assertEqual(40013, results[0].errcode)
+        self.assertTrue(all(result is results[0] for result in results))
+        # 失败的获取不会被缓存，下一次调用重新获取
+        with self.assertRaises(WeChatClientException):
+            await client.access_token()
+        self.assertEqual(2, self.fetches)
+
+    @gen_test
+    async def test_clients_with_separate_sessions(self):
+        first = self._client('same_appid', MemoryStorage())
+        second = self._client('same_appid', MemoryStorage())
+        tokens = await asyncio.gather(first.access_token(), second.access_token())
+        self.assertEqual(2, self.fetches)
+        self.assertEqual({'token_1', 'token_2'}, set(tokens))
+
+    @gen_test
+    async def test_token_retry_fires_hooks_once(self):
+        client = WeChatClient('token_retry_hooks', 'secret', access_token='expired')
+        client.API_BASE_URL = self.get_url('/cgi-bin/')
+        hook = mock.Mock(spec=Hook)
+        client.hooks = [hook]
+        self.assertEqual(['token_1'], await client.misc.get_wechat_ips())
+        self.assertEqual(1, self.fetches)
+        self.assertEqual(1, hook.before_request.call_count)
+        self.assertEqual(1, hook.after_response.call_count)
+        hook.on_error.assert_not_called()
+
+
+class ExpiringLeaseStorage(MemoryStorage):
+    """ 每次都能获取租约锁，模拟之前的租约已经过期 """
+
+    def __init__(self):
+        super(ExpiringLeaseStorage, self).__init__()
+        self.fences = 0
+
+    def acquire_lock(self, key, ttl):
+        self.fences += 1
+        return self.fences
+
+
+class AccessTokenFencingTestCase(AsyncTestCase):
+
+    def _client(self, session, access_token, delay):
+        client = WeChatClient('fencing', 'secret', session=session)
+
+        async def fetch_access_token():
+            await asyncio.sleep(delay)
+            await client._save_access_token(access_token, 7200)
+            return {'access_token': access_token, 'expires_in': 7200}
+
+        client.fetch_access_token = mock.AsyncMock(side_effect=fetch_access_token)
+        return client
+
+    @gen_test
+    async def test_expired_lease_holder_cannot_overwrite(self):
+        session = ExpiringLeaseStorage()
+        stale = self._client(session, 'stale', 0.05)
+        fresh = self._client(session, 'fresh', 0)
+        stale_fetch = asyncio.ensure_future(stale._fetch_access_token_exclusive())
+        await asyncio.sleep(0.01)
+        await fresh._fetch_access_token_exclusive()
+        await stale_fetch
+        self.assertEqual(1, stale.fetch_access_token.await_count)
+        self.assertEqual('fresh', session.get(stale.access_token_key))
+        self.assertEqual(2, session.get(stale.access_token_fence_key))
+        # 被拒绝的持有者采用 session 中的过期时间
+        self.assertEqual(fresh.expires_at, stale.expires_at)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import json
+import os
+import re
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from tornado.httpclient import HTTPResponse
+from tornado.testing import AsyncTestCase, gen_test
+
+from wechatpy_tornado import WeChatClient
+
+
+class CloudUploadFileTestCase(AsyncTestCase):
+
+    def setUp(self):
+        super(CloudUploadFileTestCase, self).setUp()
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'file content')
+        self.addCleanup(os.remove, self.path)
+
+    @gen_test
+    async def test_upload_file(self):
+        client = WeChatClient('cloud', 'secret', access_token='token')
+        requests = []
+        bodies = []
+
+        async def fetch(request, **kwargs):
+            requests.append(request)
+            if request.body_producer is None:
+                body = json.dumps({
+                    'errcode': 0,
+                    'url': 'https://cos.example.com/upload',
+                    'authorization': 'signature',
+                    'token': 'cos-token',
+                    'cos_file_id': 'file-id',
+                }).encode('utf-8')
+                return HTTPResponse(request, 200, buffer=BytesIO(body))
+            chunks = []
+
+            async def write(chunk):
+                chunks.append(chunk)
+
+            await request.body_producer(write)
+            bodies.append(b''.join(chunks))
+            return HTTPResponse(request, 204, buffer=BytesIO(b''))
+
+        client._http = mock.Mock(fetch=mock.AsyncMock(side_effect=fetch))
+        res = await client.cloud.upload_file('env', self.path)
+        self.assertEqual(204, res.code)
+
+        upload = requests[1]
+        self.assertEqual('https://cos.example.com/upload', upload.url)
+        self.assertEqual('POST', upload.method)
+        body = bodies[0]
+        self.assertEqual(int(upload.headers['Content-Length']), len(body))
+        names = re.findall(rb'Content-Disposition: form-data; name="([^"]+)"', body)
+        self.assertEqual(
+            [b'key', b'Signature', b'x-cos-security-token', b'x-cos-meta-fileid', b'file'],
+            names
+        )
+        self.assertIn(b'\r\n\r\nfile content\r\n', body)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import os
+import tempfile
+
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from tornado.web import Application, RequestHandler
+
+from wechatpy_tornado import WeChatClient
+from wechatpy_tornado.exceptions import DownloadResultException
+
+
+class VideoHandler(RequestHandler):
+
+    def get(self):
+        self.set_header('Content-Type', 'application/json')
+        self.write({'video_url': 'http://example.com/video.mp4'})
+
+
+class DownloadTestCase(AsyncHTTPTestCase):
+
+    def get_app(self):
+        return Application([('/video', VideoHandler)])
+
+    def setUp(self):
+        super(DownloadTestCase, self).setUp()
+        self.client = WeChatClient('download', 'secret', access_token='token')
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'previous')
+        self.addCleanup(os.remove, self.path)
+
+    @gen_test
+    async def test_iter_download_json_result(self):
+        with self.assertRaises(DownloadResultException) as context:
+            async for _ in self.client.iter_download(self.get_url('/video')):
+                pass
+        self.assertEqual({'video_url': 'http://example.com/video.mp4'}, context.exception.result)
+
+    @gen_test
+    async def test_download_json_result_keeps_file(self):
+        res = await self.client.download(self.get_url('/video'), self.path)
+        self.assertEqual({'video_url': 'http://example.com/video.mp4'}, res)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(b'previous', f.read())
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import time
+
+from tornado.testing import AsyncTestCase, gen_test
+
+from wechatpy_tornado.session.memorystorage import MemoryStorage
+from wechatpy_tornado.session.tieredstorage import TieredStorage
+
+
+class SlowStorage(MemoryStorage):
+    """ 读取较慢、能返回剩余过期时间的 L2 """
+
+    def __init__(self):
+        super(SlowStorage, self).__init__()
+        self.ttls = {}
+
+    def set(self, key, value, ttl=None):
+        super(SlowStorage, self).set(key, value, ttl)
+        self.ttls[key] = ttl
+
+    async def amget_with_ttl(self, keys):
+        result = [(self.get(key), self.ttls.get(key)) for key in keys]
+        await asyncio.sleep(0.05)
+        return result
+
+
+class TieredStorageTestCase(AsyncTestCase):
+
+    @gen_test
+    async def test_load_does_not_overwrite_newer_write(self):
+        session = TieredStorage(SlowStorage())
+        session.storage.set('key', 'old')
+        load = asyncio.ensure_future(session.aget('key'))
+        await asyncio.sleep(0.01)
+        await session.aset('key', 'new')
+        self.assertEqual('old', await load)
+        self.assertEqual('new', await session.aget('key'))
+        self.assertEqual({}, session._loading)
+        self.assertEqual({}, session._changed)
+
+    @gen_test
+    async def test_loaded_ttl_capped_by_l2(self):
+        session = TieredStorage(SlowStorage(), default_ttl=60)
+        session.storage.set('short', 'value', 5)
+        session.storage.set('forever', 'value')
+        self.assertEqual(['value', 'value'], await session.amget(['short', 'forever']))
+        now = time.monotonic()
+        self.assertLessEqual(session._entries['short'][1] - now, 5)
+        self.assertGreater(session._entries['forever'][1] - now, 5)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import unittest
+from xml.parsers.expat import ExpatError
+
+import xmltodict
+
+from wechatpy_tornado.xmlparser import parse_xml
+
+
+class ParseXMLTestCase(unittest.TestCase):
+
+    documents = [
+        '<xml><ToUserName><![CDATA[toUser]]></ToUserName>'
+        '<CreateTime>1348831860</CreateTime><MsgType><![CDATA[text]]></MsgType>'
+        '<Content><![CDATA[this is a test]]></Content><MsgId>1234567890123456</MsgId></xml>',
+        '<?xml version="1.0" encoding="utf-8"?>\n<xml>\n  <a>1</a>\n  <b/>\n  <c></c>\n</xml>',
+        '<xml><item><a>1</a></item><item><a>2</a></item></xml>',
+        '<xml><a>  padded  </a><b><![CDATA[  ]]></b></xml>',
+        '<xml><a>x &amp; y</a></xml>',
+        '<xml><a attr="1">x</a></xml>',
+        '<xml><!-- comment --><a>x</a></xml>',
+        '<xml><a><![CDATA[x]]><![CDATA[y]]></a></xml>',
+        '<xml><a>中文</a></xml>',
+        '<xml><a><![CDATA[a\r\nb]]></a></xml>',
+        '<xml><a>a\r\nb</a><b>c\rd</b></xml>',
+        '<xml>\r\n<a>1</a>\r\n</xml>',
+    ]
+
+    illegal_documents = [
+        '<xml><a>a\x01b</a></xml>',
+        '<xml><a><![CDATA[a\x0bb]]></a></xml>',
+        '<xml><a>1</a>\x1f</xml>',
+    ]
+
+    def test_same_as_xmltodict(self):
+        for xml in self.documents:
+            with self.subTest(xml=xml):
+                self.assertEqual(xmltodict.parse(xml), parse_xml(xml))
+                self.assertEqual(xmltodict.parse(xml.encode('utf-8')), parse_xml(xml.encode('utf-8')))
+
+    def test_illegal_characters(self):
+        for xml in self.illegal_documents:
+            with self.subTest(xml=xml):
+                with self.assertRaises(ExpatError):
+                    xmltodict.parse(xml)
+                with self.assertRaises(ExpatError):
+                    parse_xml(xml)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.transport
+    ~~~~~~~~~~~~~~~~~~~
+
+    This module provides the HTTP transport shared by all WeChat clients.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import socket
+import sys
+import time
+
+from urllib.parse import urlsplit
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.ioloop import IOLoop
+from tornado.netutil import Resolver
+
+
+class CachingResolver(Resolver):
+    """
+    带 TTL 缓存的 DNS 解析器，包装另一个 tornado ``Resolver``
+
+    :param resolver: 可选，实际执行解析的 ``Resolver``，默认为 tornado 配置的 ``Resolver``
+    :param ttl: 可选，解析结果缓存时间，单位秒，默认 300 秒
+    """
+
+    def initialize(self, resolver=None, ttl=300):
+        self.resolver = resolver or Resolver()
+        self.ttl = ttl
+        self._cache = {}
+
+    def close(self):
+        self.resolver.close()
+        self._cache.clear()
+
+    async def resolve(self, host, port, family=socket.AF_UNSPEC):
+        key = (host, port, family)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+        result = await self.resolver.resolve(host, port, family)
+        self._cache[key] = (time.time() + self.ttl, result)
+        return result
+
+
+class HTTPTransport(object):
+    """
+    所有接口共享的 HTTP 传输层，提供与 ``AsyncHTTPClient.fetch`` 相同的 ``fetch`` 方法
+
+    默认的 ``SimpleAsyncHTTPClient`` 不复用连接，需要 keep-alive 和 HTTP
+    pipelining 时请使用 ``use_curl=True`` （依赖 pycurl）。
+
+    :param max_clients: 可选，最大并发请求数，默认为 100
+    :param max_per_host: 可选，单个 host 的最大并发请求数，默认不限制
+    :param use_curl: 可选，是否使用 ``CurlAsyncHTTPClient`` ，默认为 False
+    :param dns_cache_ttl: 可选，DNS 缓存时间，单位秒，为 0 时不缓存，默认 300 秒
+    :param pipelining: 可选，是否开启 curl 的 HTTP pipelining/multiplexing，默认为 False
+    :param defaults: 可选，传给 ``AsyncHTTPClient`` 的默认请求参数
+    :param max_body_size: 可选，使用 ``streaming_callback`` 的请求（如下载账单、素材）允许的最大响应体大小，
+                          默认不限制；其余请求的响应会缓冲在内存中，保持 tornado 默认的 100MB 限制
+    """
+
+    def __init__(self, max_clients=100, max_per_host=None, use_curl=False,
+                 dns_cache_ttl=300, pipelining=False, defaults=None, max_body_size=None):
+        self.max_clients = max_clients
+        self.max_per_host = max_per_host
+        self.use_curl = use_curl
+        self.dns_cache_ttl = dns_cache_ttl
+        self.pipelining = pipelining
+        self.defaults = defaults
+        self.max_body_size = max_body_size
+        self._clients = {}
+        self._host_semaphores = {}
+        self._host_stats = {}
+        self._requests = 0
+
+    def _create_client(self, max_body_size=None):
+        kwargs = {
+            'force_instance': True,
+            'max_clients': self.max_clients,
+            'defaults': self.defaults,
+        }
+        if self.use_curl:
+            from tornado.curl_httpclient import CurlAsyncHTTPClient
+
+            client = CurlAsyncHTTPClient(**kwargs)
+            if self.pipelining:
+                import pycurl
+
+                client._multi.setopt(
+                    pycurl.M_PIPELINING,
+                    getattr(pycurl, 'PIPE_MULTIPLEX', 1)
+                )
+            return client
+
+        from tornado.simple_httpclient import SimpleAsyncHTTPClient
+
+        if self.dns_cache_ttl:
+            kwargs['resolver'] = CachingResolver(ttl=self.dns_cache_ttl)
+        if max_body_size is not None:
+            kwargs['max_body_size'] = max_body_size
+        return SimpleAsyncHTTPClient(**kwargs)
+
+    @property
+    def client(self):
+        """ 当前 IOLoop 上的 ``AsyncHTTPClient`` 实例 """
+        io_loop = IOLoop.current()
+        client = self._clients.get(io_loop)
+        if client is None:
+            client = self._clients[io_loop] = self._create_client()
+        return client
+
+    @property
+    def streaming_client(self):
+        """
+        用于 ``body_producer`` 请求的 ``AsyncHTTPClient`` 实例，
+        ``CurlAsyncHTTPClient`` 不支持 ``body_producer`` ，此时使用 ``SimpleAsyncHTTPClient``
+        """
+        if not self.use_curl:
+            return self.client
+        key = (IOLoop.current(), 'streaming')
+        client = self._clients.get(key)
+        if client is None:
+            from tornado.simple_httpclient import SimpleAsyncHTTPClient
+
+            client = self._clients[key] = SimpleAsyncHTTPClient(
+                force_instance=True,
+                max_clients=self.max_clients,
+                defaults=self.defaults
+            )
+        return client
+
+    @property
+    def download_client(self):
+        """
+        用于 ``streaming_callback`` 请求的 ``AsyncHTTPClient`` 实例，响应体不缓冲在内存中，
+        ``SimpleAsyncHTTPClient`` 的响应体大小上限为 ``max_body_size``
+        """
+        if self.use_curl:
+            # curl 不限制响应体大小
+            return self.client
+        key = (IOLoop.current(), 'download')
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = self._create_client(self.max_body_size or sys.maxsize)
+        return client
+
+    def _prepare_curl(self, request):
+        prepare_curl_callback = request.prepare_curl_callback
+        dns_cache_ttl = self.dns_cache_ttl
+
+        def _prepare(curl):
+            import pycurl
+
+            curl.setopt(pycurl.DNS_CACHE_TIMEOUT, dns_cache_ttl)
+            if prepare_curl_callback is not None:
+                prepare_curl_callback(curl)
+
+        request.prepare_curl_callback = _prepare
+
+    async def fetch(self, request, **kwargs):
+        if not isinstance(request, HTTPRequest):
+            request = HTTPRequest(url=request, **kwargs)
+            kwargs = {}
+        if self.use_curl and self.dns_cache_ttl:
+            self._prepare_curl(request)
+
+        host = urlsplit(request.url).netloc
+        stats = self._host_stats.get(host)
+        if stats is None:
+            stats = self._host_stats[host] = {'active': 0, 'waiting': 0, 'requests': 0}
+        semaphore = None
+        if self.max_per_host:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._host_semaphores[host] = asyncio.Semaphore(self.max_per_host)
+
+        self._requests += 1
+        stats['requests'] += 1
+        stats['waiting'] += 1
+        try:
+            if semaphore is not None:
+                await semaphore.acquire()
+        finally:
+            stats['waiting'] -= 1
+        stats['active'] += 1
+        try:
+            if request.streaming_callback is not None:
+                client = self.download_client
+            elif request.body_producer is not None:
+                client = self.streaming_client
+            else:
+                client = self.client
+            return await client.fetch(request, **kwargs)
+        finally:
+            stats['active'] -= 1
+            if semaphore is not None:
+                semaphore.release()
+
+    def stats(self):
+        """
+        获取传输层的队列统计
+
+        :return: dict，``active`` 为已交给 ``AsyncHTTPClient`` 的请求数，
+                 ``queued`` 为其中等待空闲连接的请求数，
+                 ``waiting`` 为等待 host 并发限制的请求数
+        """
+        queued = 0
+        for client in self._clients.values():
+            # SimpleAsyncHTTPClient.queue / CurlAsyncHTTPClient._requests
+            queue = getattr(client, 'queue', None)
+            if queue is None:
+                queue = getattr(client, '_requests', ())
+            queued += len(queue)
+        hosts = dict((host, dict(stats)) for host, stats in self._host_stats.items())
+        return {
+            'max_clients': self.max_clients,
+            'max_per_host': self.max_per_host,
+            'requests': self._requests,
+            'active': sum(stats['active'] for stats in hosts.values()),
+            'waiting': sum(stats['waiting'] for stats in hosts.values()),
+            'queued': queued,
+            'hosts': hosts,
+        }
+
+    def close(self):
+        for client in self._clients.values():
+            client.close()
+        self._clients = {}
+
+
+_default_transport = None
+
+
+def configure_transport(**kwargs):
+    """
+    配置所有接口共享的默认 HTTP 传输层，需在创建 client 之前调用
+
+    参数见 :class:`HTTPTransport`
+
+    使用示例::
+
+        from wechatpy_tornado.transport import configure_transport
+
+        configure_transport(max_clients=500, max_per_host=200, use_curl=True)
+
+    :return: 新的默认 :class:`HTTPTransport`
+    """
+    global _default_transport
+    _default_transport = HTTPTransport(**kwargs)
+    return _default_transport
+
+
+def get_transport():
+    """ 获取所有接口共享的默认 HTTP 传输层 """
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = HTTPTransport()
+    return _default_transport
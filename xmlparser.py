@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+    wechatpy_tornado.xmlparser
+    ~~~~~~~~~~~~~~~~~~~
+
+    This module provides a fast parser for the small ``<xml>`` documents
+    pushed by WeChat, falling back to xmltodict for anything else.
+
+    :license: MIT, see LICENSE for more details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import re
+
+import xmltodict
+
+# 只含文本或一个 CDATA 的叶子节点、不带属性的标签、CDATA、文本，
+# 其余以 < 开头的内容（注释、声明、带属性的标签等）交给 xmltodict
+_TOKEN_RE = re.compile(
+    r'<([A-Za-z_][\w.\-]*)>(?:<!\[CDATA\[(.*?)\]\]>|([^<]*))</\1>'
+    r'|<(/?)([A-Za-z_][\w.\-]*)\s*(/?)>'
+    r'|<!\[CDATA\[(.*?)\]\]>'
+    r'|([^<]+)'
+    r'|(<)',
+    re.S
+)
+_DECLARATION_RE = re.compile(r'\s*<\?xml[^>]*\?>')
+# 需要换行符规范化的 \r 和 XML 中不允许出现的字符，交给 xmltodict 处理或报错
+_FALLBACK_RE = re.compile(r'[\r\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _add(children, name, value):
+    if name in children:
+        existing = children[name]
+        if isinstance(existing, list):
+            existing.append(value)
+        else:
+            children[name] = [existing, value]
+    else:
+        children[name] = value
+
+
+def _parse(xml):
+    # 栈中每一项为 (标签名, 子节点, 文本片段)，最外层为文档本身
+    name, children, texts = None, {}, []
+    stack = []
+    for leaf, leaf_cdata, leaf_text, close, tag, self_closing, cdata, text, other in _TOKEN_RE.findall(xml):
+        if leaf:
+            if leaf_text:
+                if '&' in leaf_text or ']]>' in leaf_text:
+                    raise _Unsupported()
+                value = leaf_text.strip() or None
+            else:
+                if ']]>' in leaf_cdata:
+                    # 多个相邻的 CDATA
+                    raise _Unsupported()
+                value = leaf_cdata.strip() or None
+            if leaf in children:
+                _add(children, leaf, value)
+            else:
+                children[leaf] = value
+        elif tag:
+            if self_closing:
+                if close:
+                    raise _Unsupported()
+                _add(children, tag, None)
+            elif close:
+                if tag != name:
+                    raise _Unsupported()
+                value = ''.join(texts).strip() if texts else ''
+                if children:
+                    if value:
+                        # 文本和子节点混合
+                        raise _Unsupported()
+                    value = children
+                elif not value:
+                    value = None
+                name, children, texts = stack.pop()
+                _add(children, tag, value)
+            else:
+                stack.append((name, children, texts))
+                name, children, texts = tag, {}, []
+        elif other:
+            raise _Unsupported()
+        elif text:
+            if '&' in text or ']]>' in text:
+                # 实体引用
+                raise _Unsupported()
+            texts.append(text)
+        else:
+            texts.append(cdata)
+    if stack or len(children) != 1 or ''.join(texts).strip():
+        raise _Unsupported()
+    return children
+
+
+def parse_xml(xml):
+    """
+    解析 XML ，结果与 ``xmltodict.parse(xml)`` 相同
+
+    只处理没有属性、注释、实体引用和回车符的文档，如微信推送的消息和支付接口的返回，
+    其余情况（包括格式错误或含有非法字符的 XML）交给 xmltodict 处理，抛出的异常与 xmltodict 相同
+
+    :param xml: XML 字符串
+    :return: dict
+    """
+    if isinstance(xml, bytes):
+        try:
+            text = xml.decode('utf-8')
+        except UnicodeDecodeError:
+            return xmltodict.parse(xml)
+    else:
+        text = xml
+    if text.startswith(('<?', ' ', '\n', '\r', '\t')):
+        match = _DECLARATION_RE.match(text)
+        if match is not None:
+            text = text[match.end():]
+    if _FALLBACK_RE.search(text) is not None:
+        return xmltodict.parse(xml)
+    try:
+        return _parse(text)
+    except _Unsupported:
+        return xmltodict.parse(xml)